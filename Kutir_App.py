@@ -1,36 +1,77 @@
 # Kutir_App.py
+import threading
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
-from data_source import data
-import pandas as pd
-from io import BytesIO
+import instrumentation
+# Only light modules before the page skeleton: the data layer, pandas and
+# the chart modules are imported once it is out (see below)
+from settings import CHUNK_ROWS, TREND_MODES, TREND_BASE_FREQUENCY, configured_source, data_loaded
+from snapshot_cache import read_dimensions
 from datetime import timedelta
 from datetime import datetime
 
+# Quarantined rows shown on the page; the download has all of them
+QUARANTINE_PREVIEW_ROWS = 1000
+
 st.set_page_config(page_title="Seva Kutir Dashboard", layout="wide")
+# With SEVA_KUTIR_PROFILE set, each section of the run below is timed as a lap
+# and the spans of this run are listed in a debug panel at the end
+run_mark = instrumentation.mark()
+laps = instrumentation.laps('dashboard')
 st.markdown("""
     <h1 style='text-align: center; color: #4A4A4A;'>Seva Kutir Monitoring Dashboard</h1>
 """, unsafe_allow_html=True)
 
+def load_data():
+    # One consistent version for the whole run, even if a refresh swaps in
+    # newer data meanwhile
+    from data_source import data
+    try:
+        return data()
+    except Exception as e:
+        # Only possible before the first snapshot exists; later failures keep serving the last data
+        st.error(f"Could not load the attendance data: {e}")
+        st.stop()
+
+def show_status(data_object):
+    from data_source import refresh_in_progress
+    refresh_note = " · refreshing in the background" if refresh_in_progress() else ""
+    quarantine_note = f" · {len(data_object.quarantine):,} rows quarantined" if len(data_object.quarantine) else ""
+    status_line.caption(f"Data version {data_object.data_version} · {data_object.row_count():,} rows{quarantine_note} · "
+                        f"updated {data_object.loaded_at:%Y-%m-%d %H:%M}{refresh_note}")
+
 # Top-right reload button
-reload_col = st.columns([0.85, 0.15])[1]
+status_col, reload_col = st.columns([0.85, 0.15])
 with reload_col:
     if st.button("🔄 Reload Data"):
-        data.destroy_instance()
-        st.experimental_rerun()
+        # Rows appended since the last load are fetched in the background; the
+        # next interaction after it finishes shows them
+        from data_source import request_refresh
+        request_refresh()
+status_line = status_col.empty()
+
+# Posting lists and option lists built once per data load; each widget below
+# narrows a set of filters that is resolved against the index, not the frame.
+# A process that has not loaded the data yet draws the filters from the
+# dimension index saved with the snapshot and loads the data after the page
+# skeleton is out; without a snapshot it has to load the data first.
+data_object = load_data() if data_loaded() else None
+index = read_dimensions(configured_source(), chunked=CHUNK_ROWS > 0) if data_object is None else None
+if index is None:
+    data_object = data_object or load_data()
+    index = data_object.get_filter_index()
+    show_status(data_object)
+else:
+    status_line.caption("Loading the attendance data…")
+laps.lap('dimensions')
+filters = {}
 
-# Load data
-data_object = data()
-df = data_object.sheet
-filtered_df = df.copy()
 
 # Filters
 st.markdown("### Filters")
 # Row 1: State and Date Range
 row1_col1, row1_col2, row1_col3, row1_col4, row1_col5 = st.columns(5)
 with row1_col1:
-    state_options = sorted(df['State'].dropna().unique().tolist())
+    state_options = index.options('State')
     
     # Determine the default index for 'Madhya Pradesh'
     default_state_name = 'Madhya Pradesh'
@@ -46,97 +87,90 @@ with row1_col1:
     else:
         selected_state = st.selectbox('Select State', state_options, index=default_index) # Set default state here
     
-    if selected_state != "No Data":
-        filtered_df = filtered_df[filtered_df['State'] == selected_state]
-    else:
-        filtered_df = pd.DataFrame() # No data if no state selected
+    # No data if no state selected
+    state_date_bounds = index.date_bounds(selected_state) if selected_state != "No Data" else None
 
 
 with row1_col2:
-    # Ensure min/max values are based on the filtered_df after state selection
-    # Add check for empty filtered_df to prevent errors
-    if not filtered_df.empty and 'Date' in filtered_df.columns and pd.api.types.is_datetime64_any_dtype(filtered_df['Date']):
-        min_date_available = filtered_df['Date'].min().date() if pd.notna(filtered_df['Date'].min()) else datetime.now().date()
-        max_date_available = filtered_df['Date'].max().date() if pd.notna(filtered_df['Date'].max()) else datetime.now().date()
+    # min/max values come from the selected state's rows
+    if state_date_bounds is not None:
+        min_date_available = state_date_bounds[0].date()
+        max_date_available = state_date_bounds[1].date()
     else:
         min_date_available = datetime.now().date()
         max_date_available = datetime.now().date()
 
     start_date = st.date_input('Start Date', value=min_date_available, min_value=min_date_available, max_value=max_date_available)
-    if not filtered_df.empty:
-        filtered_df = filtered_df[filtered_df['Date'].dt.date >= start_date]
+    filters['start_date'] = start_date
 
 with row1_col3:
-    if not filtered_df.empty and 'Date' in filtered_df.columns and pd.api.types.is_datetime64_any_dtype(filtered_df['Date']):
-        # Recalculate max_date_available after start_date filtering
-        current_max_date = filtered_df['Date'].max().date() if pd.notna(filtered_df['Date'].max()) else datetime.now().date()
-        if current_max_date < start_date:
-            current_max_date = start_date
-    else:
-        current_max_date = start_date
+    # Latest date on or after start_date
+    current_max_date = max(max_date_available, start_date) if state_date_bounds is not None else start_date
 
     end_date = st.date_input('End Date', value=current_max_date, min_value=start_date, max_value=max_date_available)
     if end_date < start_date:
         st.warning("End Date cannot be before Start Date. Resetting End Date to Start Date.")
         end_date = start_date
-    if not filtered_df.empty:
-        filtered_df = filtered_df[filtered_df['Date'].dt.date <= end_date]
+    filters['end_date'] = end_date
 
 with row1_col4:
-    shift_options = sorted(df['Shift'].dropna().unique().tolist())
+    shift_options = index.options('Shift')
     shift_options.insert(0, "All Shifts") # Add "All Shifts" option
     
     selected_shift = st.selectbox('Select Shift', shift_options, index=0) # Default to "All Shifts"
     
     if selected_shift != "All Shifts":
-        filtered_df = filtered_df[filtered_df['Shift'] == selected_shift]
-    # No else needed if "All Shifts" is selected, as filtered_df remains as is
-    if filtered_df.empty and selected_shift != "All Shifts": # Show warning only if specific shift selected and no data
+        filters['shift'] = selected_shift
+    # No else needed if "All Shifts" is selected, as no shift filter applies
+    if selected_shift != "All Shifts" and index.count(selected_state, **filters) == 0: # Show warning only if specific shift selected and no data
         st.warning("No data for selected shift.")
 
 with row1_col5:
-    frequency = st.selectbox("Select Frequency", ["Daily", "Weekly", "Monthly", "Yearly"], index=1)
+    frequency = st.selectbox("Select Frequency", ["Daily", "Weekly", "Monthly", "Yearly"] + TREND_MODES, index=1)
+    # A trend mode replaces the attendance chart; everything else shows its base frequency
+    trend_mode = frequency if frequency in TREND_MODES else None
+    if trend_mode is not None:
+        frequency = TREND_BASE_FREQUENCY
 
 # Row 2: District, Cluster, Kutir Name, Kutir Type
 row2_col1, row2_col2, row2_col3, row2_col4 = st.columns(4)
 
 with row2_col1:
-    district_options = sorted(filtered_df['District'].dropna().unique().tolist())
+    district_options = index.options('District', state=selected_state)
     district_options.insert(0, "All")
     selected_districts = st.multiselect("Select District(s)", district_options, default=["All"])
     if 'All' not in selected_districts:
-        filtered_df = filtered_df[filtered_df['District'].isin(selected_districts)]
-    if filtered_df.empty and "All" not in selected_districts:
-        st.warning("No data for selected districts.")
+        filters['districts'] = selected_districts
+        if index.count(selected_state, **filters) == 0:
+            st.warning("No data for selected districts.")
 
 
 with row2_col2:
-    cluster_options = filtered_df['Cluster'].dropna().unique().tolist()
-    cluster_options = sorted(cluster_options)
+    cluster_options = index.options('Cluster', state=selected_state, districts=filters.get('districts'))
     cluster_options.insert(0, "All")
     selected_clusters = st.multiselect("Select Cluster(s)", cluster_options, default=["All"])
     if 'All' not in selected_clusters:
-        filtered_df = filtered_df[filtered_df['Cluster'].isin(selected_clusters)]
-    if filtered_df.empty and "All" not in selected_clusters:
-        st.warning("No data for selected clusters.")
+        filters['clusters'] = selected_clusters
+        if index.count(selected_state, **filters) == 0:
+            st.warning("No data for selected clusters.")
 
 with row2_col3:
-    kutir_name_options = filtered_df['Kutir Name'].dropna().unique().tolist()
-    kutir_name_options = sorted(kutir_name_options)
+    kutir_name_options = index.options('Kutir Name', state=selected_state, districts=filters.get('districts'), clusters=filters.get('clusters'))
     kutir_name_options.insert(0, "All")
     selected_kutir_names = st.multiselect("Select Kutir Name(s)", kutir_name_options, default=["All"])
     if 'All' not in selected_kutir_names:
-        filtered_df = filtered_df[filtered_df['Kutir Name'].isin(selected_kutir_names)]
-    if filtered_df.empty and "All" not in selected_kutir_names:
-        st.warning("No data for selected Kutir Names.")
+        filters['kutir_names'] = selected_kutir_names
+        if index.count(selected_state, **filters) == 0:
+            st.warning("No data for selected Kutir Names.")
 
 with row2_col4:
-    kutir_types = sorted(filtered_df['Kutir'].dropna().unique().tolist())
+    kutir_types = index.options('Kutir', state=selected_state, districts=filters.get('districts'), clusters=filters.get('clusters'), kutir_names=filters.get('kutir_names'))
     selected_kutirs = st.multiselect('Select Kutir Type', options=["All"] + kutir_types, default=["All"])
     if "All" not in selected_kutirs:
-        filtered_df = filtered_df[filtered_df['Kutir'].isin(selected_kutirs)]
-    if filtered_df.empty and "All" not in selected_kutirs:
-        st.warning("No data for selected Kutir Types.")
+        filters['kutirs'] = selected_kutirs
+        if index.count(selected_state, **filters) == 0:
+            st.warning("No data for selected Kutir Types.")
+laps.lap('filters')
 
 st.markdown("""<style>
 .metric-card {
@@ -148,265 +182,279 @@ st.markdown("""<style>
 }
 </style>""", unsafe_allow_html=True)
 
-st.markdown("### Key Performance Indicators")
-kpi1, kpi2, kpi3 = st.columns(3)
-
-agg_df, detailed_df = data_object.aggregate_attendance(filtered_df, frequency)
-
-periods, max_students, avg_attendance, max_period = data_object.calculate_kpis(agg_df)
-
-period_label = "Days" if frequency == "Daily" else "Weeks" if frequency == "Weekly" else "Months" if frequency == "Monthly" else "Years"
-
-with kpi1:
-    st.markdown(f"""
-        <div class='metric-card'>
-            <h3>Total No of {period_label}</h3>
-            <h2>{periods}</h2>
-        </div>
-    """, unsafe_allow_html=True)
-
-with kpi2:
-    st.markdown(f"""
-        <div class='metric-card'>
-            <h3>Max Attendance in a {period_label[:-1] if period_label != 'Days' else 'Day'}</h3>
-            <h2>{int(max_students) if not pd.isna(max_students) else 0} | {max_period}</h2>
-        </div>
-    """, unsafe_allow_html=True)
-
-with kpi3:
-    st.markdown(f"""
-        <div class='metric-card'>
-            <h3>{frequency} Avg Attendance</h3>
-            <h2>{avg_attendance:.2f}</h2>
-        </div>
-    """, unsafe_allow_html=True)
-
-st.markdown(f"### Student Attendance Over Time ({frequency} Basis)")
-
-if not agg_df.empty:
-    attendance_export_df = agg_df[['Period', 'Attendance of Students']].copy()
-    if frequency == "Weekly" and 'Week Start Date' in agg_df.columns:
-        attendance_export_df = agg_df[['Period', 'Attendance of Students', 'Week Start Date', 'Week End Date']]
-
-    excel_attendance_buffer = BytesIO()
-    attendance_export_df.to_excel(excel_attendance_buffer, index=False, engine='xlsxwriter')
-    excel_attendance_buffer.seek(0)
-    st.download_button(
-        label="Download Attendance Trend Data",
-        data=excel_attendance_buffer,
-        file_name="attendance_trend_data.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-
-    agg_df['Color'] = agg_df['Attendance of Students'].apply(lambda x: 'red' if x < avg_attendance else 'blue')
-    fig1 = go.Figure()
-    fig1.add_trace(go.Scatter(
-        x=agg_df['Period'],
-        y=agg_df['Attendance of Students'],
-        mode='lines+markers',
-        line=dict(color='gray'),
-        marker=dict(color=agg_df['Color']),
-        name='Attendance'
-    ))
-    fig1.add_trace(go.Scatter(
-        x=agg_df[agg_df['Color'] == 'red']['Period'],
-        y=agg_df[agg_df['Color'] == 'red']['Attendance of Students'],
-        mode='markers',
-        marker=dict(color='red', size=10),
-        name=f'Below {frequency} Average'
-    ))
-    fig1.add_trace(go.Scatter(
-        x=agg_df[agg_df['Color'] == 'blue']['Period'],
-        y=agg_df[agg_df['Color'] == 'blue']['Attendance of Students'],
-        mode='markers',
-        marker=dict(color='blue', size=10),
-        name=f'Above {frequency} Average'
-    ))
-
-    # Add horizontal line for average attendance
-    fig1.add_hline(
-        y=avg_attendance, 
-        line_dash="dot",
-        annotation_text=f"Avg: {avg_attendance:.2f}", 
-        annotation_position="bottom right",
-        line_color="green"
-    )
-
-    fig1.update_layout(title=f"Student Attendance vs Period ({frequency})",
-                    margin=dict(l=20, r=20, t=40, b=20))
-    fig1.update_xaxes(type='category', tickangle=45)
-    st.plotly_chart(fig1, use_container_width=True)
-else:
-    st.info("No data available to display Attendance Trend Chart for the selected filters.")
-
-agg_kutir_df = data_object.aggregate_kutir_attendance(detailed_df, frequency)
-
-if not agg_kutir_df.empty:
-    export_buffer = BytesIO()
-    agg_kutir_df.to_excel(export_buffer, index=False, engine='xlsxwriter')
-    export_buffer.seek(0)
-
-    st.download_button(
-        label="Download Kutir Type Attendance Data",
-        data=export_buffer,
-        file_name="kutir_type_attendance_data.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-
-    kutir_color_map = {
-        "Study Center": "#160642",
-        "Seva Kutir": "#aec7e8",
-        "Shiksha Kutir": "#4c78a8",
-    }
-
-    types_in_data = agg_kutir_df['Kutir'].unique()
-    color_map_filtered = {k: v for k, v in kutir_color_map.items() if k in types_in_data}
-
-    fig2 = px.bar(
-        agg_kutir_df,
-        x='Period',
-        y='Attendance of Students',
-        color='Kutir',
-        color_discrete_map=color_map_filtered,
-        barmode='stack',
-        title=f"Kutir Type vs Period ({frequency})"
-    )
-    fig2.update_layout(margin=dict(l=20, r=20, t=40, b=20))
-    fig2.update_xaxes(type='category', tickangle=45)
-    st.plotly_chart(fig2, use_container_width=True)
-else:
-    st.info("No data available to display Kutir Type vs Period Chart for the selected filters.")
+# The page skeleton goes out before any aggregation runs: every section gets
+# its place and a loading note, and is drawn as soon as its data is ready
+def page_section(heading=None):
+    section = st.container()
+    if heading is not None:
+        section.markdown(heading)
+    loading = section.empty()
+    loading.caption("Loading…")
+    return section, loading
+
+kpi_section, kpi_loading = page_section("### Key Performance Indicators")
+trend_section, trend_loading = page_section(f"### Student Attendance Over Time ({trend_mode or frequency + ' Basis'})")
+kutir_section, kutir_loading = page_section()
+district_section, district_loading = page_section(f"### Kutir Attendance Category Distribution by District ({frequency})")
+anomaly_section, anomaly_loading = page_section("### Kutirs Needing Attention")
+session_section, session_loading = page_section("### Detailed Session Data")
+quality_section, quality_loading = page_section("### Data Quality")
+laps.lap('skeleton')
+
+# Everything below needs pandas and the data layer. Importing them costs about
+# as much as drawing everything above, so a cold start does it here, after the
+# filters and the skeleton are on screen; later runs find them loaded.
+import pandas as pd
+from charts import figure_from_json, trend_figure, rolling_figure, change_figure, kutir_type_figure, district_bucket_figure
+from data_quality import MAX_ATTENDANCE
+from exports import EXPORT_FORMATS, export_bytes, export_file_name, export_mime
+from kutir_anomalies import BASELINE_WEEKS, DROP_THRESHOLD, PEER_Z, STREAK_DAYS
+from session_table import PAGE_SIZES, search_rows, sort_rows, page_count, page_frame
+laps.lap('imports')
+
+if data_object is None:
+    data_object = load_data()
+    show_status(data_object)
+    laps.lap('load data')
+
+def cached(part, build):
+    # Shared across sessions for the current data version and filter state
+    def timed_build():
+        with instrumentation.span(f"build {part}") as current:
+            result = build()
+            current.rows_out = instrumentation.row_count((result,))
+            return result
+    return data_object.cached(part, selected_state, frequency, filters, timed_build)
+
+def cached_figure(part, build):
+    # Figures are cached as their JSON spec: an immutable string that every
+    # session can share and the cache can size, unlike a mutable Figure. Each
+    # run rebuilds its own Figure from it.
+    return figure_from_json(cached(part, lambda: build().to_json()))
+
+def download_controls(key, label, file_name, build_frame, part=None):
+    # Files are only generated on request. The download button needs its bytes
+    # up front, so "Prepare" records the filter fingerprint in session_state and
+    # the download button is offered for as long as the filters still match.
+    # Generated files go through the shared aggregation cache.
+    format_col, prepare_col, download_col = st.columns([0.12, 0.18, 0.7])
+    with format_col:
+        file_format = st.selectbox("Format", list(EXPORT_FORMATS), key=f"{key}_format", label_visibility="collapsed")
+    export_part = ('export', part or key, file_format)
+    fingerprint = data_object.cache_key(export_part, selected_state, frequency, filters)
+    prepared = st.session_state.get(f"{key}_prepared") == fingerprint
+    with prepare_col:
+        if not prepared and st.button(f"Prepare {file_format} file", key=f"{key}_prepare"):
+            st.session_state[f"{key}_prepared"] = fingerprint
+            prepared = True
+    if prepared:
+        with download_col:
+            st.download_button(
+                label=label,
+                data=cached(export_part, lambda: export_bytes(build_frame(), file_format)),
+                file_name=export_file_name(file_name, file_format),
+                mime=export_mime(file_format),
+                key=f"{key}_download"
+            )
 
-st.markdown(f"### Kutir Attendance Category Distribution by District ({frequency})")
+# Aggregations read the pre-aggregated daily cube, filtered the same way as the
+# raw rows, or run as queries when the DuckDB engine is enabled
+engine = data_object.get_engine()
+with kpi_section:
+    agg_df, detailed_df = cached('attendance', lambda: data_object.attendance(selected_state, frequency, filters))
+    periods, max_students, avg_attendance, max_period = cached('kpis', lambda: data_object.calculate_kpis(agg_df))
+    kpi_loading.empty()
+
+    period_label = "Days" if frequency == "Daily" else "Weeks" if frequency == "Weekly" else "Months" if frequency == "Monthly" else "Years"
+    kpi1, kpi2, kpi3 = st.columns(3)
+
+    with kpi1:
+        st.markdown(f"""
+            <div class='metric-card'>
+                <h3>Total No of {period_label}</h3>
+                <h2>{periods}</h2>
+            </div>
+        """, unsafe_allow_html=True)
+
+    with kpi2:
+        st.markdown(f"""
+            <div class='metric-card'>
+                <h3>Max Attendance in a {period_label[:-1] if period_label != 'Days' else 'Day'}</h3>
+                <h2>{int(max_students) if not pd.isna(max_students) else 0} | {max_period if max_period is not None else '-'}</h2>
+            </div>
+        """, unsafe_allow_html=True)
+
+    with kpi3:
+        st.markdown(f"""
+            <div class='metric-card'>
+                <h3>{frequency} Avg Attendance</h3>
+                <h2>{avg_attendance:.2f}</h2>
+            </div>
+        """, unsafe_allow_html=True)
+
+    with st.expander(f"KPIs by State, District and Kutir Type ({frequency})"):
+        # From the same detailed aggregate as the charts, no extra pass over the rows
+        kpi_tables = cached('kpi_tables', lambda: data_object.kpi_tables(detailed_df, frequency))
+        for tab, (name, table) in zip(st.tabs(list(kpi_tables)), kpi_tables.items()):
+            with tab:
+                st.dataframe(table, hide_index=True)
+laps.lap('kpis', len(agg_df))
+
+trend_df = cached(('trend', trend_mode), lambda: data_object.trend(selected_state, trend_mode, filters)) if trend_mode is not None else None
+with trend_section:
+    trend_loading.empty()
+    if trend_mode is not None:
+        if trend_df.empty:
+            st.info("No data available to display the attendance trend for the selected filters.")
+        elif trend_mode == "Kutir Trend Slopes":
+            st.caption("Least-squares slope of each kutir's weekly average attendance, in students per week; steepest decline first.")
+            download_controls('trend_export', "Download Kutir Trend Data", "kutir_trend_slopes", lambda: trend_df,
+                              part=('trend_export', trend_mode))
+            st.dataframe(trend_df, hide_index=True)
+        else:
+            download_controls('trend_export', "Download Attendance Trend Data", "attendance_trend_data", lambda: trend_df,
+                              part=('trend_export', trend_mode))
+            st.plotly_chart(cached_figure(('trend_fig', trend_mode), lambda: change_figure(trend_df) if trend_mode == "Week over Week"
+                                          else rolling_figure(trend_df, trend_mode)), use_container_width=True)
+    elif not agg_df.empty:
+        attendance_export_columns = ['Period', 'Attendance of Students']
+        if frequency == "Weekly" and 'Week Start Date' in agg_df.columns:
+            attendance_export_columns = ['Period', 'Attendance of Students', 'Week Start Date', 'Week End Date']
+
+        download_controls('attendance_export', "Download Attendance Trend Data", "attendance_trend_data",
+                          lambda: agg_df[attendance_export_columns])
+
+        st.plotly_chart(cached_figure('fig1', lambda: trend_figure(agg_df['Period'], agg_df['Attendance of Students'], avg_attendance, frequency)),
+                        use_container_width=True)
+    else:
+        st.info("No data available to display Attendance Trend Chart for the selected filters.")
+laps.lap('attendance trend', len(agg_df))
+
+agg_kutir_df = cached('kutir', lambda: data_object.kutir_attendance(selected_state, frequency, filters, detailed_df))
+with kutir_section:
+    kutir_loading.empty()
+    if not agg_kutir_df.empty:
+        download_controls('kutir_export', "Download Kutir Type Attendance Data", "kutir_type_attendance_data",
+                          lambda: agg_kutir_df)
 
-fig3a_df = pd.DataFrame()
+        st.plotly_chart(cached_figure('fig2', lambda: kutir_type_figure(agg_kutir_df, frequency)), use_container_width=True)
+    else:
+        st.info("No data available to display Kutir Type vs Period Chart for the selected filters.")
+laps.lap('kutir types', len(agg_kutir_df))
+
+with district_section:
+    fig3a_df = pd.DataFrame()
+
+    if engine is not None:
+        fig3a_df = cached('fig3a', lambda: engine.district_attendance(selected_state, filters, frequency))
+    elif not detailed_df.empty:
+        if frequency == "Weekly":
+            required_cols_fig3_weekly = ['Period', 'Date', 'Kutir Name', 'District', 'Attendance of Students']
+            if not all(col in detailed_df.columns for col in required_cols_fig3_weekly):
+                st.warning("Missing columns in detailed_df for weekly district distribution for Fig3. Skipping.")
+            else:
+                fig3a_df = cached('fig3a', lambda: data_object.aggregate_district_attendance(detailed_df, frequency))
 
-if not detailed_df.empty:
-    if frequency == "Weekly":
-        required_cols_fig3_weekly = ['Period', 'Date', 'Kutir Name', 'District', 'Attendance of Students']
-        if not all(col in detailed_df.columns for col in required_cols_fig3_weekly):
-            st.warning("Missing columns in detailed_df for weekly district distribution for Fig3. Skipping.")
         else:
-            daily_kutir_district_attendance = detailed_df.groupby(['Period', 'Date', 'Kutir Name', 'District'], as_index=False)['Attendance of Students'].sum()
-            
-            weekly_avg_per_kutir_district = daily_kutir_district_attendance.groupby(['Period', 'Kutir Name', 'District'], as_index=False).agg(
-                sum_daily_attendance=('Attendance of Students', 'sum'),
-                count_days=('Date', 'nunique')
-            )
-            weekly_avg_per_kutir_district['Kutir Weekly Avg Attendance'] = weekly_avg_per_kutir_district.apply(
-                lambda row: row['sum_daily_attendance'] / row['count_days'] if row['count_days'] > 0 else 0, axis=1
-            )
-            
-            latest_periods = sorted(weekly_avg_per_kutir_district['Period'].dropna().unique(), reverse=True)[:2]
-            kutir_latest_df = weekly_avg_per_kutir_district[weekly_avg_per_kutir_district['Period'].isin(latest_periods)].copy()
-            
-            if not data_object.week_ranges.empty:
-                kutir_latest_df = kutir_latest_df.merge(data_object.week_ranges[['Weekly Period', 'Week Start Date', 'Week End Date']], 
-                                                        left_on='Period', right_on='Weekly Period', how='left')
-                
-                kutir_latest_df['Week Start Date Display'] = kutir_latest_df['Week Start Date'].dt.strftime('%Y-%m-%d').fillna('')
-                kutir_latest_df['Week End Date Display'] = kutir_latest_df['Week End Date'].dt.strftime('%Y-%m-%d').fillna('')
-
-                kutir_latest_df['District_Period_Label'] = kutir_latest_df['District'] + '-' + kutir_latest_df['Week Start Date Display'] + ' to ' + kutir_latest_df['Week End Date Display']
+            if 'Period' not in detailed_df.columns:
+                st.warning("Period column missing in detailed_df for non-weekly frequency in Fig3.")
             else:
-                kutir_latest_df['District_Period_Label'] = kutir_latest_df['District'] + '-' + kutir_latest_df['Period']
-                
-            fig3a_df = kutir_latest_df.groupby(['District_Period_Label', 'Kutir Name'])['Kutir Weekly Avg Attendance'].mean().reset_index()
-            fig3a_df.rename(columns={'Kutir Weekly Avg Attendance': 'Attendance of Students', 'District_Period_Label': 'District'}, inplace=True)
+                fig3a_df = cached('fig3a', lambda: data_object.aggregate_district_attendance(detailed_df, frequency))
 
+    district_loading.empty()
+    if not fig3a_df.empty:
+        fig3_df, bucket_counts = cached('district_buckets', lambda: engine.district_buckets(selected_state, filters, frequency)
+                                        if engine is not None else data_object.district_buckets(fig3a_df))
+
+        download_controls('district_export', "Download District Bucket Data", "District_Kurit_Attendance_Bucket",
+                          lambda: fig3_df)
+
+        st.plotly_chart(cached_figure('fig3', lambda: district_bucket_figure(bucket_counts, frequency)), use_container_width=True)
     else:
-        if 'Period' not in detailed_df.columns:
-            st.warning("Period column missing in detailed_df for non-weekly frequency in Fig3.")
-        else:
-            kutir_latest_period = sorted(detailed_df['Period'].dropna().unique(), reverse=True)[:2]
-            kutir_latest_df = detailed_df[detailed_df['Period'].isin(kutir_latest_period)].copy()
-
-            if not kutir_latest_df.empty:
-                kutir_latest_df['District_Period_Label'] = kutir_latest_df['District'] +'-'+ kutir_latest_df['Period']
-                fig3a_df = kutir_latest_df.groupby(['District_Period_Label', 'Kutir Name'])['Attendance of Students'].sum().reset_index()
-                fig3a_df.rename(columns={'District_Period_Label': 'District'}, inplace=True)
-
-if not fig3a_df.empty:
-    fig3a_df['Attendance Category'] = fig3a_df['Attendance of Students'].apply(data_object.categorize)
-
-    # Define the categories to ensure consistent ordering and handling of missing categories
-    CATEGORIES = ['<50', '50-75', '76-100', '100+', 'Unknown']
-
-    attendance_bins_by_district = (
-        fig3a_df.groupby(['District', 'Attendance Category'])
-        .size()
-        .unstack(fill_value=0)
-        .reindex(columns=CATEGORIES, fill_value=0)
-        .reset_index()
-    )
-    if 'Attendance of Students' in fig3a_df.columns:
-        avg_attendance_per_district = (
-            fig3a_df.groupby('District')['Attendance of Students']
-            .mean()
-            .reset_index()
-            .rename(columns={'Attendance of Students': 'Average Attendance'})
-        )
+        st.info("No data available to display Kutir Attendance Category Distribution for the selected filters.")
+laps.lap('district buckets', len(fig3a_df))
+
+# Every kutir scored over every week of the selected range, not only the latest two periods
+anomalies_df = cached('anomalies', lambda: data_object.anomalies(selected_state, filters))
+flagged_df = anomalies_df[anomalies_df['Flags'] != '']
+with anomaly_section:
+    anomaly_loading.empty()
+    if not anomalies_df.empty:
+        st.caption(f"{len(flagged_df):,} of {len(anomalies_df):,} kutirs flagged, highest score first. "
+                   f"drop: latest week {DROP_THRESHOLD:.0%}+ below its previous {BASELINE_WEEKS} reported weeks · "
+                   f"missing: no form for {STREAK_DAYS}+ reporting days · "
+                   f"peer outlier: latest week {PEER_Z:g}+ standard deviations below its cluster")
+        download_controls('anomaly_export', "Download Kutir Scores", "kutir_anomaly_scores", lambda: anomalies_df)
+        st.dataframe(flagged_df, hide_index=True)
     else:
-        avg_attendance_per_district = pd.DataFrame(columns=['District', 'Average Attendance'])
-
-    fig3_df = pd.merge(attendance_bins_by_district, avg_attendance_per_district, on='District', how='left')
-
-    excel_buffer = BytesIO()
-    fig3_df.to_excel(excel_buffer, index=False, engine='xlsxwriter')
-    excel_buffer.seek(0)
-    st.download_button(
-        label="Download Data as Excel",
-        data=excel_buffer,
-        file_name="District_Kurit_Attendance_Bucket.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-
-    # --- NEW, MORE ROBUST LOGIC for creating the chart's dataframe ---
-    # 1. Group and pivot to wide format, ensuring all districts are kept
-    wide_df_for_chart = (
-        fig3a_df.groupby(['District', 'Attendance Category'])
-                .size()
-                .unstack(fill_value=0)
-    )
-    # 2. Reindex to ensure all category columns exist, adding any that are missing
-    wide_df_for_chart = wide_df_for_chart.reindex(columns=CATEGORIES, fill_value=0)
-
-    # 3. Melt the guaranteed-complete dataframe back to a long format suitable for plotting
-    attendance_bins_by_district_2 = wide_df_for_chart.reset_index().melt(
-        id_vars='District',
-        var_name='Attendance Category',
-        value_name='Number of Kutirs'
-    )
-    
-    # This part remains the same, ensuring the legend is ordered correctly
-    attendance_bins_by_district_2['Attendance Category'] = pd.Categorical(
-        attendance_bins_by_district_2['Attendance Category'],
-        categories=CATEGORIES,
-        ordered=True
-    )
-
-    fig3 = px.bar(
-        attendance_bins_by_district_2,
-        x='District',
-        y='Number of Kutirs',
-        color='Attendance Category',
-        barmode='stack',
-        title=f'Kutir Attendance Category Distribution by District({frequency})'
-    )
-    st.plotly_chart(fig3, use_container_width=True)
-else:
-    st.info("No data available to display Kutir Attendance Category Distribution for the selected filters.")
-
-st.markdown("### Detailed Session Data")
-columns_to_display = st.multiselect("Select Columns to Display", options=filtered_df.columns.tolist(), default=['Date', 'Shift', "Teacher's Name", 'Attendance of Students', 'Kutir', 'Kutir Name'])
-excel_buffer = BytesIO()
-filtered_df[columns_to_display].to_excel(excel_buffer, index=False, engine='xlsxwriter')
-excel_buffer.seek(0)
-st.download_button(
-    label="Download Data as Excel",
-    data=excel_buffer,
-    file_name="filtered_kutir_data.xlsx",
-    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-)
-
-st.dataframe(filtered_df[columns_to_display])
+        st.info("No data available to score kutirs for the selected filters.")
+laps.lap('anomalies', len(anomalies_df))
+
+with session_section:
+    session_loading.empty()
+    sheet_columns = data_object.sheet_columns()
+    default_display_columns = [col for col in ['Date', 'Shift', "Teacher's Name", 'Teachers Name', 'Attendance of Students', 'Kutir', 'Kutir Name'] if col in sheet_columns]
+    columns_to_display = st.multiselect("Select Columns to Display", options=sheet_columns, default=default_display_columns)
+    # The loaded sheet and the filtered row positions, or in the chunked mode the
+    # matching rows read from the raw store
+    df, filtered_rows = data_object.session_rows(selected_state, filters, columns_to_display)
+    download_controls('session_export', "Download Session Data", "filtered_kutir_data",
+                      lambda: df.take(filtered_rows)[columns_to_display], part=('session_export', tuple(columns_to_display)))
+
+    # Search, sort and paging run on row positions; only the visible page is
+    # materialized and sent to the browser
+    search_col, sort_col, order_col, size_col, page_col = st.columns([0.32, 0.2, 0.16, 0.16, 0.16])
+    with search_col:
+        search_text = st.text_input("Search", placeholder="Search the text columns")
+    with sort_col:
+        sort_by = st.selectbox("Sort by", ["Sheet order"] + columns_to_display)
+    with order_col:
+        descending = st.selectbox("Order", ["Ascending", "Descending"]) == "Descending"
+    with size_col:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1)
+
+    session_rows = cached(('session_rows', tuple(columns_to_display), search_text.strip().lower(), sort_by, descending),
+                          lambda: sort_rows(df, search_rows(df, filtered_rows, columns_to_display, search_text),
+                                            None if sort_by == "Sheet order" else sort_by, descending))
+    total_pages = page_count(len(session_rows), page_size)
+    if st.session_state.get('session_page', 1) > total_pages:
+        st.session_state['session_page'] = 1
+    with page_col:
+        page = st.number_input("Page", min_value=1, max_value=total_pages, step=1, key='session_page')
+
+    page_df = page_frame(df, session_rows, columns_to_display, page - 1, page_size)
+    page_bytes = int(page_df.memory_usage(deep=True).sum()) if len(page_df) else 0
+    matching_bytes = page_bytes / len(page_df) * len(session_rows) if len(page_df) else 0
+    first_row = (page - 1) * page_size + 1 if len(page_df) else 0
+    st.caption(f"Rows {first_row:,}-{first_row + len(page_df) - 1 if len(page_df) else 0:,} of {len(session_rows):,} "
+               f"(of {len(filtered_rows):,} matching the filters) · page {page} of {total_pages} · "
+               f"{page_bytes / 1024:.1f} KB sent, ~{matching_bytes / 1e6:.1f} MB for all matching rows")
+    st.dataframe(page_df)
+laps.lap('session table', len(session_rows))
+
+# Rows held back at ingest, for every state and filter: they are in no figure above
+with quality_section:
+    quality_loading.empty()
+    quality = data_object.quality_report()
+    st.caption(f"{quality['rows_read']:,} form rows read · {quality['rows_kept']:,} counted · "
+               f"{quality['rows_quarantined']:,} quarantined. A resubmitted form (same kutir, day and shift) counts once, "
+               f"as first submitted; blank, unreadable, negative or over-{MAX_ATTENDANCE} attendance and rows without a "
+               f"Timestamp, State, District or Kutir Name are left out.")
+    if quality['rows_quarantined']:
+        st.dataframe(quality['reasons'], hide_index=True)
+        with st.expander(f"Quarantined rows (first {QUARANTINE_PREVIEW_ROWS:,})"):
+            download_controls('quarantine_export', "Download Quarantined Rows", "quarantined_rows", lambda: data_object.quarantine)
+            st.dataframe(data_object.quarantine.head(QUARANTINE_PREVIEW_ROWS), hide_index=True)
+laps.lap('data quality', quality['rows_quarantined'])
+laps.close()
+
+if instrumentation.enabled:
+    with st.expander("Debug: stage timings"):
+        # Spans of this run only; cached parts are not rebuilt and so not listed
+        # Spans are recorded as they finish; start order lists parents before their stages
+        run_spans = pd.DataFrame(instrumentation.spans_since(run_mark, threading.get_ident()))
+        if not run_spans.empty:
+            run_spans = run_spans.sort_values('started_at', kind='stable')
+            run_spans['stage'] = ['  ' * depth + name for depth, name in zip(run_spans['depth'], run_spans['name'])]
+            st.dataframe(run_spans[['stage', 'seconds', 'peak_bytes', 'rows_in', 'rows_out', 'details', 'error']], hide_index=True)
+        st.json(data_object.memory_report())
@@ -0,0 +1,86 @@
+# aggregation_cache.py
+import sys
+import threading
+from collections import OrderedDict
+from datetime import date
+import pandas as pd
+
+# Bounds for the shared cache; whichever is hit first evicts the least recently used entries
+MAX_ENTRIES = 256
+MAX_BYTES = 256 * 1024 * 1024
+
+
+def filter_key(state, frequency, filters):
+    # Hashable, order-independent form of one dashboard filter state
+    items = []
+    for name, value in sorted(filters.items()):
+        if isinstance(value, (list, tuple, set)):
+            value = tuple(sorted(str(v) for v in value))
+        elif isinstance(value, date):
+            value = value.isoformat()
+        items.append((name, value))
+    return (state, frequency, tuple(items))
+
+
+def estimate_bytes(value):
+    # Rough in-memory size of a cached value: frames are measured, containers
+    # are summed, anything else (figures, scalars) counts its shallow size
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(value, pd.DataFrame) else usage)
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_bytes(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_bytes(v) for v in value.values())
+    return sys.getsizeof(value)
+
+
+class AggregationCache:
+    # Aggregated frames and chart specs per (data version, filter state,
+    # frequency, part), shared by every session. Streamlit serves sessions from
+    # worker threads, so all bookkeeping happens under one lock; values are
+    # built outside it and must be treated as read-only by callers.
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            self.misses += 1
+        value = build()
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        size = estimate_bytes(value)
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[1]
+            if size > self.max_bytes:
+                # Too large to keep; the caller still gets the value
+                return
+            self.entries[key] = (value, size)
+            self.total_bytes += size
+            while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                self.total_bytes -= self.entries.popitem(last=False)[1][1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.total_bytes, 'hits': self.hits, 'misses': self.misses}
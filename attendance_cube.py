@@ -0,0 +1,49 @@
+# attendance_cube.py
+import pandas as pd
+from filter_index import FilterIndex
+from instrumentation import instrumented
+from period_calendar import day_keys, period_keys
+
+# Base grain of every attendance aggregation: one row per kutir, day and shift
+CUBE_DIMENSIONS = ['State', 'District', 'Cluster', 'Kutir Name', 'Kutir', 'Shift']
+
+
+@instrumented
+def daily_attendance(frame):
+    # Attendance summed to the cube grain. Sums are additive, so this also
+    # merges daily frames built from separate batches of rows.
+    dimensions = [col for col in CUBE_DIMENSIONS if col in frame.columns]
+    # dropna=False keeps rows with a blank dimension; the aggregations drop
+    # them exactly where they would have dropped the raw rows
+    daily = frame.groupby(['Date'] + dimensions, observed=True, dropna=False, sort=False, as_index=False)['Attendance of Students'].sum()
+    for col, keys in period_keys(day_keys(daily['Date'])).items():
+        daily[col] = keys
+    return daily
+
+
+def empty_daily():
+    # Cube rows of a load without any data
+    columns = {'Date': pd.Series(dtype='datetime64[ns]')}
+    columns.update({col: pd.Series(dtype='category') for col in CUBE_DIMENSIONS})
+    columns['Attendance of Students'] = pd.Series(dtype='int64')
+    return daily_attendance(pd.DataFrame(columns))
+
+
+class AttendanceCube:
+    # Daily attendance sums per kutir and shift, materialized once per data
+    # load. Every dashboard aggregation groups at or above this grain, so they
+    # can be answered from cube rows instead of raw form submissions: sums roll
+    # up unchanged and the weekly per-kutir day counts are counts of distinct
+    # cube days. The cube carries its own filter index, so the dashboard
+    # filters resolve against it exactly as they do against the raw rows.
+
+    @instrumented
+    def __init__(self, daily):
+        self.daily = daily
+        self.index = FilterIndex(daily)
+
+    def select(self, state, **filters):
+        return self.index.select(state, **filters)
+
+    def memory_usage(self):
+        return int(self.daily.memory_usage(deep=True).sum())
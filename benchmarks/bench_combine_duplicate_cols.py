@@ -0,0 +1,69 @@
+# benchmarks/bench_combine_duplicate_cols.py
+#
+# Times data.combined_duplicate_cols against the previous row-wise
+# apply(lambda row: ''.join(...), axis=1) on the mock export scaled up, with
+# the form's per-district copies of 'Kutir Name' and 'Cluster' restored.
+#
+#   python benchmarks/bench_combine_duplicate_cols.py --rows 1000000
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_source import data
+from sheet_sources import XlsxSource
+
+MOCK_XLSX = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Parivaar_Kutirs_Mock_Data.xlsx')
+
+
+def legacy_combined_duplicate_cols(sheet, column_like):
+    duplicate_name_cols = [col for col in sheet.columns if col.startswith(column_like)]
+    sheet[column_like] = sheet[duplicate_name_cols].apply(lambda row: ''.join(row.dropna().astype(str)), axis=1)
+    sheet.drop(columns=duplicate_name_cols[1:], inplace=True)
+
+
+def form_shaped_sheet(rows):
+    # Tile the mock export up to `rows` and spread 'Kutir Name'/'Cluster' over one
+    # column per district, answered only in the respondent's district
+    header_row, data_rows = XlsxSource(MOCK_XLSX).read_all()
+    headers = [col.split('-')[0].strip() for col in header_row]
+    mock = pd.DataFrame(data_rows, columns=headers)
+    sheet = mock.iloc[np.arange(rows) % len(mock)].reset_index(drop=True)
+
+    districts = sorted(sheet['District'].unique())
+    for column_like in ('Kutir Name', 'Cluster'):
+        values = sheet.pop(column_like)
+        for position, district in enumerate(districts):
+            name = column_like if position == 0 else f"{column_like}.{position}"
+            sheet[name] = values.where(sheet['District'] == district, '')
+    return sheet
+
+
+def time_it(function, sheet):
+    sheet = sheet.copy()
+    start = time.perf_counter()
+    function(sheet, 'Kutir Name')
+    function(sheet, 'Cluster')
+    return time.perf_counter() - start, sheet
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--skip-legacy', action='store_true', help="only time the vectorized path")
+    args = parser.parse_args()
+
+    sheet = form_shaped_sheet(args.rows)
+    pipeline = object.__new__(data.__wrapped__) # pipeline methods only, no data load
+    print(f"{len(sheet)} rows, {len([c for c in sheet.columns if c.startswith('Kutir Name')])} 'Kutir Name' copies")
+
+    vectorized_seconds, vectorized = time_it(pipeline.combined_duplicate_cols, sheet)
+    print(f"vectorized: {vectorized_seconds:.2f}s")
+
+    if not args.skip_legacy:
+        legacy_seconds, legacy = time_it(legacy_combined_duplicate_cols, sheet)
+        pd.testing.assert_frame_equal(vectorized, legacy)
+        print(f"row-wise apply: {legacy_seconds:.2f}s (identical output, {legacy_seconds / vectorized_seconds:.0f}x speedup)")
@@ -0,0 +1,172 @@
+# benchmarks/bench_pipeline.py
+#
+# Time and peak memory of every pipeline stage on synthetic form data
+# (benchmarks/synthetic_data.py) at each row count, from the instrumentation
+# spans: the full load (data.__init__ from a CSV export: read, clean, periods,
+# compaction, snapshot), the cube, and per frequency the attendance aggregates,
+# the kutir-type rollup, the KPIs and the district buckets. A timing pass runs
+# each size --repeats times (median per stage); a second pass with tracemalloc
+# records peak allocations, which it slows down, so its times are not used.
+#
+# --json writes the results for a later --baseline run, which exits 1 when a
+# stage got slower or allocates more by more than --tolerance:
+#
+#   python benchmarks/bench_pipeline.py --rows 10000 1000000 --json baseline.json
+#   python benchmarks/bench_pipeline.py --rows 10000 1000000 --baseline baseline.json
+#
+# 10M rows need ~10GB of RAM for the generated rows and the load.
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Snapshots go to a scratch directory, not next to the app's snapshot
+os.environ['SEVA_KUTIR_SNAPSHOT_DIR'] = tempfile.mkdtemp(prefix='bench_pipeline_')
+import pandas as pd
+import data_source
+import instrumentation
+from data_source import data
+from snapshot_cache import SNAPSHOT_DIR
+from synthetic_data import synthetic_rows, write_rows
+
+FREQUENCIES = ["Daily", "Weekly", "Monthly", "Yearly"]
+# Stages faster than this are too noisy to flag as regressions
+MIN_SECONDS = 0.005
+MIN_PEAK_BYTES = 1_000_000
+
+
+def load(source):
+    # A fresh full load of `source`, no snapshot and no refresh worker
+    data.destroy_instance()
+    shutil.rmtree(SNAPSHOT_DIR, ignore_errors=True)
+    os.environ['SEVA_KUTIR_SOURCE'] = source
+    return data()
+
+
+def run_stages(source):
+    # One pass over every stage; returns {stage: [span records]}. A stage is
+    # the step it ran in and the span name, e.g. 'Weekly/data.aggregate_attendance'.
+    stages = defaultdict(list)
+
+    def step(name, function):
+        mark = instrumentation.mark()
+        result = function()
+        # Spans are recorded as they finish; start order lists parents first
+        for record in sorted(instrumentation.spans_since(mark), key=lambda record: record['started_at']):
+            stages[f"{name}/{record['name']}"].append(record)
+        return result
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        pipeline = step('load', lambda: load(source))
+        step('cube', pipeline.get_attendance_cube)
+        state = pipeline.get_filter_index().options('State')[0]
+        for frequency in FREQUENCIES:
+            def frequency_stages():
+                agg_df, detailed_df = pipeline.attendance(state, frequency, {})
+                pipeline.kutir_attendance(state, frequency, {}, detailed_df)
+                pipeline.calculate_kpis(agg_df)
+                fig3a_df = pipeline.aggregate_district_attendance(detailed_df, frequency)
+                pipeline.district_buckets(fig3a_df)
+            step(frequency, frequency_stages)
+    return stages
+
+
+def stage_summary(stages):
+    # Calls of the same stage in one pass (e.g. both combined_duplicate_cols)
+    # add up; peaks are the largest single call
+    return {stage: {
+        'calls': len(records),
+        'seconds': sum(record['seconds'] for record in records),
+        'peak_bytes': max((record['peak_bytes'] or 0 for record in records), default=0),
+        'rows_in': records[0]['rows_in'],
+        'rows_out': records[0]['rows_out'],
+    } for stage, records in stages.items()}
+
+
+def bench(rows, repeats, memory, work_dir):
+    header_row, data_rows = synthetic_rows(rows)
+    source = os.path.join(work_dir, f"synthetic_{rows}.csv")
+    write_rows(header_row, data_rows, source)
+    del data_rows
+
+    instrumentation.configure('time')
+    passes = [stage_summary(run_stages(source)) for _ in range(repeats)]
+    results = {}
+    for stage, first in passes[0].items():
+        results[stage] = dict(first, rows=rows, stage=stage, peak_bytes=None,
+                              seconds=statistics.median(summary[stage]['seconds'] for summary in passes if stage in summary))
+    if memory:
+        instrumentation.configure('memory')
+        for stage, summary in stage_summary(run_stages(source)).items():
+            if stage in results:
+                results[stage]['peak_bytes'] = summary['peak_bytes']
+    instrumentation.configure('')
+    data.destroy_instance()
+    os.remove(source)
+    return list(results.values())
+
+
+def regressions(results, baseline, tolerance):
+    previous = {(result['rows'], result['stage']): result for result in baseline['results']}
+    found = []
+    for result in results:
+        before = previous.get((result['rows'], result['stage']))
+        if before is None:
+            continue
+        for metric, floor in [('seconds', MIN_SECONDS), ('peak_bytes', MIN_PEAK_BYTES)]:
+            if result[metric] is None or before[metric] is None or max(result[metric], before[metric]) < floor:
+                continue
+            if result[metric] > before[metric] * (1 + tolerance):
+                found.append(f"{result['rows']:>12,} {result['stage']}: {metric} {before[metric]:,.3f} -> {result[metric]:,.3f}")
+    return found
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc pass")
+    parser.add_argument('--json', help="write the results to this file")
+    parser.add_argument('--baseline', help="results of an earlier --json run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed growth per stage, 0.25 = 25%%")
+    args = parser.parse_args()
+
+    # Refreshes would reload the source in the background mid-benchmark
+    data_source.REFRESH_INTERVAL_SECONDS = 0
+    work_dir = tempfile.mkdtemp(prefix='bench_pipeline_sources_')
+    results = []
+    print(f"{'rows':>12} {'stage':<52} {'calls':>5} {'seconds':>9} {'peak MB':>9} {'rows out':>12}")
+    for rows in args.rows:
+        for result in bench(rows, args.repeats, not args.no_memory, work_dir):
+            results.append(result)
+            peak = f"{result['peak_bytes'] / 1e6:>9.1f}" if result['peak_bytes'] is not None else f"{'':>9}"
+            rows_out = f"{result['rows_out']:>12,}" if result['rows_out'] is not None else f"{'':>12}"
+            print(f"{rows:>12,} {result['stage']:<52} {result['calls']:>5} {result['seconds']:>9.3f} {peak} {rows_out}")
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'cpu_count': os.cpu_count(),
+        'repeats': args.repeats,
+        'results': results,
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f"Regression: {line}")
+        sys.exit(1 if found else 0)
@@ -0,0 +1,109 @@
+# benchmarks/bench_query_engine.py
+#
+# Dashboard query latency on the pandas path against the DuckDB engine, on
+# the cleaned mock export tiled forward in time to each row count. Setup is
+# the one-off cost per data load (cube and filter index, or loading the
+# database); a query is one dashboard rerun worth of work for a filter state:
+# the filter cascade, the attendance aggregates and the kutir-type rollup.
+# Needs the optional duckdb package (requirements-duckdb.txt).
+#
+#   python benchmarks/bench_query_engine.py --rows 10000 1000000 10000000
+import argparse
+import io
+import os
+import sys
+import contextlib
+import statistics
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Database files go to a scratch directory, not next to the app's snapshot
+os.environ['SEVA_KUTIR_SNAPSHOT_DIR'] = tempfile.mkdtemp(prefix='bench_query_engine_')
+import data_source
+import query_engine
+from data_source import data, clean_source_rows
+from period_calendar import build_calendar, calendar_week_ranges, day_keys, period_keys
+from sheet_sources import XlsxSource
+
+MOCK_XLSX = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Parivaar_Kutirs_Mock_Data.xlsx')
+FREQUENCIES = ["Daily", "Weekly", "Monthly", "Yearly"]
+
+
+def tiled_data(rows):
+    # A data instance without a source: the cleaned mock rows repeated, each
+    # copy moved past the previous one by whole weeks, so longer runs cover
+    # more periods rather than piling onto the same days
+    with contextlib.redirect_stdout(io.StringIO()):
+        mock, _, _, _ = clean_source_rows(*XlsxSource(MOCK_XLSX).read_all())
+    copies = -(-rows // len(mock))
+    span_days = ((mock['Date'].max() - mock['Date'].min()).days // 7 + 1) * 7
+    sheet = mock.iloc[np.arange(rows) % len(mock)].reset_index(drop=True)
+    sheet['Date'] = sheet['Date'] + pd.to_timedelta(np.repeat(np.arange(copies) * span_days, len(mock))[:rows], unit='D')
+    sheet['Timestamp'] = sheet['Date']
+    days = day_keys(sheet['Date'])
+    for col, keys in period_keys(days).items():
+        sheet[col] = keys
+
+    pipeline = object.__new__(data.__wrapped__)
+    pipeline.sheet, pipeline.daily, pipeline.raw_store = sheet, None, None
+    pipeline.calendar = build_calendar(days)
+    pipeline.week_ranges = calendar_week_ranges(pipeline.calendar)
+    pipeline.data_version = 0
+    pipeline.invalidate_derived()
+    return pipeline
+
+
+def rerun(pipeline, state, filters):
+    # What one dashboard rerun asks of the data layer for one filter state
+    index = pipeline.get_filter_index()
+    districts = index.options('District', state=state)
+    index.options('Cluster', state=state, districts=districts)
+    index.options('Kutir Name', state=state, districts=districts)
+    index.date_bounds(state)
+    index.count(state, **filters)
+    for frequency in FREQUENCIES:
+        agg_df, detailed_df = pipeline.attendance(state, frequency, filters)
+        pipeline.kutir_attendance(state, frequency, filters, detailed_df)
+
+
+def time_engine(pipeline, engine, repeats):
+    data_source.QUERY_ENGINE = engine
+    pipeline.invalidate_derived()
+    start = time.perf_counter()
+    if engine == 'duckdb':
+        pipeline.get_engine()
+    else:
+        pipeline.get_filter_index()
+        pipeline.get_attendance_cube()
+    setup = time.perf_counter() - start
+
+    state = pipeline.get_filter_index().options('State')[0]
+    districts = pipeline.get_filter_index().options('District', state=state)
+    filter_states = [{}, {'districts': districts[:2]}, {'districts': districts[:1], 'shift': pipeline.get_filter_index().options('Shift')[0]}]
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeats):
+            for filters in filter_states:
+                start = time.perf_counter()
+                rerun(pipeline, state, filters)
+                timings.append(time.perf_counter() - start)
+    return setup, statistics.median(timings)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    if not query_engine.DUCKDB_INSTALLED:
+        sys.exit("duckdb is not installed: pip install -r requirements-duckdb.txt")
+
+    print(f"{'rows':>12} {'engine':>8} {'setup':>9} {'query (median)':>15}")
+    for rows in args.rows:
+        pipeline = tiled_data(rows)
+        for engine in ['pandas', 'duckdb']:
+            setup, query = time_engine(pipeline, engine, args.repeats)
+            print(f"{rows:>12,} {engine:>8} {setup:>8.2f}s {query:>14.3f}s")
@@ -0,0 +1,142 @@
+# benchmarks/bench_startup.py
+#
+# Startup cost of the dashboard, measured in fresh processes on synthetic form
+# data (benchmarks/synthetic_data.py):
+#
+# - imports: wall time of importing each app module in a new interpreter, and
+#   which of the heavy optional packages that import pulled in
+# - first paint: a new process with the snapshot on disk and nothing loaded
+#   runs Kutir_App.py under Streamlit's AppTest with SEVA_KUTIR_PROFILE=time.
+#   The script's laps give the time from the start of the run until the
+#   filter widgets are out (first paint), until the page skeleton is out and
+#   until the whole page is drawn, including the script's own imports. A
+#   second run in the same process is the warm case every later rerun sees.
+#
+# Each figure is the median of --repeats processes:
+#
+#   python benchmarks/bench_startup.py --rows 10000 1000000
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, 'Kutir_App.py')
+MODULES = ['settings', 'dimension_index', 'snapshot_cache', 'instrumentation', 'raw_store', 'charts', 'exports', 'sheet_sources', 'query_engine',
+           'data_source', 'headless']
+HEAVY_PACKAGES = ['numpy', 'pandas', 'pyarrow', 'plotly', 'gspread', 'google.oauth2', 'openpyxl', 'xlsxwriter', 'duckdb']
+# Laps of Kutir_App.py marking each milestone of a run
+FIRST_PAINT_LAP = 'dashboard.filters'
+SKELETON_LAP = 'dashboard.skeleton'
+FULL_PAGE_LAP = 'dashboard.session table'
+
+
+def import_child(module):
+    # In a fresh interpreter: seconds to import `module` and the heavy packages it loaded
+    started = time.perf_counter()
+    __import__(module)
+    seconds = time.perf_counter() - started
+    print(json.dumps({'seconds': seconds, 'heavy': [name for name in HEAVY_PACKAGES if name in sys.modules]}))
+
+
+def app_child():
+    # In a fresh process: {run: {lap: seconds from the start of the run to the end of the lap}}
+    from streamlit.testing.v1 import AppTest
+    import instrumentation
+    results = {}
+    app = AppTest.from_file(APP, default_timeout=600)
+    for run in ['cold', 'warm']:
+        mark = instrumentation.mark()
+        started = time.time()
+        app.run()
+        if app.exception:
+            raise RuntimeError(f"Kutir_App.py failed: {app.exception}")
+        results[run] = {record['name']: record['started_at'] + record['seconds'] - started
+                        for record in instrumentation.spans_since(mark) if record['name'].startswith('dashboard.')}
+    print(json.dumps(results))
+
+
+def run_child(args, env):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__)] + args, env=env, cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def bench_imports(repeats, env):
+    results = []
+    for module in MODULES:
+        runs = [run_child(['--import-child', module], env) for _ in range(repeats)]
+        results.append({'module': module, 'seconds': statistics.median(run['seconds'] for run in runs), 'heavy': runs[0]['heavy']})
+    return results
+
+
+def bench_app(rows, repeats, env, work_dir):
+    from synthetic_data import synthetic_rows, write_rows
+    source = os.path.join(work_dir, f"synthetic_{rows}.csv")
+    header_row, data_rows = synthetic_rows(rows)
+    write_rows(header_row, data_rows, source)
+    del data_rows
+    env = dict(env, SEVA_KUTIR_SOURCE=source, SEVA_KUTIR_SNAPSHOT_DIR=os.path.join(work_dir, f"snapshot_{rows}"),
+               SEVA_KUTIR_PROFILE='time', SEVA_KUTIR_REFRESH_SECONDS='0')
+    # The first process loads the source and writes the snapshot every later start reads
+    run_child(['--app-child'], env)
+    runs = [run_child(['--app-child'], env) for _ in range(repeats)]
+    results = []
+    for run in ['cold', 'warm']:
+        result = {'rows': rows, 'run': run}
+        for milestone, lap in [('first_paint', FIRST_PAINT_LAP), ('skeleton', SKELETON_LAP), ('full_page', FULL_PAGE_LAP)]:
+            times = [laps[run][lap] for laps in runs if lap in laps[run]]
+            result[milestone] = statistics.median(times) if times else None
+        results.append(result)
+    os.remove(source)
+    return results
+
+
+def seconds_text(value):
+    return f"{value:>10.3f}" if value is not None else f"{'-':>10}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 200_000])
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--json', help="write the results to this file")
+    parser.add_argument('--import-child', help=argparse.SUPPRESS)
+    parser.add_argument('--app-child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.import_child:
+        sys.path.insert(0, ROOT)
+        import_child(args.import_child)
+        sys.exit(0)
+    if args.app_child:
+        sys.path.insert(0, ROOT)
+        app_child()
+        sys.exit(0)
+
+    env = dict(os.environ)
+    env.pop('SEVA_KUTIR_PROFILE', None)
+    imports = bench_imports(args.repeats, env)
+    print(f"{'module':<18} {'import s':>10}  heavy packages loaded")
+    for result in imports:
+        print(f"{result['module']:<18} {result['seconds']:>10.3f}  {', '.join(result['heavy']) or '-'}")
+
+    work_dir = tempfile.mkdtemp(prefix='bench_startup_')
+    app = []
+    print(f"\n{'rows':>12} {'run':<6} {'first paint':>11} {'skeleton':>10} {'full page':>10}")
+    for rows in args.rows:
+        for result in bench_app(rows, args.repeats, env, work_dir):
+            app.append(result)
+            print(f"{rows:>12,} {result['run']:<6} {seconds_text(result['first_paint']):>11} {seconds_text(result['skeleton'])} "
+                  f"{seconds_text(result['full_page'])}")
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'repeats': args.repeats,
+                       'imports': imports, 'app': app}, f, indent=2)
@@ -0,0 +1,162 @@
+# benchmarks/synthetic_data.py
+#
+# Form-shaped attendance data at any scale, for load tests and the pipeline
+# benchmark. Rows look like what the Sheets API returns for the form: every
+# cell as text, the bilingual 'Question - प्रश्न' headers, and one copy of the
+# 'Cluster' and 'Kutir Name' questions per district, answered only in the
+# respondent's district. Kutirs sit in a state > district > cluster hierarchy,
+# report an AM and often a PM shift, skip Sundays and some other days, and
+# their attendance varies around a per-kutir baseline.
+#
+# Cells are shared string objects looked up from small tables, so memory is
+# about 8 bytes per cell: 10M rows with 12 districts need ~3GB.
+#
+#   python benchmarks/synthetic_data.py --rows 1000000 --out synthetic_1m.csv
+import argparse
+import numpy as np
+import pandas as pd
+
+STATES = ['Madhya Pradesh', 'Jharkhand', 'Uttar Pradesh', 'Chhattisgarh', 'Rajasthan', 'Bihar']
+KUTIR_TYPES = ['Shiksha Kutir', 'Seva Kutir', 'Study Center']
+SHIFTS = ['AM', 'PM']
+# First and last submission time of each shift, seconds after midnight
+SHIFT_WINDOWS = [(9 * 3600, 13 * 3600), (14 * 3600, 18 * 3600)]
+# Submission times are drawn from this many steps per shift window, so the
+# timestamp strings repeat across kutirs and can be shared
+TIME_STEPS = 480
+
+HEADERS = {
+    'Timestamp': 'Timestamp',
+    'Datetime': 'Datetime',
+    'Teachers Name': 'Teachers Name - शिक्षक का नाम',
+    'Teachers Phone Number': 'Teachers Phone Number - शिक्षक का फोन नंबर',
+    'Date': 'Date',
+    'Shift': 'Shift - शिफ्ट',
+    'Attendance of Students': 'Attendance of Students - उपस्थित छात्रों की संख्या',
+    'Kutir': 'Type of Kutir - कुटिर',
+    'State': 'State - राज्य',
+    'District': 'District - जिला',
+    'Cluster': 'Cluster - समूह',
+    'Kutir Name': 'Kutir Name - कुटिर नाम',
+}
+
+
+def lookup(table, codes):
+    # Object array of table[code] per row; equal cells are one string object
+    return np.array(table, dtype=object)[codes]
+
+
+def synthetic_rows(rows, districts=12, states=2, clusters_per_district=3, kutirs=None, start_date='2025-01-01',
+                   missing_rate=0.08, blank_rate=0.005, seed=0):
+    # (header row, object array of rows), like SheetSource.read_all. kutirs
+    # defaults to one per ~2000 rows (at least 45, like the mock export); the
+    # date range grows until there are enough submissions.
+    rng = np.random.default_rng(seed)
+    kutirs = kutirs or max(45, rows // 2000)
+    states = min(states, len(STATES), districts)
+
+    # Hierarchy: kutirs round-robin over districts, districts over states
+    district_state = np.arange(districts) % states
+    kutir_district = np.arange(kutirs) % districts
+    kutir_cluster = kutir_district * clusters_per_district + (np.arange(kutirs) // districts) % clusters_per_district
+    kutir_type = rng.integers(0, len(KUTIR_TYPES), kutirs)
+    kutir_two_shifts = rng.random(kutirs) < 0.7
+    kutir_baseline = rng.normal(110, 35, kutirs).clip(15, 250)
+
+    # Every (day, kutir, shift) slot in date order until enough are reported
+    slots_per_day = kutirs * len(SHIFTS)
+    expected_per_day = max((kutirs + kutir_two_shifts.sum()) * (1 - missing_rate) * 6 / 7, 1)
+    days = int(rows / expected_per_day * 1.1) + 7
+    while True:
+        slot = np.arange(days * slots_per_day, dtype=np.int64)
+        day, kutir, shift = slot // slots_per_day, (slot // len(SHIFTS)) % kutirs, slot % len(SHIFTS)
+        dates = pd.Timestamp(start_date) + pd.to_timedelta(np.arange(days), unit='D')
+        reported = ((shift == 0) | kutir_two_shifts[kutir]) & (dates.dayofweek.to_numpy()[day] != 6) & (rng.random(len(slot)) >= missing_rate)
+        if reported.sum() >= rows:
+            break
+        days *= 2
+    day, kutir, shift = day[reported][:rows], kutir[reported][:rows], shift[reported][:rows]
+
+    # Submission time within the shift window; the sheet is in submission order
+    step = rng.integers(0, TIME_STEPS, rows)
+    time_key = (day * len(SHIFTS) + shift) * TIME_STEPS + step
+    order = np.argsort(time_key, kind='stable')
+    day, kutir, shift, time_key = day[order], kutir[order], shift[order], time_key[order]
+    time_keys, time_codes = np.unique(time_key, return_inverse=True)
+    key_shift = (time_keys // TIME_STEPS) % len(SHIFTS)
+    window_start = np.array([start for start, _ in SHIFT_WINDOWS])[key_shift]
+    window_length = np.array([end - start for start, end in SHIFT_WINDOWS])[key_shift]
+    seconds = window_start + (time_keys % TIME_STEPS) * window_length // TIME_STEPS
+    times = dates[time_keys // TIME_STEPS // len(SHIFTS)] + pd.to_timedelta(seconds, unit='s')
+    timestamps = lookup(times.strftime('%Y-%m-%d %H:%M:%S').tolist(), time_codes)
+
+    # Attendance around the kutir's baseline, PM a little lower, some left blank
+    attendance = np.rint(kutir_baseline[kutir] * (1 - 0.1 * shift) * rng.normal(1, 0.15, rows)).clip(0).astype(np.int64)
+    attendance_text = lookup([str(value) for value in range(attendance.max() + 1)], attendance)
+    attendance_text[rng.random(rows) < blank_rate] = ''
+
+    teacher = kutir * len(SHIFTS) + shift
+    district_names = [f"{STATES[district_state[d]][:2].upper()} District {d + 1:02d}" for d in range(districts)]
+    cluster_names = [f"{district_names[c // clusters_per_district]} Cluster {c % clusters_per_district + 1}"
+                     for c in range(districts * clusters_per_district)]
+    kutir_names = [f"{district_names[kutir_district[k]].replace(' ', '_')}_Kutir_{k + 1}" for k in range(kutirs)]
+    row_district = kutir_district[kutir]
+    columns = {
+        'Timestamp': timestamps,
+        'Datetime': timestamps,
+        'Teachers Name': lookup([f"Teacher {t:05d}" for t in range(kutirs * len(SHIFTS))], teacher),
+        'Teachers Phone Number': lookup([str(9000000000 + t) for t in range(kutirs * len(SHIFTS))], teacher),
+        'Date': lookup(dates.strftime('%Y-%m-%d').tolist(), day),
+        'Shift': lookup(SHIFTS, shift),
+        'Attendance of Students': attendance_text,
+        'Kutir': lookup(KUTIR_TYPES, kutir_type[kutir]),
+        'State': lookup(STATES, district_state[row_district]),
+        'District': lookup(district_names, row_district),
+    }
+    clusters = lookup(cluster_names, kutir_cluster[kutir])
+    names = lookup(kutir_names, kutir)
+
+    header_row = [HEADERS[col] for col in columns]
+    values = list(columns.values())
+    # The form asks for the cluster and the kutir name once per district
+    for district in range(districts):
+        in_district = row_district == district
+        header_row += [HEADERS['Cluster'], HEADERS['Kutir Name']]
+        values += [np.where(in_district, clusters, ''), np.where(in_district, names, '')]
+    return header_row, np.column_stack(values)
+
+
+def unique_headers(header_row):
+    # Parquet needs unique column names: later copies get a '.N' suffix, which
+    # the cleaning pipeline drops along with the ' - ...' part
+    counts = {}
+    unique = []
+    for col in header_row:
+        counts[col] = counts.get(col, -1) + 1
+        unique.append(col if counts[col] == 0 else f"{col}.{counts[col]}")
+    return unique
+
+
+def write_rows(header_row, data_rows, path):
+    # .csv keeps the duplicated headers exactly as the sheet has them
+    if path.lower().endswith('.csv'):
+        pd.DataFrame(data_rows, columns=header_row).to_csv(path, index=False)
+    elif path.lower().endswith(('.parquet', '.pq')):
+        pd.DataFrame(data_rows, columns=unique_headers(header_row)).to_parquet(path, index=False)
+    else:
+        raise ValueError(f"Unsupported output format: {path}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--districts', type=int, default=12)
+    parser.add_argument('--states', type=int, default=2)
+    parser.add_argument('--kutirs', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', required=True, help=".csv or .parquet")
+    args = parser.parse_args()
+
+    header_row, data_rows = synthetic_rows(args.rows, districts=args.districts, states=args.states, kutirs=args.kutirs, seed=args.seed)
+    write_rows(header_row, data_rows, args.out)
+    print(f"Wrote {len(data_rows):,} rows x {len(header_row)} columns to {args.out}")
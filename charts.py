@@ -0,0 +1,188 @@
+# charts.py
+import numpy as np
+import pandas as pd
+
+# plotly.graph_objects is imported by each figure function on first use: the
+# data layer imports this module for ATTENDANCE_CATEGORIES, and an app process
+# should not pay for plotly before it draws its first chart
+
+# Payload bounds: the trend line is decimated to at most this many points and
+# the district chart keeps this many districts, folding the rest into one bar
+MAX_TREND_POINTS = 500
+TOP_DISTRICTS = 20
+
+KUTIR_COLORS = {
+    "Study Center": "#160642",
+    "Seva Kutir": "#aec7e8",
+    "Shiksha Kutir": "#4c78a8",
+}
+ATTENDANCE_CATEGORIES = ['<50', '50-75', '76-100', '100+', 'Unknown']
+CHART_MARGIN = dict(l=20, r=20, t=40, b=20)
+
+
+def figure_from_json(spec):
+    # A new Figure from a cached fig.to_json() spec
+    import plotly.io as pio
+    return pio.from_json(spec)
+
+
+def lttb(values, threshold):
+    # Largest-Triangle-Three-Buckets down-sampling over evenly spaced x.
+    # Returns the positions to keep: the first and last point, plus from each
+    # bucket in between the point forming the largest triangle with the point
+    # kept before it and the average of the next bucket. Peaks and dips
+    # survive, unlike with plain striding.
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    values = np.nan_to_num(np.asarray(values, dtype=np.float64))
+    bucket_size = (n - 2) / (threshold - 2)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0] = previous = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        stop = int((bucket + 1) * bucket_size) + 1
+        next_stop = min(int((bucket + 2) * bucket_size) + 1, n)
+        next_x = (stop + next_stop - 1) / 2
+        next_y = values[stop:next_stop].mean()
+        candidates = np.arange(start, stop)
+        areas = np.abs((previous - next_x) * (values[candidates] - values[previous])
+                       - (previous - candidates) * (next_y - values[previous]))
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    kept[-1] = n - 1
+    return kept
+
+
+def trend_figure(periods, values, average, frequency, max_points=MAX_TREND_POINTS):
+    # Attendance per period with points below the average in red
+    periods = np.asarray(periods, dtype=object)
+    values = np.asarray(values, dtype=np.float64)
+    kept = lttb(values, max_points)
+    title = f"Student Attendance vs Period ({frequency})"
+    if len(kept) < len(values):
+        title += f" - {len(kept)} of {len(values)} points shown"
+    periods, values = periods[kept], values[kept]
+    below = values < average
+
+    import plotly.graph_objects as go
+    fig1 = go.Figure()
+    fig1.add_trace(go.Scatter(
+        x=periods,
+        y=values,
+        mode='lines+markers',
+        line=dict(color='gray'),
+        marker=dict(color=np.where(below, 'red', 'blue')),
+        name='Attendance'
+    ))
+    fig1.add_trace(go.Scatter(
+        x=periods[below],
+        y=values[below],
+        mode='markers',
+        marker=dict(color='red', size=10),
+        name=f'Below {frequency} Average'
+    ))
+    fig1.add_trace(go.Scatter(
+        x=periods[~below],
+        y=values[~below],
+        mode='markers',
+        marker=dict(color='blue', size=10),
+        name=f'Above {frequency} Average'
+    ))
+    fig1.add_hline(
+        y=average,
+        line_dash="dot",
+        annotation_text=f"Avg: {average:.2f}",
+        annotation_position="bottom right",
+        line_color="green"
+    )
+    fig1.update_layout(title=title, margin=CHART_MARGIN)
+    fig1.update_xaxes(type='category', tickangle=45)
+    return fig1
+
+
+def rolling_figure(trend_df, mode, max_points=MAX_TREND_POINTS):
+    # Trailing-window average per day, decimated like the trend line
+    values = trend_df['Attendance of Students'].to_numpy(dtype=np.float64)
+    kept = lttb(values, max_points)
+    title = f"Student Attendance, {mode} (average daily attendance per kutir)"
+    if len(kept) < len(values):
+        title += f" - {len(kept)} of {len(values)} points shown"
+    import plotly.graph_objects as go
+    fig1 = go.Figure()
+    fig1.add_trace(go.Scatter(
+        x=trend_df['Period'].to_numpy(dtype=object)[kept],
+        y=values[kept],
+        mode='lines',
+        line=dict(color='#4c78a8'),
+        customdata=trend_df['Kutirs'].to_numpy()[kept],
+        hovertemplate='%{x}<br>%{y:.2f} students<br>%{customdata} kutirs<extra></extra>',
+        name=mode
+    ))
+    fig1.update_layout(title=title, margin=CHART_MARGIN)
+    fig1.update_xaxes(type='category', tickangle=45)
+    return fig1
+
+
+def change_figure(trend_df):
+    # Week-over-week change of the weekly average, falls in red
+    change = trend_df['Change'].to_numpy(dtype=np.float64)
+    import plotly.graph_objects as go
+    fig1 = go.Figure()
+    fig1.add_trace(go.Bar(
+        x=trend_df['Period'].to_numpy(dtype=object),
+        y=change,
+        marker_color=np.where(change < 0, 'red', 'green'),
+        customdata=np.column_stack([trend_df['Attendance of Students'].to_numpy(), trend_df['Change %'].to_numpy()]),
+        hovertemplate='%{x}<br>Change %{y:.2f} (%{customdata[1]:.1f}%)<br>Weekly avg %{customdata[0]:.2f}<extra></extra>',
+        name='Change'
+    ))
+    fig1.update_layout(title="Week-over-Week Change in Weekly Avg Attendance", margin=CHART_MARGIN,
+                       yaxis_title='Change in students')
+    fig1.update_xaxes(type='category', tickangle=45)
+    return fig1
+
+
+def kutir_type_figure(agg_kutir_df, frequency):
+    # Stacked attendance per period, one trace per kutir type
+    import plotly.graph_objects as go
+    fig2 = go.Figure()
+    for kutir, part in agg_kutir_df.groupby('Kutir', sort=False, observed=True):
+        fig2.add_trace(go.Bar(
+            x=part['Period'].to_numpy(dtype=object),
+            y=part['Attendance of Students'].to_numpy(),
+            name=str(kutir),
+            marker_color=KUTIR_COLORS.get(kutir),
+        ))
+    fig2.update_layout(title=f"Kutir Type vs Period ({frequency})", barmode='stack', legend_title_text='Kutir',
+                       xaxis_title='Period', yaxis_title='Attendance of Students', margin=CHART_MARGIN)
+    fig2.update_xaxes(type='category', tickangle=45)
+    return fig2
+
+
+def top_districts(bucket_counts, top_n=TOP_DISTRICTS):
+    # Keeps the top_n districts by number of kutirs, in their original order,
+    # and sums the rest into one "Other districts" row
+    if len(bucket_counts) <= top_n:
+        return bucket_counts
+    totals = bucket_counts[ATTENDANCE_CATEGORIES].sum(axis=1).to_numpy()
+    keep = np.zeros(len(bucket_counts), dtype=bool)
+    keep[np.argsort(-totals, kind='stable')[:top_n]] = True
+    rest = bucket_counts[~keep]
+    other = rest[ATTENDANCE_CATEGORIES].sum().to_frame().T
+    other.insert(0, 'District', f"Other districts ({len(rest)})")
+    return pd.concat([bucket_counts[keep], other], ignore_index=True)
+
+
+def district_bucket_figure(bucket_counts, frequency, top_n=TOP_DISTRICTS):
+    # Stacked number of kutirs per attendance category for each district
+    # label; bucket_counts has a District column and one column per category
+    bucket_counts = top_districts(bucket_counts, top_n)
+    districts = bucket_counts['District'].astype(str).to_numpy(dtype=object)
+    import plotly.graph_objects as go
+    fig3 = go.Figure()
+    for category in ATTENDANCE_CATEGORIES:
+        fig3.add_trace(go.Bar(x=districts, y=bucket_counts[category].to_numpy(), name=category))
+    fig3.update_layout(title=f'Kutir Attendance Category Distribution by District({frequency})', barmode='stack',
+                       legend_title_text='Attendance Category', xaxis_title='District', yaxis_title='Number of Kutirs')
+    return fig3
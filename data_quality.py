@@ -0,0 +1,130 @@
+# data_quality.py
+import numpy as np
+import pandas as pd
+from attendance_cube import CUBE_DIMENSIONS
+from instrumentation import instrumented
+
+# A row without a value in each of these cannot be counted anywhere
+REQUIRED_COLUMNS = ['Timestamp', 'State', 'District', 'Kutir Name', 'Attendance of Students']
+# Attendance above this is an entry error (an extra digit, a phone number),
+# not a big day: synthetic and real kutirs stay well below 300
+MAX_ATTENDANCE = 500
+# Two submissions for the same kutir, day and shift are one resubmitted form.
+# This is the grain of the daily cube, so after deduplication every cube row
+# is exactly one submission.
+SUBMISSION_KEY = ['Date'] + CUBE_DIMENSIONS
+DUPLICATE_REASON = 'duplicate submission'
+
+# Quarantined rows as entered, with every reason they were held back for
+QUARANTINE_COLUMNS = ['Timestamp', 'State', 'District', 'Cluster', 'Kutir Name', 'Kutir', 'Shift', 'Attendance of Students', 'Reason']
+
+
+def empty_quarantine():
+    return pd.DataFrame({col: pd.Series(dtype=object) for col in QUARANTINE_COLUMNS})
+
+
+def check_schema(sheet):
+    # Adds each missing required column as blanks, so its rows are quarantined
+    # with a reason instead of failing the load further down. Returns the
+    # missing columns.
+    missing = [col for col in REQUIRED_COLUMNS if col not in sheet.columns]
+    for col in missing:
+        sheet[col] = None
+    if missing:
+        print(f"Warning: Source rows have no {', '.join(missing)} column; they are quarantined")
+    return missing
+
+
+def blank(values):
+    return (values.isna() | values.astype(object).eq('')).to_numpy()
+
+
+@instrumented
+def validate_rows(sheet, entered):
+    # Row checks on the converted sheet, one vectorized mask per reason.
+    # entered holds the Timestamp and attendance columns as read from the
+    # source, before conversion, to tell a blank cell from an unreadable one.
+    # Returns the rows that passed and the quarantined ones.
+    timestamp = sheet['Timestamp']
+    attendance = sheet['Attendance of Students'].to_numpy(dtype=float, na_value=np.nan)
+    timestamp_blank = blank(entered['Timestamp'])
+    attendance_blank = blank(entered['Attendance of Students'])
+    reasons = {'missing Timestamp': timestamp_blank,
+               'unreadable Timestamp': timestamp.isna().to_numpy() & ~timestamp_blank}
+    for col in ['State', 'District', 'Kutir Name']:
+        reasons[f"missing {col}"] = blank(sheet[col])
+    with np.errstate(invalid='ignore'):
+        reasons.update({
+            'missing attendance': attendance_blank,
+            'attendance not a number': np.isnan(attendance) & ~attendance_blank,
+            'attendance not a whole number': np.isfinite(attendance) & (attendance != np.round(attendance)),
+            'negative attendance': attendance < 0,
+            f"attendance above {MAX_ATTENDANCE}": attendance > MAX_ATTENDANCE,
+        })
+    return quarantine_rows(sheet, reasons, entered)
+
+
+def quarantine_rows(sheet, reasons, entered=None):
+    # Splits sheet on {reason: row mask}: (rows matching no reason, quarantined
+    # rows with their reasons joined). Cheap when nothing matches, the usual case.
+    flagged = np.logical_or.reduce(list(reasons.values()))
+    if not flagged.any():
+        return sheet, empty_quarantine()
+    held = np.full(flagged.sum(), '', dtype=object)
+    for name, mask in reasons.items():
+        mask = mask[flagged]
+        held = np.where(mask, np.where(held == '', name, held + '; ' + name), held)
+
+    quarantine = pd.DataFrame(index=range(len(held)))
+    for col in QUARANTINE_COLUMNS[:-1]:
+        values = entered[col] if entered is not None and col in entered else sheet[col] if col in sheet.columns else None
+        quarantine[col] = '' if values is None else values[flagged].astype(object).where(lambda v: v.notna(), '').astype(str).to_numpy()
+    quarantine['Reason'] = held
+    kept = sheet[~flagged]
+    # A new index in place; reset_index would copy every column again
+    kept.index = pd.RangeIndex(len(kept))
+    return kept, quarantine
+
+
+def submission_keys(frame):
+    # One 64-bit hash per row of its submission key. A column the frame lacks
+    # hashes as blanks, so sources of different form versions agree, and a
+    # categorical column hashes like its values.
+    columns = {col: frame[col] if col in frame.columns else pd.Series(None, index=frame.index, dtype=object)
+               for col in SUBMISSION_KEY}
+    return pd.util.hash_pandas_object(pd.DataFrame(columns), index=False).to_numpy()
+
+
+class SubmissionKeys:
+    # The sorted key hashes of every submission kept so far. Like RawStore it
+    # is never modified: claimed() returns a new object, so a refreshed copy
+    # never changes the keys of the data it was copied from.
+
+    def __init__(self, keys=None):
+        self.keys = np.unique(keys) if keys is not None else np.empty(0, dtype=np.uint64)
+
+    @classmethod
+    @instrumented
+    def from_frame(cls, frame):
+        # From the cleaned sheet or the daily cube: both hold one row per kept submission
+        return cls(submission_keys(frame))
+
+    def claimed(self, keys):
+        # (mask of the rows that are first submissions, the keys with them
+        # added): a row is a duplicate if its key was kept before or occurs
+        # earlier in `keys`
+        first = ~pd.Series(keys).duplicated().to_numpy()
+        if len(self.keys):
+            positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+            first &= self.keys[positions] != keys
+        return first, SubmissionKeys(np.concatenate([self.keys, keys[first]]))
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def reason_counts(quarantine):
+    # Quarantined rows per reason, most frequent first; a row held back for
+    # several reasons counts under each
+    reasons = quarantine['Reason'].str.split('; ').explode()
+    return reasons.value_counts().rename_axis('Reason').reset_index(name='Rows')
@@ -0,0 +1,84 @@
+# dimension_index.py
+import json
+from datetime import datetime
+from instrumentation import instrumented
+
+# Cascading dashboard filters, in widget order, as in filter_index.py
+HIERARCHY_COLUMNS = ['State', 'District', 'Cluster', 'Kutir Name', 'Kutir']
+
+
+class DimensionIndex:
+    # The filter choices of one data load without its rows: the distinct
+    # hierarchy paths, the shifts and each state's first and last date. It is
+    # saved next to the snapshot, and a process that has not loaded the data
+    # yet renders the filter widgets from it. It answers the options and
+    # date_bounds calls of FilterIndex from plain lists, so reading it needs
+    # neither pandas nor the data.
+
+    def __init__(self, columns, paths, shifts, date_bounds):
+        self.columns = columns
+        self.paths = paths
+        self.shifts = shifts
+        # {state: (first, last)} as datetimes
+        self.bounds = date_bounds
+
+    @classmethod
+    @instrumented
+    def from_frame(cls, frame):
+        # From the cleaned sheet or the daily cube; both carry every filter column
+        columns = [col for col in HIERARCHY_COLUMNS if col in frame.columns]
+        paths = frame.groupby(columns, observed=True).size().index.tolist() if columns else []
+        if len(columns) == 1:
+            paths = [(path,) for path in paths]
+        shifts = sorted(frame['Shift'].dropna().unique().tolist()) if 'Shift' in frame.columns else []
+        dates = frame.groupby('State', observed=True)['Date'].agg(['min', 'max']).dropna()
+        bounds = {str(state): (first.to_pydatetime(), last.to_pydatetime()) for state, (first, last) in dates.iterrows()}
+        return cls(columns, [[str(value) for value in path] for path in paths], [str(shift) for shift in shifts], bounds)
+
+    def options(self, col, state=None, districts=None, clusters=None, kutir_names=None):
+        # Sorted choices for a filter widget given the selections above it
+        if col == 'Shift':
+            return list(self.shifts)
+        paths = self.paths
+        for parent, selected in [('State', [state] if state is not None else None), ('District', districts),
+                                 ('Cluster', clusters), ('Kutir Name', kutir_names)]:
+            if parent == col:
+                break
+            if selected is not None:
+                position = self.columns.index(parent)
+                selected = set(selected)
+                paths = [path for path in paths if path[position] in selected]
+        position = self.columns.index(col)
+        return sorted({path[position] for path in paths})
+
+    def date_bounds(self, state):
+        # (first, last) date recorded for a state, or None
+        return self.bounds.get(state)
+
+    def count(self, state, **filters):
+        # Row counts need the rows: unknown (None) until the data is loaded
+        return None
+
+    def state(self):
+        # JSON-serializable form, see from_state
+        return {
+            'columns': self.columns,
+            'paths': self.paths,
+            'shifts': self.shifts,
+            'date_bounds': {state: [first.isoformat(), last.isoformat()] for state, (first, last) in self.bounds.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        bounds = {name: (datetime.fromisoformat(first), datetime.fromisoformat(last))
+                  for name, (first, last) in state['date_bounds'].items()}
+        return cls(state['columns'], state['paths'], state['shifts'], bounds)
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.state(), f, ensure_ascii=False)
+
+    @classmethod
+    def read(cls, path):
+        with open(path) as f:
+            return cls.from_state(json.load(f))
@@ -0,0 +1,87 @@
+# exports.py
+from io import BytesIO
+import pandas as pd
+from instrumentation import instrumented
+
+# Download formats: file extension and mime type
+EXPORT_FORMATS = {
+    'Excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+# Same datetime cell format pandas' to_excel uses
+DATETIME_FORMAT = 'yyyy-mm-dd hh:mm:ss'
+# Day zero of Excel's (1900) date serial numbers
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+
+
+def export_file_name(base_name, file_format):
+    return f"{base_name}.{EXPORT_FORMATS[file_format][0]}"
+
+
+def export_mime(file_format):
+    return EXPORT_FORMATS[file_format][1]
+
+
+@instrumented
+def export_bytes(frame, file_format):
+    if file_format == 'Excel':
+        return excel_bytes(frame)
+    if file_format == 'CSV':
+        return frame.to_csv(index=False).encode('utf-8')
+    if file_format == 'Parquet':
+        parquet_buffer = BytesIO()
+        frame.to_parquet(parquet_buffer, index=False)
+        return parquet_buffer.getvalue()
+    raise ValueError(f"Unknown export format: {file_format}")
+
+
+def excel_bytes(frame):
+    return workbook_bytes({'Sheet1': frame})
+
+
+@instrumented
+def workbook_bytes(sheets):
+    # One Excel workbook with a worksheet per {sheet name: frame}, in order.
+    # Rows are streamed with xlsxwriter's constant_memory mode: each row is
+    # flushed as soon as the next one starts, so a large session table never
+    # exists as a full in-memory cell grid, and strings are written inline
+    # instead of through the shared string table. xlsxwriter is imported on
+    # the first Excel download.
+    import xlsxwriter
+    excel_buffer = BytesIO()
+    workbook = xlsxwriter.Workbook(excel_buffer, {'constant_memory': True})
+    header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+    datetime_format = workbook.add_format({'num_format': DATETIME_FORMAT})
+    for name, frame in sheets.items():
+        write_worksheet(workbook.add_worksheet(name), frame, header_format, datetime_format)
+    workbook.close()
+    return excel_buffer.getvalue()
+
+
+def write_worksheet(worksheet, frame, header_format, datetime_format):
+    worksheet.write_row(0, 0, [str(col) for col in frame.columns], header_format)
+
+    # Each column is converted once to plain Python values (None where missing)
+    # and paired with the typed writer for it, which skips write()'s per-cell
+    # type sniffing
+    columns = []
+    for col in frame.columns:
+        values = frame[col]
+        missing = values.isna().to_numpy()
+        if pd.api.types.is_datetime64_any_dtype(values):
+            serials = ((values - EXCEL_EPOCH) / pd.Timedelta(days=1)).to_numpy(dtype=float)
+            columns.append((worksheet.write_number, serials, missing, datetime_format))
+        elif pd.api.types.is_bool_dtype(values):
+            columns.append((worksheet.write_boolean, values.to_numpy(dtype=bool), missing, None))
+        elif pd.api.types.is_numeric_dtype(values):
+            columns.append((worksheet.write_number, values.to_numpy(dtype=float), missing, None))
+        else:
+            columns.append((worksheet.write_string, values.astype(str).to_numpy(dtype=object), missing, None))
+    columns = [(write, values.tolist(), missing.tolist(), cell_format) for write, values, missing, cell_format in columns]
+
+    for row in range(len(frame)):
+        for col, (write, values, missing, cell_format) in enumerate(columns):
+            if not missing[row]:
+                write(row + 1, col, values[row], cell_format)
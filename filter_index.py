@@ -0,0 +1,137 @@
+# filter_index.py
+import numpy as np
+import pandas as pd
+from instrumentation import instrumented
+
+# Cascading dashboard filters, in widget order
+HIERARCHY_COLUMNS = ['State', 'District', 'Cluster', 'Kutir Name', 'Kutir']
+POSTING_COLUMNS = ['Shift', 'District', 'Cluster', 'Kutir Name', 'Kutir']
+
+
+class FilterIndex:
+    # Built once per data load and shared by every session. Rows are addressed
+    # through a permutation sorted by (State, Date): a state is a contiguous
+    # slice and a date range inside it is two binary searches. Every other
+    # filter column has a posting list (row positions per category, ascending),
+    # so a filter combination is a few searchsorted calls and intersections
+    # instead of full-table boolean masks. The frame itself is never copied.
+
+    @instrumented
+    def __init__(self, frame):
+        self.frame = frame
+        self.categoricals = {}
+        state_codes = self.codes('State')
+        self.dates = frame['Date'].to_numpy(dtype='datetime64[ns]')
+        self.order = np.lexsort((self.dates, state_codes))
+        self.sorted_dates = self.dates[self.order]
+
+        sorted_states = state_codes[self.order]
+        categories = self.categories('State')
+        bounds = np.searchsorted(sorted_states, np.arange(len(categories) + 1))
+        self.state_slices = {state: (bounds[i], bounds[i + 1]) for i, state in enumerate(categories) if bounds[i] < bounds[i + 1]}
+
+        self.postings = {}
+        for col in POSTING_COLUMNS:
+            if col not in frame.columns:
+                continue
+            # Positions (in sorted order) grouped by category code; a stable sort
+            # keeps each group ascending. Slot 0 collects missing values.
+            codes = self.codes(col)[self.order] + 1
+            positions = np.argsort(codes, kind='stable')
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(self.categories(col)) + 1))])
+            self.postings[col] = (positions, offsets)
+
+        hierarchy_columns = [col for col in HIERARCHY_COLUMNS if col in frame.columns]
+        self.hierarchy = frame[hierarchy_columns].dropna().drop_duplicates().astype(str).reset_index(drop=True)
+
+    def categorical(self, col):
+        # data.sheet stores these as categoricals already; other frames are coded once
+        if col not in self.categoricals:
+            values = self.frame[col]
+            self.categoricals[col] = values.array if isinstance(values.dtype, pd.CategoricalDtype) else pd.Categorical(values)
+        return self.categoricals[col]
+
+    def codes(self, col):
+        return np.asarray(self.categorical(col).codes)
+
+    def categories(self, col):
+        return self.categorical(col).categories
+
+    def options(self, col, state=None, districts=None, clusters=None, kutir_names=None):
+        # Sorted choices for a filter widget given the selections above it
+        if col == 'Shift':
+            return sorted(self.frame['Shift'].dropna().unique().tolist())
+        hierarchy = self.hierarchy
+        for parent, selected in [('State', [state] if state is not None else None), ('District', districts),
+                                 ('Cluster', clusters), ('Kutir Name', kutir_names)]:
+            if parent == col:
+                break
+            if selected is not None:
+                hierarchy = hierarchy[hierarchy[parent].isin(selected)]
+        return sorted(hierarchy[col].unique().tolist())
+
+    def date_bounds(self, state):
+        # (first, last) date recorded for a state, or None
+        if state not in self.state_slices:
+            return None
+        start, stop = self.state_slices[state]
+        return pd.Timestamp(self.sorted_dates[start]), pd.Timestamp(self.sorted_dates[stop - 1])
+
+    def positions(self, state, start_date=None, end_date=None, shift=None, districts=None, clusters=None, kutir_names=None, kutirs=None):
+        # Sorted-order positions matching every given filter; None means "All"
+        if state not in self.state_slices:
+            return np.array([], dtype=np.int64)
+        start, stop = self.state_slices[state]
+        dates = self.sorted_dates[start:stop]
+        if start_date is not None:
+            start += np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date)), side='left')
+        if end_date is not None:
+            # Dates may carry a time of day, so compare against the next midnight
+            stop = self.state_slices[state][0] + np.searchsorted(dates, np.datetime64(pd.Timestamp(end_date) + pd.Timedelta(days=1)), side='left')
+        if start >= stop:
+            return np.array([], dtype=np.int64)
+
+        matches = None
+        selections = {'Shift': [shift] if shift is not None else None, 'District': districts,
+                      'Cluster': clusters, 'Kutir Name': kutir_names, 'Kutir': kutirs}
+        for col, selected in selections.items():
+            if selected is None or col not in self.postings:
+                continue
+            positions, offsets = self.postings[col]
+            codes = self.categories(col).get_indexer(list(selected))
+            parts = []
+            for code in codes[codes >= 0] + 1:
+                group = positions[offsets[code]:offsets[code + 1]]
+                parts.append(group[np.searchsorted(group, start):np.searchsorted(group, stop)])
+            found = np.sort(np.concatenate(parts)) if parts else np.array([], dtype=np.int64)
+            matches = found if matches is None else np.intersect1d(matches, found, assume_unique=True)
+            if len(matches) == 0:
+                break
+        return np.arange(start, stop) if matches is None else matches
+
+    def row_ids(self, state, **filters):
+        # Row positions in the original frame, in original row order
+        return np.sort(self.order[self.positions(state, **filters)])
+
+    def count(self, state, **filters):
+        return len(self.positions(state, **filters))
+
+    def select(self, state, **filters):
+        return self.frame.take(self.row_ids(state, **filters))
+
+
+def row_mask(frame, state, start_date=None, end_date=None, shift=None, districts=None, clusters=None, kutir_names=None, kutirs=None):
+    # The filters of FilterIndex.positions as a boolean mask over one frame, for
+    # rows that are scanned rather than indexed (parts of the raw store)
+    mask = (frame['State'] == state).to_numpy()
+    if start_date is not None:
+        mask &= (frame['Date'] >= pd.Timestamp(start_date)).to_numpy()
+    if end_date is not None:
+        # Dates may carry a time of day, so compare against the next midnight
+        mask &= (frame['Date'] < pd.Timestamp(end_date) + pd.Timedelta(days=1)).to_numpy()
+    selections = {'Shift': [shift] if shift is not None else None, 'District': districts,
+                  'Cluster': clusters, 'Kutir Name': kutir_names, 'Kutir': kutirs}
+    for col, selected in selections.items():
+        if selected is not None and col in frame.columns:
+            mask &= frame[col].isin(list(selected)).to_numpy()
+    return mask
@@ -0,0 +1,423 @@
+# headless.py
+#
+# The dashboard's aggregations without Streamlit, answered by the same data
+# layer from the same snapshot:
+#
+#   python headless.py report --out reports --weeks 12
+#
+# writes a weekly report for every state and for each of its districts. The
+# parent process loads the snapshot (SEVA_KUTIR_SNAPSHOT_DIR) and catches it up
+# with the source once; the reports are then built by a pool of worker
+# processes that all read that snapshot and never refresh it themselves. Each
+# report is an Excel workbook with one sheet per section (--format CSV or
+# Parquet writes one file per section), and summary.<ext> lists every report.
+#
+#   python headless.py serve --port 8502
+#
+# serves the aggregates as JSON on a local HTTP port (GET /api/... with the
+# query parameters below). The data refreshes in the background like the
+# app's. Responses are cached per data version in the shared aggregation cache
+# and carry an ETag of their content, so a client revalidating with
+# If-None-Match gets a 304 until the numbers actually change.
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import pandas as pd
+from data_source import data, refresh_data, refresh_in_progress
+from exports import EXPORT_FORMATS, export_bytes, workbook_bytes
+from settings import TREND_MODES
+
+FREQUENCIES = ["Daily", "Weekly", "Monthly", "Yearly"]
+REPORT_FREQUENCY = "Weekly"
+# Reports cover this many weeks up to the state's latest date; 0 for all dates
+REPORT_WEEKS = 12
+REPORT_SCOPE_ALL = 'All Districts'
+
+API_HOST = '127.0.0.1'
+API_PORT = 8502
+# Cache-Control max-age of API responses; clients revalidate with the ETag after it
+API_MAX_AGE = 60
+# Repeatable query parameters and the filter each one sets
+FILTER_PARAMETERS = {'district': 'districts', 'cluster': 'clusters', 'kutir_name': 'kutir_names', 'kutir_type': 'kutirs'}
+
+
+def file_slug(name):
+    return re.sub(r'[^\w-]+', '_', str(name)).strip('_') or 'blank'
+
+
+# Batch reports
+
+def report_window(pipeline, state, weeks, start_date=None, end_date=None):
+    # (start, end) of a state's reports: the last `weeks` calendar weeks up to
+    # its latest date unless given, never before its first date
+    first, last = pipeline.get_filter_index().date_bounds(state)
+    end = end_date or last.date()
+    if start_date is None:
+        start = first.date()
+        if weeks:
+            week_start = pd.Timestamp(end) - pd.Timedelta(days=end.weekday() + 7 * (weeks - 1))
+            start = max(start, week_start.date())
+    else:
+        start = start_date
+    return start, end
+
+
+def report_jobs(pipeline, weeks, start_date=None, end_date=None, states=None):
+    # (state, district or None, start, end) for every report: each state as a
+    # whole first (the largest), then its districts
+    index = pipeline.get_filter_index()
+    jobs = []
+    for state in index.options('State'):
+        if states and state not in states or index.date_bounds(state) is None:
+            continue
+        start, end = report_window(pipeline, state, weeks, start_date, end_date)
+        jobs.append((state, None, start, end))
+        jobs += [(state, district, start, end) for district in index.options('District', state=state)]
+    return jobs
+
+
+def report_sections(pipeline, state, district, start, end):
+    # {section name: frame} of one weekly report, in workbook order
+    filters = {'start_date': start, 'end_date': end}
+    if district is not None:
+        filters['districts'] = [district]
+    agg_df, detailed_df = pipeline.attendance(state, REPORT_FREQUENCY, filters)
+    periods, max_students, avg_attendance, max_period = pipeline.calculate_kpis(agg_df)
+    tables = pipeline.kpi_tables(detailed_df, REPORT_FREQUENCY)
+    anomalies_df = pipeline.anomalies(state, filters)
+    summary = pd.DataFrame([{
+        'State': state,
+        'District': district or REPORT_SCOPE_ALL,
+        'Start Date': pd.Timestamp(start),
+        'End Date': pd.Timestamp(end),
+        'Weeks': periods,
+        'Weekly Avg Attendance': avg_attendance,
+        'Max Weekly Attendance': max_students,
+        'Max Week': max_period,
+        'Kutirs': detailed_df['Kutir Name'].nunique() if not detailed_df.empty else 0,
+        'Kutirs Flagged': int((anomalies_df['Flags'] != '').sum()),
+    }])
+    return {
+        'Summary': summary,
+        'Weekly Attendance': agg_df,
+        'Kutir Weeks': pipeline.kutir_period_attendance(detailed_df),
+        'Kutir Types': pipeline.kutir_attendance(state, REPORT_FREQUENCY, filters, detailed_df),
+        'KPIs by District': tables['District'],
+        'KPIs by Kutir Type': tables['Kutir Type'],
+        'Needs Attention': anomalies_df,
+    }
+
+
+def write_files(sections, base_path, file_format):
+    # One workbook, or one file per section; returns the paths written
+    if file_format == 'Excel':
+        files = {f"{base_path}.{EXPORT_FORMATS['Excel'][0]}": lambda: workbook_bytes(sections)}
+    else:
+        files = {f"{base_path}_{file_slug(name)}.{EXPORT_FORMATS[file_format][0]}": lambda frame=frame: export_bytes(frame, file_format)
+                 for name, frame in sections.items()}
+    for path, build in files.items():
+        with open(path, 'wb') as f:
+            f.write(build())
+    return list(files)
+
+
+def write_report(job, out_dir, file_format):
+    # Runs in a worker process. The first report of a worker loads the
+    # snapshot; later ones reuse it. Returns (summary row, paths written).
+    state, district, start, end = job
+    pipeline = data(refresh=False)
+    sections = report_sections(pipeline, state, district, start, end)
+    state_dir = os.path.join(out_dir, file_slug(state))
+    os.makedirs(state_dir, exist_ok=True)
+    paths = write_files(sections, os.path.join(state_dir, file_slug(district or REPORT_SCOPE_ALL)), file_format)
+    return sections['Summary'], paths
+
+
+def run_reports(args):
+    pipeline = data(refresh=False)
+    if not args.no_refresh:
+        # Written to the snapshot before any worker starts reading it
+        refresh_data()
+        pipeline = data()
+    jobs = report_jobs(pipeline, args.weeks, args.start, args.end, args.state)
+    if not jobs:
+        print("No reports to write")
+        return
+    os.makedirs(args.out, exist_ok=True)
+    workers = min(args.workers or os.cpu_count() or 1, len(jobs))
+    started = time.perf_counter()
+
+    summaries = []
+    def finished(job, result):
+        summary, paths = result
+        summaries.append(summary)
+        print(f"{job[0]} / {job[1] or REPORT_SCOPE_ALL}: {summary['Weeks'].iloc[0]} weeks -> {', '.join(paths)}")
+
+    if workers <= 1:
+        for job in jobs:
+            finished(job, write_report(job, args.out, args.format))
+    else:
+        # spawn, not fork: the parent has running threads (see ingestion.py)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = {pool.submit(write_report, job, args.out, args.format): job for job in jobs}
+            for future in as_completed(futures):
+                finished(futures[future], future.result())
+
+    summary = pd.concat(summaries, ignore_index=True).sort_values(['State', 'District'], ignore_index=True)
+    summary_path = os.path.join(args.out, f"summary.{EXPORT_FORMATS[args.format][0]}")
+    with open(summary_path, 'wb') as f:
+        f.write(export_bytes(summary, args.format))
+    print(f"Wrote {len(jobs)} reports with {workers} worker(s) in {time.perf_counter() - started:.1f}s, summary in {summary_path}")
+
+
+# JSON API
+
+class ApiError(Exception):
+    # Answered with its status and message as {"error": ...}
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def query_value(query, name, default=None):
+    values = query.get(name)
+    return values[-1] if values else default
+
+
+def query_date(query, name):
+    value = query_value(query, name)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ApiError(400, f"{name} must be a YYYY-MM-DD date, got {value!r}")
+
+
+def request_filters(pipeline, query):
+    # (state, frequency, filters) from the query parameters:
+    # state (required), frequency (default Weekly), start, end (YYYY-MM-DD),
+    # shift, and any number of district, cluster, kutir_name and kutir_type
+    states = pipeline.get_filter_index().options('State')
+    state = query_value(query, 'state')
+    if state not in states:
+        raise ApiError(400, f"state must be one of {states}")
+    frequency = query_value(query, 'frequency', REPORT_FREQUENCY)
+    if frequency not in FREQUENCIES:
+        raise ApiError(400, f"frequency must be one of {FREQUENCIES}")
+    filters = {}
+    for name, parameter in [('start_date', 'start'), ('end_date', 'end')]:
+        value = query_date(query, parameter)
+        if value is not None:
+            filters[name] = value
+    if query_value(query, 'shift') is not None:
+        filters['shift'] = query_value(query, 'shift')
+    for parameter, name in FILTER_PARAMETERS.items():
+        if query.get(parameter):
+            filters[name] = query[parameter]
+    return state, frequency, filters
+
+
+def records(frame):
+    # JSON-ready rows; NaN becomes null, dates ISO strings
+    return json.loads(frame.to_json(orient='records', date_format='iso', date_unit='s'))
+
+
+def attendance_frames(pipeline, state, frequency, filters):
+    # Same cache entry as the dashboard's main aggregation
+    return pipeline.cached('attendance', state, frequency, filters, lambda: pipeline.attendance(state, frequency, filters))
+
+
+def states_payload(pipeline, query):
+    index = pipeline.get_filter_index()
+    states = []
+    for state in index.options('State'):
+        bounds = index.date_bounds(state)
+        states.append({'state': state, 'first_date': bounds[0].date().isoformat(), 'last_date': bounds[1].date().isoformat()})
+    return {'states': states}
+
+
+def options_payload(pipeline, query):
+    # The choices of every filter under the hierarchy selections given
+    state, _, filters = request_filters(pipeline, query)
+    index = pipeline.get_filter_index()
+    selected = {'districts': filters.get('districts'), 'clusters': filters.get('clusters'), 'kutir_names': filters.get('kutir_names')}
+    first, last = index.date_bounds(state)
+    return {
+        'first_date': first.date().isoformat(),
+        'last_date': last.date().isoformat(),
+        'shift': index.options('Shift'),
+        'district': index.options('District', state=state),
+        'cluster': index.options('Cluster', state=state, districts=selected['districts']),
+        'kutir_name': index.options('Kutir Name', state=state, districts=selected['districts'], clusters=selected['clusters']),
+        'kutir_type': index.options('Kutir', state=state, **selected),
+    }
+
+
+def attendance_payload(pipeline, query):
+    state, frequency, filters = request_filters(pipeline, query)
+    agg_df, _ = attendance_frames(pipeline, state, frequency, filters)
+    periods, max_students, avg_attendance, max_period = pipeline.calculate_kpis(agg_df)
+    return {
+        'kpis': {'periods': int(periods), 'max_attendance': float(max_students), 'avg_attendance': float(avg_attendance),
+                 'max_period': max_period},
+        'periods': records(agg_df),
+    }
+
+
+def kutirs_payload(pipeline, query):
+    state, frequency, filters = request_filters(pipeline, query)
+    _, detailed_df = attendance_frames(pipeline, state, frequency, filters)
+    return {'kutirs': records(pipeline.kutir_period_attendance(detailed_df))}
+
+
+def kutir_types_payload(pipeline, query):
+    state, frequency, filters = request_filters(pipeline, query)
+    _, detailed_df = attendance_frames(pipeline, state, frequency, filters)
+    return {'kutir_types': records(pipeline.kutir_attendance(state, frequency, filters, detailed_df))}
+
+
+def kpis_payload(pipeline, query):
+    state, frequency, filters = request_filters(pipeline, query)
+    _, detailed_df = attendance_frames(pipeline, state, frequency, filters)
+    return {name: records(table) for name, table in pipeline.kpi_tables(detailed_df, frequency).items()}
+
+
+def trend_payload(pipeline, query):
+    state, _, filters = request_filters(pipeline, query)
+    mode = query_value(query, 'mode', TREND_MODES[0])
+    if mode not in TREND_MODES:
+        raise ApiError(400, f"mode must be one of {TREND_MODES}")
+    return {'mode': mode, 'trend': records(pipeline.trend(state, mode, filters))}
+
+
+def anomalies_payload(pipeline, query):
+    state, _, filters = request_filters(pipeline, query)
+    return {'kutirs': records(pipeline.anomalies(state, filters))}
+
+
+def quality_payload(pipeline, query):
+    # Rows held back at ingest; the same for every state and filter
+    quality = pipeline.quality_report()
+    return {
+        'rows_read': quality['rows_read'],
+        'rows_kept': quality['rows_kept'],
+        'rows_quarantined': quality['rows_quarantined'],
+        'reasons': records(quality['reasons']),
+        'quarantined': records(pipeline.quarantine),
+    }
+
+
+API_ROUTES = {
+    '/api/states': states_payload,
+    '/api/options': options_payload,
+    '/api/attendance': attendance_payload,
+    '/api/kutirs': kutirs_payload,
+    '/api/kutir-types': kutir_types_payload,
+    '/api/kpis': kpis_payload,
+    '/api/trend': trend_payload,
+    '/api/anomalies': anomalies_payload,
+    '/api/quality': quality_payload,
+}
+
+
+def api_response(pipeline, path, query):
+    # (body, etag) of one request, cached per data version and query; the
+    # ETag is a hash of the body, so it survives refreshes that change nothing
+    def build():
+        body = json.dumps(API_ROUTES[path](pipeline, query), ensure_ascii=False).encode('utf-8')
+        return body, '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+    # Parameter order does not matter; the key covers every parameter, valid or not
+    key = tuple(sorted((name, tuple(values)) for name, values in query.items()))
+    return pipeline.cached(('api', path, key), None, None, {}, build)
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    max_age = API_MAX_AGE
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = url.path.rstrip('/')
+        # Every request reads the current data; a refresh swaps it between requests
+        pipeline = data()
+        if path == '/api/health':
+            return self.send_json(200, {'data_version': pipeline.data_version, 'rows': pipeline.row_count(),
+                                        'rows_quarantined': len(pipeline.quarantine),
+                                        'loaded_at': pipeline.loaded_at.isoformat(timespec='seconds'),
+                                        'refreshing': refresh_in_progress()})
+        if path not in API_ROUTES:
+            return self.send_json(404, {'error': f"Unknown path {url.path}", 'paths': ['/api/health'] + list(API_ROUTES)})
+        try:
+            body, etag = api_response(pipeline, path, parse_qs(url.query))
+        except ApiError as e:
+            return self.send_json(e.status, {'error': str(e)})
+        if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', f"max-age={self.max_age}")
+            self.end_headers()
+            return
+        self.send_body(200, body, etag)
+
+    def send_json(self, status, payload):
+        self.send_body(status, json.dumps(payload, ensure_ascii=False).encode('utf-8'), None)
+
+    def send_body(self, status, body, etag):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if etag is not None:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', f"max-age={self.max_age}")
+        else:
+            self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(args):
+    # Loaded before the first request, not by it
+    data()
+    ApiHandler.max_age = args.max_age
+    server = ThreadingHTTPServer((args.host, args.port), ApiHandler)
+    print(f"Serving the attendance API on http://{args.host}:{args.port}/api/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    report = commands.add_parser('report', help="write weekly reports per state and district")
+    report.add_argument('--out', default='reports', help="output directory")
+    report.add_argument('--format', choices=list(EXPORT_FORMATS), default='Excel')
+    report.add_argument('--weeks', type=int, default=REPORT_WEEKS, help="weeks up to each state's latest date, 0 for all")
+    report.add_argument('--start', type=date.fromisoformat, help="first date, YYYY-MM-DD (overrides --weeks)")
+    report.add_argument('--end', type=date.fromisoformat, help="last date, YYYY-MM-DD")
+    report.add_argument('--state', action='append', help="only this state; repeatable")
+    report.add_argument('--workers', type=int, default=0, help="worker processes, default one per CPU")
+    report.add_argument('--no-refresh', action='store_true', help="report on the snapshot as it is")
+
+    api = commands.add_parser('serve', help="serve the aggregates as JSON over HTTP")
+    api.add_argument('--host', default=API_HOST)
+    api.add_argument('--port', type=int, default=API_PORT)
+    api.add_argument('--max-age', type=int, default=API_MAX_AGE, help="Cache-Control max-age in seconds")
+
+    args = parser.parse_args()
+    if args.command == 'report':
+        run_reports(args)
+    else:
+        serve(args)
@@ -0,0 +1,51 @@
+# ingestion.py
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# At most this many sources are fetched at once
+MAX_FETCH_WORKERS = 8
+# Blocks smaller than this are normalized in the fetching thread: shipping the
+# rows to a worker process and the frame back costs more than it saves
+PROCESS_MIN_ROWS = 200_000
+
+
+class ParallelIngest:
+    # Fetches several sources at once and normalizes each as soon as it
+    # arrives, so a full load takes about as long as the slowest source rather
+    # than the sum of all of them. Fetching is I/O bound and runs on a bounded
+    # thread pool; normalizing a large block is CPU bound and goes to a worker
+    # process. A single source runs inline, exactly as before.
+
+    def __init__(self, source_count):
+        self.source_count = source_count
+        self.process_pool = None
+        self.pool_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.process_pool is not None:
+            self.process_pool.shutdown()
+
+    def map(self, task, sources):
+        # task(index, source) for every source, results in source order
+        if len(sources) <= 1:
+            return [task(index, source) for index, source in enumerate(sources)]
+        with ThreadPoolExecutor(max_workers=min(len(sources), MAX_FETCH_WORKERS)) as pool:
+            return list(pool.map(task, range(len(sources)), sources))
+
+    def run(self, function, *args, rows=0):
+        # function(*args), in a worker process when the block is large and other
+        # sources are being normalized at the same time. function must be
+        # defined at module level so the worker can import it.
+        if self.source_count <= 1 or rows < PROCESS_MIN_ROWS:
+            return function(*args)
+        with self.pool_lock:
+            if self.process_pool is None:
+                # spawn, not fork: the parent has running threads (fetches, the refresh worker)
+                self.process_pool = ProcessPoolExecutor(max_workers=min(self.source_count, os.cpu_count() or 1),
+                                                        mp_context=multiprocessing.get_context('spawn'))
+        return self.process_pool.submit(function, *args).result()
@@ -0,0 +1,207 @@
+# instrumentation.py
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+# SEVA_KUTIR_PROFILE=time records a span (wall time, rows in and out) around
+# every instrumented stage; =memory also records peak allocations, through
+# tracemalloc, which slows everything down while it is on. Spans are kept in
+# memory for the dashboard's debug panel and, with SEVA_KUTIR_PROFILE_LOG set,
+# appended to that file as JSON lines. Unset, an instrumented call costs one
+# flag check.
+PROFILE = os.environ.get('SEVA_KUTIR_PROFILE', '')
+PROFILE_LOG = os.environ.get('SEVA_KUTIR_PROFILE_LOG', '')
+# Most recent spans kept for the debug panel
+MAX_SPANS = 5000
+
+enabled = False
+track_memory = False
+log_path = ''
+spans = deque(maxlen=MAX_SPANS)
+sequence = itertools.count(1)
+local = threading.local()
+log_lock = threading.Lock()
+
+
+def configure(mode, log=''):
+    # mode: '' (off), 'time' or 'memory'; also used by the benchmarks
+    global enabled, track_memory, log_path
+    enabled = mode in ('1', 'time', 'memory')
+    track_memory = mode == 'memory'
+    log_path = log
+    if track_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not track_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def row_count(values):
+    # Rows of the first frame, array or list of rows among values (looking one
+    # level into tuples), or None. Only called while instrumentation is on, so
+    # importing this module does not import numpy and pandas.
+    import numpy as np
+    import pandas as pd
+    for value in values:
+        if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+            return len(value)
+        if isinstance(value, list) and value and isinstance(value[0], (list, tuple, np.ndarray)):
+            return len(value)
+        if isinstance(value, tuple):
+            rows = row_count(value)
+            if rows is not None:
+                return rows
+    return None
+
+
+class Span:
+    # One timed stage. Spans nest per thread; with memory tracking each span's
+    # peak includes its children's. tracemalloc's peak is process-wide, so
+    # spans running on several threads at once share their peaks.
+
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        # Optional JSON-serializable facts about the stage, e.g. sizes
+        self.details = None
+
+    def __enter__(self):
+        stack = getattr(local, 'stack', None)
+        if stack is None:
+            stack = local.stack = []
+        self.parent = stack[-1].name if stack else None
+        self.depth = len(stack)
+        if track_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.start_bytes = self.peak = current
+        stack.append(self)
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        stack = local.stack
+        stack.pop()
+        peak_bytes = None
+        if track_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            self.peak = max(self.peak, peak)
+            peak_bytes = self.peak - self.start_bytes
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+            tracemalloc.reset_peak()
+        record = {
+            'seq': next(sequence),
+            'name': self.name,
+            'parent': self.parent,
+            'depth': self.depth,
+            'thread': threading.current_thread().name,
+            'thread_id': threading.get_ident(),
+            'started_at': self.started_at,
+            'seconds': seconds,
+            'peak_bytes': peak_bytes,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'details': self.details,
+            'error': exc_info[0].__name__ if exc_info[0] is not None else None,
+        }
+        spans.append(record)
+        if log_path:
+            with log_lock:
+                with open(log_path, 'a') as f:
+                    f.write(json.dumps(record) + '\n')
+        return False
+
+
+class NoSpan:
+    # Stands in for Span while instrumentation is off
+    rows_out = None
+    details = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NO_SPAN = NoSpan()
+
+
+def span(name, rows_in=None):
+    # with span('stage'): ... ; set .rows_out (and .details) on the returned span to record output rows
+    return Span(name, rows_in) if enabled else NO_SPAN
+
+
+def instrumented(function=None, name=None):
+    # Decorator recording a span per call, named after the function, with
+    # the rows of the first frame argument and of the result
+    if function is None:
+        return functools.partial(instrumented, name=name)
+    span_name = name or function.__qualname__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return function(*args, **kwargs)
+        with Span(span_name, row_count(args)) as current:
+            result = function(*args, **kwargs)
+            current.rows_out = row_count((result,))
+            return result
+    return wrapper
+
+
+class Laps:
+    # Consecutive sections of straight-line code, e.g. the parts of one
+    # dashboard run: each lap(name) closes a span over the code since the
+    # previous lap
+    def __init__(self, prefix):
+        # A previous run on this thread that stopped early (st.stop) may have
+        # left its open lap behind
+        local.stack = []
+        self.prefix = prefix
+        self.current = Span(prefix).__enter__()
+
+    def lap(self, name, rows=None):
+        self.current.name = f"{self.prefix}.{name}"
+        self.current.rows_out = rows
+        self.current.__exit__(None, None, None)
+        self.current = Span(self.prefix).__enter__()
+
+    def close(self):
+        # Drops the open lap without recording it
+        local.stack.remove(self.current)
+
+
+class NoLaps:
+    def lap(self, name, rows=None):
+        pass
+
+    def close(self):
+        pass
+
+
+def laps(prefix):
+    return Laps(prefix) if enabled else NoLaps()
+
+
+def mark():
+    # Sequence number before the next span; spans_since(mark) are the spans
+    # recorded after it
+    return spans[-1]['seq'] if spans else 0
+
+
+def spans_since(seq, thread_id=None):
+    return [record for record in list(spans) if record['seq'] > seq and (thread_id is None or record['thread_id'] == thread_id)]
+
+
+configure(PROFILE, PROFILE_LOG)
@@ -0,0 +1,54 @@
+# kpi_tables.py
+import numpy as np
+import pandas as pd
+from instrumentation import instrumented
+
+# One KPI table per dimension, in the order the dashboard shows them
+KPI_DIMENSIONS = {'State': 'State', 'District': 'District', 'Kutir Type': 'Kutir'}
+KPI_COLUMNS = ['Total Attendance', 'Periods', 'Max Attendance', 'Max Period', 'Avg Attendance', 'Active Kutirs',
+               'Reported Kutir Days', 'Compliance %']
+
+
+def empty_kpi_table(dimension):
+    return pd.DataFrame(columns=[dimension] + KPI_COLUMNS)
+
+
+@instrumented
+def kpi_tables(detailed_df, frequency):
+    # {table name: KPI table} from the shared detailed aggregate (one row per
+    # kutir and day). The detailed rows are scanned once, into per-kutir
+    # period totals; every dimension is then a small groupby over those.
+    # A dimension's period value is the headline statistic of the frequency
+    # (Weekly: the mean of kutir weekly averages, otherwise the total), so
+    # each table's Max and Avg read like the KPI cards for that slice.
+    # Compliance is the kutir days reported out of active kutirs x days on
+    # which any selected kutir reported.
+    if detailed_df.empty or 'Period' not in detailed_df.columns:
+        return {name: empty_kpi_table(dimension) for name, dimension in KPI_DIMENSIONS.items()}
+    dimensions = list(dict.fromkeys(KPI_DIMENSIONS.values()))
+    kutir_periods = detailed_df.groupby(['Period', 'Kutir Name'] + dimensions, observed=True, sort=False).agg(
+        total=('Attendance of Students', 'sum'),
+        days=('Attendance of Students', 'size'),
+    ).reset_index()
+    kutir_periods['average'] = kutir_periods['total'] / kutir_periods['days']
+    reporting_days = detailed_df['Date'].nunique()
+
+    tables = {}
+    for name, dimension in KPI_DIMENSIONS.items():
+        per_period = kutir_periods.groupby([dimension, 'Period'], observed=True, sort=False).agg(
+            total=('total', 'sum'),
+            average=('average', 'mean'),
+        ).reset_index()
+        per_period['value'] = per_period['average'] if frequency == "Weekly" else per_period['total']
+        # Row of each dimension value's best period
+        best = per_period.loc[per_period.groupby(dimension, observed=True)['value'].idxmax()]
+        table = per_period.groupby(dimension, observed=True).agg(
+            **{'Total Attendance': ('total', 'sum'), 'Periods': ('Period', 'size'), 'Avg Attendance': ('value', 'mean')})
+        table['Max Attendance'] = best.set_index(dimension)['value']
+        table['Max Period'] = best.set_index(dimension)['Period']
+        kutirs = kutir_periods.groupby(dimension, observed=True).agg(
+            **{'Active Kutirs': ('Kutir Name', 'nunique'), 'Reported Kutir Days': ('days', 'sum')})
+        table = table.join(kutirs)
+        table['Compliance %'] = table['Reported Kutir Days'] / (table['Active Kutirs'] * reporting_days) * 100
+        tables[name] = table.reset_index()[[dimension] + KPI_COLUMNS].sort_values('Total Attendance', ascending=False, ignore_index=True)
+    return tables
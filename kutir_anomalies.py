@@ -0,0 +1,129 @@
+# kutir_anomalies.py
+import numpy as np
+import pandas as pd
+from instrumentation import instrumented
+
+# A week is a sharp drop when the kutir's weekly average falls this far below
+# the mean of its previous BASELINE_WEEKS reported weeks (at least 2 of them)
+DROP_THRESHOLD = 0.3
+BASELINE_WEEKS = 4
+# Days without any form row, counting only days on which some selected kutir
+# reported, so holidays and Sundays do not break or extend a streak
+STREAK_DAYS = 6
+# Weeks more than PEER_Z standard deviations below the other kutirs of the
+# same cluster, with at least MIN_PEERS of them reporting. The peers' spread is
+# floored at PEER_SPREAD_FLOOR of their mean, so near-identical peers do not
+# turn small differences into outliers.
+PEER_Z = 2.0
+MIN_PEERS = 3
+PEER_SPREAD_FLOOR = 0.1
+
+ANOMALY_COLUMNS = ['District', 'Cluster', 'Kutir Name', 'Kutir', 'Score', 'Flags', 'Latest Week', 'Latest Week Attendance',
+                   'Drop %', 'Drop Weeks', 'Missing Streak (days)', 'Longest Missing Streak (days)', 'Peer Z', 'Outlier Weeks']
+
+
+def missing_streaks(reported):
+    # (current, longest) run of False at the end of / anywhere in each row,
+    # counted from the row's first True only
+    positions = np.arange(reported.shape[1], dtype=np.int32)
+    last_reported = np.maximum.accumulate(np.where(reported, positions, -1), axis=1)
+    runs = np.where(last_reported >= 0, positions - last_reported, 0)
+    if runs.shape[1] == 0:
+        return np.zeros(len(runs), dtype=np.int32), np.zeros(len(runs), dtype=np.int32)
+    return runs[:, -1], runs.max(axis=1)
+
+
+def week_drops(averages):
+    # 1 - week / mean of the previous BASELINE_WEEKS weeks, for every kutir and
+    # week at once, from prefix sums of the reported weekly averages
+    reported = ~np.isnan(averages)
+    value_prefix = np.zeros((averages.shape[0], averages.shape[1] + 1))
+    count_prefix = np.zeros(value_prefix.shape, dtype=np.int32)
+    np.cumsum(np.where(reported, averages, 0), axis=1, out=value_prefix[:, 1:])
+    np.cumsum(reported, axis=1, out=count_prefix[:, 1:])
+    weeks = np.arange(averages.shape[1])
+    starts = np.maximum(weeks - BASELINE_WEEKS, 0)
+    baseline_count = count_prefix[:, weeks] - count_prefix[:, starts]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        baseline = (value_prefix[:, weeks] - value_prefix[:, starts]) / baseline_count
+        return np.where(reported & (baseline_count >= 2) & (baseline > 0), 1 - averages / baseline, np.nan)
+
+
+def peer_scores(averages, groups):
+    # z-score of every kutir week against the other reporting kutirs of its
+    # group: leave-one-out mean and spread from per-group sums, no loop over groups
+    reported = ~np.isnan(averages)
+    values = np.where(reported, averages, 0)
+    order = np.argsort(groups, kind='stable')
+    sorted_groups = groups[order]
+    group_starts = np.r_[True, sorted_groups[1:] != sorted_groups[:-1]]
+    group_of_row = np.empty(len(groups), dtype=np.int64)
+    group_of_row[order] = np.cumsum(group_starts) - 1
+    starts = np.flatnonzero(group_starts)
+    sorted_values = values[order]
+    sums = np.add.reduceat(sorted_values, starts, axis=0)[group_of_row]
+    squares = np.add.reduceat(sorted_values ** 2, starts, axis=0)[group_of_row]
+    counts = np.add.reduceat(reported[order].astype(np.int32), starts, axis=0)[group_of_row]
+
+    peers = counts - reported
+    with np.errstate(invalid='ignore', divide='ignore'):
+        peer_mean = (sums - values) / peers
+        peer_variance = np.maximum((squares - values ** 2) / peers - peer_mean ** 2, 0)
+        spread = np.maximum(np.sqrt(peer_variance), PEER_SPREAD_FLOOR * peer_mean)
+        return np.where(reported & (peers >= MIN_PEERS) & (spread > 0), (averages - peer_mean) / spread, np.nan)
+
+
+def latest_reported(matrix, reported):
+    # Each row's value at its last reported column, and that column (-1: none)
+    columns = matrix.shape[1] - 1 - np.argmax(reported[:, ::-1], axis=1)
+    columns = np.where(reported.any(axis=1), columns, -1)
+    return np.where(columns >= 0, matrix[np.arange(len(matrix)), np.maximum(columns, 0)], np.nan), columns
+
+
+@instrumented
+def detect_anomalies(trends, state, filters):
+    # Every selected kutir scored over every week of the range, one row per
+    # kutir, highest score first. Each signal is scaled so that 1 is its flag
+    # threshold: the drop of the kutir's latest reported week, its current
+    # missing streak and how far its latest week sits below its cluster. The
+    # score is their sum; Flags names the signals at or past their threshold.
+    selected = trends.selection(state, **filters)
+    units, sums, first, last = selected
+    weeks, averages = trends.weekly_averages(selected)
+    if not units.any() or len(weeks) == 0:
+        return pd.DataFrame(columns=ANOMALY_COLUMNS)
+    kutirs = trends.units[units].reset_index(drop=True)
+    reported_weeks = ~np.isnan(averages)
+
+    drops = week_drops(averages)
+    groups = kutirs.groupby(['State', 'District', 'Cluster'], sort=False).ngroup().to_numpy()
+    peer_z = peer_scores(averages, groups)
+
+    # Missing streaks run over the days of the range on which any selected kutir reported
+    reported_days = sums.reported_days(np.flatnonzero(units), first, last)
+    current_streak, longest_streak = missing_streaks(reported_days[:, reported_days.any(axis=0)])
+
+    latest_value, latest_week = latest_reported(averages, reported_weeks)
+    latest_drop, _ = latest_reported(drops, reported_weeks)
+    latest_z, _ = latest_reported(peer_z, reported_weeks)
+    signals = {
+        'drop': np.nan_to_num(np.maximum(latest_drop, 0)) / DROP_THRESHOLD,
+        'missing': current_streak / STREAK_DAYS,
+        'peer outlier': np.nan_to_num(np.maximum(-latest_z, 0)) / PEER_Z,
+    }
+    flags = np.full(len(kutirs), '', dtype=object)
+    for name, signal in signals.items():
+        flags = np.where(signal >= 1, np.where(flags == '', name, flags + ', ' + name), flags)
+
+    frame = kutirs[['District', 'Cluster', 'Kutir Name', 'Kutir']].copy()
+    frame['Score'] = sum(signals.values())
+    frame['Flags'] = flags
+    frame['Latest Week'] = pd.Series(weeks[np.maximum(latest_week, 0)]).map(trends.week_labels()).where(latest_week >= 0)
+    frame['Latest Week Attendance'] = latest_value
+    frame['Drop %'] = latest_drop * 100
+    frame['Drop Weeks'] = (drops >= DROP_THRESHOLD).sum(axis=1)
+    frame['Missing Streak (days)'] = current_streak
+    frame['Longest Missing Streak (days)'] = longest_streak
+    frame['Peer Z'] = latest_z
+    frame['Outlier Weeks'] = (peer_z <= -PEER_Z).sum(axis=1)
+    return frame.sort_values(['Score', 'Kutir Name'], ascending=[False, True]).reset_index(drop=True)[ANOMALY_COLUMNS]
@@ -0,0 +1,85 @@
+# period_calendar.py
+import numpy as np
+import pandas as pd
+
+# Integer period key stored on every row, per frequency
+PERIOD_KEY_COLUMNS = {
+    'Daily': 'Day Key',
+    'Weekly': 'Week Key',
+    'Monthly': 'Month Key',
+    'Yearly': 'Year Key',
+}
+PERIOD_LABEL_COLUMNS = {
+    'Daily': 'Daily Period',
+    'Weekly': 'Weekly Period',
+    'Monthly': 'Monthly Period',
+    'Yearly': 'Yearly Period',
+}
+CALENDAR_COLUMNS = ['Day Key', 'Date', 'Daily Period', 'Week Key', 'ISO_Year', 'ISO_Week', 'Weekly Period',
+                    'Week Start Date', 'Week End Date', 'Month Key', 'Monthly Period', 'Year Key', 'Yearly Period']
+
+
+def day_keys(dates):
+    # Days since 1970-01-01 for a datetime64 Series without NaT
+    return dates.to_numpy(dtype='datetime64[D]').astype(np.int32)
+
+
+def period_keys(days):
+    # All period keys by integer arithmetic on day numbers:
+    # - Week Key is the day number of the ISO week's Monday (1970-01-01 was a Thursday)
+    # - Month Key counts months since 1970-01
+    # - Year Key is the calendar year
+    days = np.asarray(days, dtype=np.int32)
+    as_dates = days.astype('datetime64[D]')
+    return {
+        'Day Key': days,
+        'Week Key': (days - (days + 3) % 7).astype(np.int32),
+        'Month Key': as_dates.astype('datetime64[M]').astype(np.int16),
+        'Year Key': (as_dates.astype('datetime64[Y]').astype(np.int32) + 1970).astype(np.int16),
+    }
+
+
+def build_calendar(days):
+    # One row per distinct day: every period key plus the display labels and
+    # ISO week bounds. Labels are only ever formatted here, once per day, and
+    # joined onto aggregated output rather than onto raw rows.
+    days = np.unique(np.asarray(days, dtype=np.int32))
+    keys = period_keys(days)
+    week_start = keys['Week Key'].astype('datetime64[D]').astype('datetime64[ns]')
+
+    # The ISO year is the year of the week's Thursday
+    thursday = keys['Week Key'] + 3
+    iso_year = thursday.astype('datetime64[D]').astype('datetime64[Y]').astype(np.int32) + 1970
+    first_of_iso_year = (iso_year - 1970).astype('datetime64[Y]').astype('datetime64[D]').astype(np.int32)
+    iso_week = (thursday - first_of_iso_year) // 7 + 1
+
+    calendar = pd.DataFrame({
+        'Day Key': keys['Day Key'],
+        'Date': days.astype('datetime64[D]').astype('datetime64[ns]'),
+        'Week Key': keys['Week Key'],
+        'ISO_Year': iso_year.astype(np.int16),
+        'ISO_Week': iso_week.astype(np.int8),
+        'Week Start Date': week_start,
+        'Week End Date': week_start + np.timedelta64(6, 'D'),
+        'Month Key': keys['Month Key'],
+        'Year Key': keys['Year Key'],
+    })
+    calendar['Daily Period'] = calendar['Date'].dt.strftime('%Y-%m-%d')
+    calendar['Weekly Period'] = calendar['ISO_Year'].astype(str) + '-W' + calendar['ISO_Week'].astype(str).str.zfill(2)
+    calendar['Monthly Period'] = calendar['Date'].dt.strftime('%Y-%m')
+    calendar['Yearly Period'] = calendar['Year Key'].astype(str)
+    return calendar[CALENDAR_COLUMNS]
+
+
+def merge_calendars(*calendars):
+    return pd.concat(calendars, ignore_index=True).drop_duplicates(subset=['Day Key']).sort_values('Day Key').reset_index(drop=True)
+
+
+def period_labels(calendar, frequency):
+    # key -> display label ('2025-W06', '2025-01', ...) for one frequency
+    key_col = PERIOD_KEY_COLUMNS[frequency]
+    return calendar.drop_duplicates(subset=[key_col]).set_index(key_col)[PERIOD_LABEL_COLUMNS[frequency]]
+
+
+def calendar_week_ranges(calendar):
+    return calendar.drop_duplicates(subset=['Week Key'])[['Weekly Period', 'Week Start Date', 'Week End Date']].reset_index(drop=True)
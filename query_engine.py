@@ -0,0 +1,260 @@
+# query_engine.py
+#
+# Optional DuckDB backend for the dashboard queries, enabled with
+# SEVA_KUTIR_ENGINE=duckdb when the duckdb package is installed (pip install -r
+# requirements-duckdb.txt; it is not in requirements.txt). The cleaned rows of one data load go into a database file
+# next to the snapshot; the filter cascade and every aggregation then run as
+# parameterized SQL, multi-threaded and reading only the columns a query
+# needs. Results have the same columns and values as the pandas path.
+import importlib.util
+import os
+import uuid
+import weakref
+import numpy as np
+import pandas as pd
+
+from charts import ATTENDANCE_CATEGORIES
+from instrumentation import instrumented
+from period_calendar import PERIOD_KEY_COLUMNS, PERIOD_LABEL_COLUMNS
+from snapshot_cache import SNAPSHOT_DIR, process_alive
+
+ENGINE_DIR = os.path.join(SNAPSHOT_DIR, 'engine')
+# duckdb itself is imported by the first engine, not by every process that imports this module
+DUCKDB_INSTALLED = importlib.util.find_spec('duckdb') is not None
+
+# Cascading filter widgets, in widget order, and the columns of the detailed
+# per-kutir-per-day rows the aggregations are built from
+HIERARCHY_COLUMNS = ['State', 'District', 'Cluster', 'Kutir Name', 'Kutir']
+DETAIL_COLUMNS = ['Kutir Name', 'Kutir', 'State', 'District', 'Cluster']
+CUBE_COLUMNS = ['State', 'District', 'Cluster', 'Kutir Name', 'Kutir', 'Shift']
+KEY_COLUMNS = ['Day Key', 'Week Key', 'Month Key', 'Year Key']
+
+
+def quote(col):
+    return '"' + col.replace('"', '""') + '"'
+
+
+def remove_database(path):
+    # The database file and its write-ahead log, if still there
+    for file_path in [path, path + '.wal']:
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
+
+class QueryEngine:
+    # One database file per data load. Queries run on cursors of a shared
+    # connection, so sessions can query concurrently. Several processes share
+    # ENGINE_DIR (the dashboard, headless report workers), so a file name
+    # starts with the pid of the process that owns it and an engine only ever
+    # removes its own file: when it is garbage-collected, i.e. once no session
+    # holds the data load it belongs to, or when the process exits.
+
+    def __init__(self, path):
+        import duckdb
+        self.path = path
+        self.connection = duckdb.connect(path)
+        self.columns = []
+        weakref.finalize(self, remove_database, path)
+
+    @classmethod
+    def create(cls, root=ENGINE_DIR):
+        # Files left behind by processes that are gone (killed before their
+        # engines were collected) are removed; live processes' files are not
+        os.makedirs(root, exist_ok=True)
+        for name in os.listdir(root):
+            pid = name.split('-', 1)[0]
+            if pid.isdigit() and not process_alive(int(pid)):
+                remove_database(os.path.join(root, name.removesuffix('.wal')))
+        return cls(os.path.join(root, f"{os.getpid()}-{uuid.uuid4().hex}.duckdb"))
+
+    @instrumented
+    def load(self, calendar, week_ranges, sheet=None, parquet_files=()):
+        # The cleaned rows from a frame, or from the raw store's Parquet parts
+        # in order; row_id is the position in the sheet either way. Categorical
+        # columns of a frame become ENUMs, which come back as categoricals.
+        with self.connection.cursor() as cursor:
+            if sheet is not None:
+                cursor.register('sheet_rows', sheet)
+                cursor.register('sheet_row_ids', pd.DataFrame({'row_id': np.arange(len(sheet), dtype=np.int64)}))
+                cursor.execute('CREATE TABLE sheet AS SELECT * FROM sheet_rows POSITIONAL JOIN sheet_row_ids')
+                cursor.unregister('sheet_rows')
+                cursor.unregister('sheet_row_ids')
+            else:
+                cursor.execute('CREATE TABLE sheet AS SELECT * EXCLUDE (filename, file_row_number), '
+                               'row_number() OVER (ORDER BY list_position($files, filename), file_row_number) - 1 AS row_id '
+                               'FROM read_parquet($files, union_by_name = true, filename = true, file_row_number = true)',
+                               {'files': list(parquet_files)})
+            self.columns = [row[0] for row in cursor.execute('DESCRIBE sheet').fetchall()]
+
+            # Daily sums per kutir and shift, the grain every aggregation starts from
+            dimensions = ', '.join(quote(col) for col in ['Date'] + CUBE_COLUMNS + KEY_COLUMNS if col in self.columns)
+            cursor.execute(f'CREATE TABLE daily AS SELECT {dimensions}, sum("Attendance of Students")::BIGINT AS "Attendance of Students" '
+                           f'FROM sheet GROUP BY ALL')
+            for name, frame in [('calendar', calendar), ('week_ranges', week_ranges)]:
+                cursor.register(f'{name}_rows', frame)
+                cursor.execute(f'CREATE TABLE {name} AS SELECT * FROM {name}_rows')
+                cursor.unregister(f'{name}_rows')
+
+    def query(self, sql, params=None):
+        with self.connection.cursor() as cursor:
+            return cursor.execute(sql, params or []).df()
+
+    def where(self, state, start_date=None, end_date=None, shift=None, districts=None, clusters=None, kutir_names=None, kutirs=None):
+        # SQL condition and parameters for one filter state, with the semantics
+        # of FilterIndex.positions
+        clauses, params = ['"State" = ?'], [state]
+        if start_date is not None:
+            clauses.append('"Date" >= ?')
+            params.append(pd.Timestamp(start_date).to_pydatetime())
+        if end_date is not None:
+            # Dates may carry a time of day, so compare against the next midnight
+            clauses.append('"Date" < ?')
+            params.append((pd.Timestamp(end_date) + pd.Timedelta(days=1)).to_pydatetime())
+        selections = {'Shift': [shift] if shift is not None else None, 'District': districts,
+                      'Cluster': clusters, 'Kutir Name': kutir_names, 'Kutir': kutirs}
+        for col, selected in selections.items():
+            if selected is None or col not in self.columns:
+                continue
+            selected = list(selected)
+            if not selected:
+                clauses.append('false')
+                continue
+            clauses.append(f"{quote(col)} IN ({', '.join('?' * len(selected))})")
+            params.extend(str(value) for value in selected)
+        return ' AND '.join(clauses), params
+
+    # Filter cascade, the interface of FilterIndex used by the dashboard
+
+    def options(self, col, state=None, districts=None, clusters=None, kutir_names=None):
+        if col == 'Shift':
+            return self.query('SELECT DISTINCT "Shift"::VARCHAR AS option FROM daily WHERE "Shift" IS NOT NULL ORDER BY 1')['option'].tolist()
+        hierarchy = [c for c in HIERARCHY_COLUMNS if c in self.columns]
+        clauses = [f'{quote(c)} IS NOT NULL' for c in hierarchy]
+        params = []
+        for parent, selected in [('State', [state] if state is not None else None), ('District', districts),
+                                 ('Cluster', clusters), ('Kutir Name', kutir_names)]:
+            if parent == col:
+                break
+            if selected is not None:
+                selected = list(selected)
+                clauses.append(f"{quote(parent)} IN ({', '.join('?' * len(selected))})" if selected else 'false')
+                params.extend(str(value) for value in selected)
+        return self.query(f"SELECT DISTINCT {quote(col)}::VARCHAR AS option FROM daily WHERE {' AND '.join(clauses)} ORDER BY 1", params)['option'].tolist()
+
+    def date_bounds(self, state):
+        bounds = self.query('SELECT min("Date") AS first, max("Date") AS last FROM daily WHERE "State" = ?', [state])
+        if bounds['first'].isna().iloc[0]:
+            return None
+        return pd.Timestamp(bounds['first'].iloc[0]), pd.Timestamp(bounds['last'].iloc[0])
+
+    def count(self, state, **filters):
+        where, params = self.where(state, **filters)
+        return int(self.query(f'SELECT count(*) AS n FROM sheet WHERE {where}', params)['n'].iloc[0])
+
+    def row_ids(self, state, **filters):
+        where, params = self.where(state, **filters)
+        return self.query(f'SELECT row_id FROM sheet WHERE {where} ORDER BY row_id', params)['row_id'].to_numpy(dtype=np.int64)
+
+    # Aggregations, matching data.aggregate_attendance, data.aggregate_kutir_attendance
+    # and the dashboard's district buckets
+
+    def detailed_sql(self, frequency, where):
+        # Daily attendance per kutir for the filtered rows, with the period key
+        # and its display label. Rows with a blank grouping column are dropped,
+        # as pandas' groupby drops them.
+        # Labels are joined on after grouping, onto far fewer rows.
+        key, label = quote(PERIOD_KEY_COLUMNS[frequency]), quote(PERIOD_LABEL_COLUMNS[frequency])
+        detail_columns = ', '.join(quote(col) for col in DETAIL_COLUMNS)
+        not_null = ' AND '.join(f'{quote(col)} IS NOT NULL' for col in DETAIL_COLUMNS)
+        return (f'grouped AS (SELECT {key} AS period_key, "Date", {detail_columns}, '
+                f'sum("Attendance of Students")::BIGINT AS "Attendance of Students" '
+                f'FROM daily WHERE {where} AND {not_null} GROUP BY ALL), '
+                f'labels AS (SELECT DISTINCT {key} AS period_key, {label} AS "Period" FROM calendar), '
+                f'detailed AS (SELECT g.period_key, l."Period", g."Date", {", ".join(f"g.{quote(col)}" for col in DETAIL_COLUMNS)}, '
+                f'g."Attendance of Students" FROM grouped g JOIN labels l USING (period_key))')
+
+    @instrumented
+    def aggregate_attendance(self, state, filters, frequency):
+        where, params = self.where(state, **filters)
+        detailed_columns = ', '.join(quote(col) for col in ['Period', 'Date'] + DETAIL_COLUMNS + ['Attendance of Students'])
+        detailed_df = self.query(f'WITH {self.detailed_sql(frequency, where)} SELECT {detailed_columns} FROM detailed '
+                                 f'ORDER BY period_key, "Date", {", ".join(quote(col) for col in DETAIL_COLUMNS)}', params)
+        if frequency == "Weekly":
+            # Average over kutirs of each kutir's attendance per day present
+            agg_df = self.query(
+                f'WITH {self.detailed_sql(frequency, where)}, '
+                f'kutir_weeks AS (SELECT period_key, "Period", "Kutir Name", '
+                f'sum("Attendance of Students") / count(DISTINCT "Date") AS average FROM detailed GROUP BY ALL) '
+                f'SELECT k."Period", avg(k.average) AS "Attendance of Students", '
+                f'w."Weekly Period", w."Week Start Date", w."Week End Date" '
+                f'FROM kutir_weeks k LEFT JOIN week_ranges w ON w."Weekly Period" = k."Period" '
+                f'GROUP BY k.period_key, k."Period", w."Weekly Period", w."Week Start Date", w."Week End Date" ORDER BY k.period_key', params)
+        else:
+            agg_df = self.query(f'WITH {self.detailed_sql(frequency, where)} '
+                                f'SELECT "Period", sum("Attendance of Students")::BIGINT AS "Attendance of Students" '
+                                f'FROM detailed GROUP BY period_key, "Period" ORDER BY period_key', params)
+        return agg_df, detailed_df
+
+    @instrumented
+    def aggregate_kutir_attendance(self, state, filters, frequency):
+        where, params = self.where(state, **filters)
+        if frequency == "Weekly":
+            return self.query(
+                f'WITH {self.detailed_sql(frequency, where)}, '
+                f'kutir_weeks AS (SELECT "Period", "Kutir", "Kutir Name", '
+                f'sum("Attendance of Students") / count(DISTINCT "Date") AS average FROM detailed GROUP BY ALL) '
+                f'SELECT k."Period", k."Kutir", avg(k.average) AS "Attendance of Students", '
+                f'w."Weekly Period", w."Week Start Date", w."Week End Date" '
+                f'FROM kutir_weeks k LEFT JOIN week_ranges w ON w."Weekly Period" = k."Period" '
+                f'GROUP BY ALL ORDER BY k."Period", k."Kutir"', params)
+        return self.query(f'WITH {self.detailed_sql(frequency, where)} '
+                          f'SELECT "Period", "Kutir", sum("Attendance of Students")::BIGINT AS "Attendance of Students" '
+                          f'FROM detailed GROUP BY ALL ORDER BY "Period", "Kutir"', params)
+
+    def district_sql(self, frequency, where):
+        # Attendance per kutir in the latest two periods, labelled by district
+        # and period: weekly averages per day present, otherwise period sums
+        if frequency == "Weekly":
+            return (f'{self.detailed_sql(frequency, where)}, '
+                    f'kutir_days AS (SELECT "Period", "Date", "Kutir Name", "District", sum("Attendance of Students") AS attendance '
+                    f'FROM detailed GROUP BY ALL), '
+                    f'kutir_weeks AS (SELECT "Period", "Kutir Name", "District", sum(attendance) / count(DISTINCT "Date") AS attendance '
+                    f'FROM kutir_days GROUP BY ALL), '
+                    f'latest AS (SELECT DISTINCT "Period" FROM kutir_weeks ORDER BY "Period" DESC LIMIT 2), '
+                    f'district_attendance AS (SELECT k."District"::VARCHAR || \'-\' || coalesce(strftime(w."Week Start Date"::TIMESTAMP, \'%Y-%m-%d\'), \'\') '
+                    f'|| \' to \' || coalesce(strftime(w."Week End Date"::TIMESTAMP, \'%Y-%m-%d\'), \'\') AS "District", '
+                    f'k."Kutir Name", avg(k.attendance) AS "Attendance of Students" '
+                    f'FROM kutir_weeks k JOIN latest USING ("Period") LEFT JOIN week_ranges w ON w."Weekly Period" = k."Period" GROUP BY ALL)')
+        return (f'{self.detailed_sql(frequency, where)}, '
+                f'latest AS (SELECT DISTINCT "Period" FROM detailed ORDER BY "Period" DESC LIMIT 2), '
+                f'district_attendance AS (SELECT d."District"::VARCHAR || \'-\' || d."Period" AS "District", d."Kutir Name", '
+                f'sum(d."Attendance of Students")::BIGINT AS "Attendance of Students" '
+                f'FROM detailed d JOIN latest USING ("Period") GROUP BY ALL)')
+
+    @instrumented
+    def district_attendance(self, state, filters, frequency):
+        where, params = self.where(state, **filters)
+        return self.query(f'WITH {self.district_sql(frequency, where)} '
+                          f'SELECT * FROM district_attendance ORDER BY "District", "Kutir Name"', params)
+
+    @instrumented
+    def district_buckets(self, state, filters, frequency):
+        # (bucket table with the average per district, bucket counts), with
+        # the buckets of data.categorize
+        where, params = self.where(state, **filters)
+        counts = ', '.join(f"count(*) FILTER (WHERE category = '{category}') AS \"{category}\"" for category in ATTENDANCE_CATEGORIES)
+        fig3_df = self.query(
+            f'WITH {self.district_sql(frequency, where)}, '
+            f'categorized AS (SELECT *, CASE WHEN "Attendance of Students" IS NULL THEN \'Unknown\' '
+            f'WHEN "Attendance of Students" < 50 THEN \'<50\' '
+            f'WHEN "Attendance of Students" >= 50 AND "Attendance of Students" <= 75 THEN \'50-75\' '
+            f'WHEN "Attendance of Students" >= 76 AND "Attendance of Students" <= 100 THEN \'76-100\' '
+            f'ELSE \'100+\' END AS category FROM district_attendance) '
+            f'SELECT "District", {counts}, avg("Attendance of Students") AS "Average Attendance" '
+            f'FROM categorized GROUP BY "District" ORDER BY "District"', params)
+        return fig3_df, fig3_df.drop(columns=['Average Attendance'])
+
+    def disk_bytes(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
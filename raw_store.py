@@ -0,0 +1,92 @@
+# raw_store.py
+import os
+import shutil
+import uuid
+from snapshot_cache import SNAPSHOT_DIR, process_alive
+
+# Parts of the chunked mode live next to the snapshot that refers to them
+RAW_STORE_DIR = os.path.join(SNAPSHOT_DIR, 'raw')
+
+
+class RawStore:
+    # Cleaned sheet rows on disk for the chunked mode, one Parquet file per
+    # ingested batch. A store object only ever reads the parts it was created
+    # with, so a refreshed copy can add parts while sessions still holding the
+    # previous data keep reading exactly the rows their aggregates were built
+    # from. Parts are listed in sheet order; each part records its row count
+    # and columns, so neither needs a file read.
+
+    def __init__(self, directory, parts=()):
+        self.directory = directory
+        self.parts = list(parts)
+
+    @classmethod
+    def create(cls, root, keep=None):
+        # An empty store in a new directory under root. Like the DuckDB files,
+        # directory names start with the pid of the process that wrote them, as
+        # the dashboard and headless workers share root and read each other's
+        # stores through the snapshot. Removed here are this process's stores of
+        # older full loads and stores of processes that are gone, never `keep`
+        # (the store still being served) or a live process's store.
+        os.makedirs(root, exist_ok=True)
+        own = str(os.getpid())
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            pid = name.split('-', 1)[0]
+            if not os.path.isdir(path) or not pid.isdigit():
+                continue
+            if keep is not None and os.path.abspath(path) == os.path.abspath(keep.directory):
+                continue
+            if pid == own or not process_alive(int(pid)):
+                shutil.rmtree(path, ignore_errors=True)
+        directory = os.path.join(root, f"{own}-{uuid.uuid4().hex}")
+        os.makedirs(directory)
+        return cls(directory)
+
+    def write(self, frame):
+        # Writes one batch and returns its part entry; does not add it to the
+        # store, so sources can write concurrently and add their parts in order.
+        # pyarrow is imported here and in iter_frames, not with the module
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        file_name = f"part-{uuid.uuid4().hex}.parquet"
+        tmp_path = os.path.join(self.directory, file_name + '.tmp')
+        pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), tmp_path)
+        os.replace(tmp_path, os.path.join(self.directory, file_name))
+        return {'file': file_name, 'rows': len(frame), 'columns': frame.columns.tolist()}
+
+    def extended(self, parts):
+        # A new store with `parts` after the existing ones; self is unchanged
+        return RawStore(self.directory, self.parts + list(parts))
+
+    def row_count(self):
+        return sum(part['rows'] for part in self.parts)
+
+    def columns(self):
+        # Every column of any part, in first-seen order
+        columns = {}
+        for part in self.parts:
+            columns.update(dict.fromkeys(part['columns']))
+        return list(columns)
+
+    def paths(self):
+        return [os.path.join(self.directory, part['file']) for part in self.parts]
+
+    def disk_bytes(self):
+        return sum(os.path.getsize(os.path.join(self.directory, part['file'])) for part in self.parts)
+
+    def iter_frames(self, columns=None):
+        # The parts one at a time, as frames with the requested columns a part
+        # has; memory stays bounded by the largest part
+        import pyarrow.parquet as pq
+        for part in self.parts:
+            part_columns = part['columns'] if columns is None else [col for col in columns if col in part['columns']]
+            yield pq.read_table(os.path.join(self.directory, part['file']), columns=part_columns).to_pandas()
+
+    def state(self):
+        # JSON-serializable, for the snapshot meta
+        return {'directory': self.directory, 'parts': self.parts}
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state['directory'], state['parts'])
@@ -0,0 +1,201 @@
+# rolling_trends.py
+import numpy as np
+import pandas as pd
+from filter_index import row_mask
+from instrumentation import instrumented
+from period_calendar import period_labels
+
+# A kutir for the trend statistics: one kutir name within its place in the
+# hierarchy, the same rows aggregate_attendance averages per kutir
+UNIT_COLUMNS = ['State', 'District', 'Cluster', 'Kutir Name', 'Kutir']
+
+
+class DaySums:
+    # Attendance of the (kutir, day) cells that have rows, sorted by kutir and
+    # day, with prefix sums over them. Cells are keyed kutir * stride + day, so
+    # the attendance and the days reported in a window of a kutir are the
+    # difference between the prefix sums at two np.searchsorted positions.
+    # Every kutir ends with a cell at day `day_count`, after any window, so
+    # both positions fall inside the kutir's own cells and the prefix sums can
+    # restart at 0 for each kutir. Memory is 8 bytes per reported kutir-day
+    # (int32 key, float32 sum) instead of per kutir and calendar day.
+
+    def __init__(self, unit_codes, day_positions, attendance, unit_count, day_count):
+        # One more than the last day position, so a window may stop after it
+        self.stride = day_count + 1
+        key_type = np.int32 if unit_count * self.stride < 2 ** 31 else np.int64
+        cell_keys, cells = np.unique(unit_codes.astype(np.int64) * self.stride + day_positions, return_inverse=True)
+        ends = np.arange(unit_count, dtype=np.int64) * self.stride + day_count
+        order = np.argsort(np.concatenate([cell_keys, ends]), kind='stable')
+        keys = np.concatenate([cell_keys, ends])[order]
+        values = np.concatenate([np.bincount(cells, weights=attendance, minlength=len(cell_keys)), np.zeros(unit_count)])[order]
+        # Attendance of the kutir's cells before each cell. float32 holds
+        # whole-number sums exactly up to 2**24, decades of a large kutir.
+        before = np.cumsum(values) - values
+        unit_starts = np.searchsorted(keys, np.arange(unit_count, dtype=np.int64) * self.stride)
+        self.prefix = (before - before[unit_starts][keys // self.stride]).astype(np.float32)
+        self.keys = keys.astype(key_type)
+
+    def windows(self, units, starts, stops, first, last):
+        # (attendance, days reported) of each unit in each window [starts[i],
+        # stops[i]] inside [first, last], units x windows. The cell positions
+        # come from a count of each unit's cells per day of the range, which is
+        # no larger than the result. Column-major, so the sums over units that
+        # follow add up in the same order as over a dense grid.
+        counts = np.zeros((len(units), max(last - first + 2, 1)), dtype=np.int32)
+        np.cumsum(self.reported_days(units, first, last), axis=1, out=counts[:, 1:])
+        base = np.searchsorted(self.keys, (units * self.stride + first).astype(self.keys.dtype))[:, None]
+        start_positions = base + counts[:, starts - first]
+        stop_positions = base + counts[:, stops + 1 - first]
+        return (np.asfortranarray(self.prefix[stop_positions].astype(np.float64) - self.prefix[start_positions]),
+                np.asfortranarray(stop_positions - start_positions))
+
+    def reported_days(self, units, first, last):
+        # units x days of [first, last]: whether the unit has a row that day
+        reported = np.zeros((len(units), max(last - first + 1, 0)), dtype=bool)
+        row_of_unit = np.full(int(units.max()) + 1 if len(units) else 0, -1)
+        row_of_unit[units] = np.arange(len(units))
+        cell_units, cell_days = np.divmod(self.keys.astype(np.int64), self.stride)
+        cells = (cell_units < len(row_of_unit)) & (cell_days >= first) & (cell_days <= last)
+        cells[cells] = row_of_unit[cell_units[cells]] >= 0
+        reported[row_of_unit[cell_units[cells]], cell_days[cells] - first] = True
+        return reported
+
+
+class RollingTrends:
+    # Per-kutir daily attendance as prefix sums over the days each kutir
+    # reported (DaySums): the attendance and the days reported in any window of
+    # any kutir is one subtraction, so a rolling series costs the same per step
+    # whatever the window length, and a whole multi-year daily series is a
+    # handful of array operations. Built once per data load from the cube; the
+    # sums for a shift filter are built the first time it is used.
+    #
+    # Every statistic averages the kutirs' average daily attendance over the
+    # days they reported, like the Weekly frequency: a week of the rolling
+    # series with a 7-day window is the Weekly value of that week.
+
+    @instrumented
+    def __init__(self, daily, calendar):
+        self.calendar = calendar
+        daily = daily[daily['Attendance of Students'].notna()]
+        groups = daily.groupby(UNIT_COLUMNS, observed=True)
+        unit_codes = groups.ngroup().to_numpy()
+        # Rows with a blank hierarchy column belong to no kutir (ngroup -1)
+        keep = unit_codes >= 0
+        self.rows = daily.loc[keep, ['Shift', 'Attendance of Students']].reset_index(drop=True)
+        self.unit_codes = unit_codes[keep]
+        # One row per kutir, in group number order
+        self.units = groups.size().reset_index()[UNIT_COLUMNS].astype(str)
+        days = daily.loc[keep, 'Day Key'].to_numpy(dtype=np.int64)
+        self.first_day = int(days.min()) if len(days) else 0
+        self.day_count = int(days.max()) - self.first_day + 1 if len(days) else 0
+        self.day_positions = days - self.first_day
+        self.day_sums = {}
+
+    def sums(self, shift=None):
+        # DaySums over all shifts or one
+        if shift not in self.day_sums:
+            rows = np.ones(len(self.rows), dtype=bool) if shift is None else (self.rows['Shift'] == shift).to_numpy()
+            self.day_sums[shift] = DaySums(self.unit_codes[rows], self.day_positions[rows],
+                                           self.rows['Attendance of Students'].to_numpy(dtype=np.float64)[rows],
+                                           len(self.units), self.day_count)
+        return self.day_sums[shift]
+
+    def selection(self, state, start_date=None, end_date=None, shift=None, **filters):
+        # (selected units, their day sums, first and last day position) for the
+        # dashboard filters; positions are clipped to the days of the data
+        units = row_mask(self.units, state, **filters)
+        first = 0 if start_date is None else int(np.datetime64(pd.Timestamp(start_date), 'D').astype(np.int64)) - self.first_day
+        last = self.day_count - 1 if end_date is None else int(np.datetime64(pd.Timestamp(end_date), 'D').astype(np.int64)) - self.first_day
+        return units, self.sums(shift), max(first, 0), min(last, self.day_count - 1)
+
+    def window_averages(self, selected, starts, stops):
+        # Average daily attendance of each selected kutir over the days it
+        # reported in each window [starts[i], stops[i]], NaN where it reported none
+        units, sums, first, last = selected
+        attendance, reported = sums.windows(np.flatnonzero(units), starts, stops, first, last)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(reported > 0, attendance / reported, np.nan)
+
+    def kutir_mean(self, averages):
+        # Mean over the kutirs that reported in each window, and how many did
+        reported = ~np.isnan(averages)
+        kutirs = reported.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(kutirs > 0, np.nansum(averages, axis=0) / kutirs, np.nan), kutirs
+
+    @instrumented
+    def rolling(self, state, window_days, filters):
+        # Trailing window_days average for every day with data in the range;
+        # windows do not reach back before the start date
+        units, sums, first, last = self.selection(state, **filters)
+        days = self.calendar['Day Key'].to_numpy(dtype=np.int64) - self.first_day
+        stops = days[(days >= first) & (days <= last)]
+        if not units.any() or len(stops) == 0:
+            return pd.DataFrame(columns=['Period', 'Attendance of Students', 'Kutirs'])
+        starts = np.maximum(stops - window_days + 1, first)
+        values, kutirs = self.kutir_mean(self.window_averages((units, sums, first, last), starts, stops))
+        frame = pd.DataFrame({
+            'Period': pd.to_datetime(stops + self.first_day, unit='D').strftime('%Y-%m-%d'),
+            'Attendance of Students': values,
+            'Kutirs': kutirs,
+        })
+        return frame[frame['Kutirs'] > 0].reset_index(drop=True)
+
+    def week_labels(self):
+        return period_labels(self.calendar, 'Weekly')
+
+    def weekly_averages(self, selected):
+        # (week keys, kutir x week averages) of a selection for the weeks with
+        # data in its range; the first and last week are cut at the range ends
+        units, sums, first, last = selected
+        days = self.calendar['Day Key'].to_numpy(dtype=np.int64) - self.first_day
+        in_range = (days >= first) & (days <= last)
+        weeks = np.unique(self.calendar['Week Key'].to_numpy(dtype=np.int64)[in_range])
+        starts = np.maximum(weeks - self.first_day, first)
+        stops = np.minimum(weeks - self.first_day + 6, last)
+        return weeks, self.window_averages(selected, starts, stops)
+
+    @instrumented
+    def week_over_week(self, state, filters):
+        # Weekly average attendance and its change from the week before
+        weeks, averages = self.weekly_averages(self.selection(state, **filters))
+        values, kutirs = self.kutir_mean(averages)
+        frame = pd.DataFrame({'Week Key': weeks, 'Attendance of Students': values, 'Kutirs': kutirs})
+        frame = frame[frame['Kutirs'] > 0].reset_index(drop=True)
+        frame['Change'] = frame['Attendance of Students'].diff()
+        frame['Change %'] = frame['Change'] / frame['Attendance of Students'].shift() * 100
+        frame.insert(0, 'Period', frame['Week Key'].map(self.week_labels()))
+        return frame.drop(columns='Week Key')
+
+    @instrumented
+    def kutir_slopes(self, state, filters):
+        # Least-squares trend of each kutir's weekly average over the weeks it
+        # reported, in students per week, from per-kutir sums of t, y, t*y and
+        # t*t. Steepest decline first.
+        selected = self.selection(state, **filters)
+        units = selected[0]
+        weeks, averages = self.weekly_averages(selected)
+        columns = UNIT_COLUMNS[1:] + ['Weeks', 'Average Attendance', 'Slope per Week', 'Latest Week Attendance']
+        if not units.any() or len(weeks) == 0:
+            return pd.DataFrame(columns=columns)
+        reported = ~np.isnan(averages)
+        y = np.where(reported, averages, 0)
+        t = np.where(reported, (weeks - weeks[0]) // 7, 0)
+        n = reported.sum(axis=1)
+        sum_t, sum_y = t.sum(axis=1), y.sum(axis=1)
+        sum_ty, sum_tt = (t * y).sum(axis=1), (t * t).sum(axis=1)
+        denominator = n * sum_tt - sum_t ** 2
+        with np.errstate(invalid='ignore', divide='ignore'):
+            slopes = np.where(denominator > 0, (n * sum_ty - sum_t * sum_y) / denominator, np.nan)
+            average = np.where(n > 0, sum_y / n, np.nan)
+        # Last reported week of each kutir
+        latest = averages[np.arange(len(averages)), len(weeks) - 1 - np.argmax(reported[:, ::-1], axis=1)]
+
+        frame = self.units[units][UNIT_COLUMNS[1:]].reset_index(drop=True)
+        frame['Weeks'] = n
+        frame['Average Attendance'] = average
+        frame['Slope per Week'] = slopes
+        frame['Latest Week Attendance'] = latest
+        frame = frame[frame['Weeks'] > 0]
+        return frame.sort_values(['Slope per Week', 'Kutir Name'], na_position='last').reset_index(drop=True)[columns]
@@ -0,0 +1,64 @@
+# session_table.py
+import numpy as np
+import pandas as pd
+
+PAGE_SIZES = [50, 100, 250, 500]
+
+
+def search_rows(frame, row_ids, columns, text):
+    # Rows among row_ids where any of the text columns contains `text`
+    # (case-insensitive). Categorical columns are matched once per category
+    # and mapped back through the codes, so only free-text columns are
+    # scanned row by row.
+    text = text.strip().lower()
+    if not text or len(row_ids) == 0:
+        return row_ids
+    found = np.zeros(len(row_ids), dtype=bool)
+    for col in columns:
+        values = frame[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            matching = values.cat.categories.astype(str).str.lower().str.contains(text, regex=False)
+            codes = np.asarray(values.cat.codes)[row_ids]
+            found |= (codes >= 0) & np.asarray(matching)[codes]
+        elif pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values):
+            found |= values.take(row_ids).fillna('').astype(str).str.lower().str.contains(text, regex=False).to_numpy()
+    return row_ids[found]
+
+
+def sort_key(values):
+    # (integer or float key, missing mask) that orders a column the way the
+    # displayed values sort; categoricals sort by category label, not code
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = np.asarray(values.cat.codes)
+        label_ranks = np.argsort(np.argsort(values.cat.categories.astype(str).to_numpy()))
+        return label_ranks[np.maximum(codes, 0)], codes < 0
+    missing = values.isna().to_numpy()
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy(dtype='datetime64[ns]').view(np.int64), missing
+    if pd.api.types.is_bool_dtype(values):
+        return values.to_numpy(dtype=np.int8), missing
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=np.float64), missing
+    codes, _ = pd.factorize(values, sort=True)
+    return codes, codes < 0
+
+
+def sort_rows(frame, row_ids, column, descending=False):
+    # row_ids reordered by one column, missing values last in either direction;
+    # ties keep the original row order
+    if column is None or len(row_ids) == 0:
+        return row_ids
+    key, missing = sort_key(frame[column].take(row_ids))
+    if descending:
+        key = -key
+    return row_ids[np.lexsort((key, missing))]
+
+
+def page_count(total_rows, page_size):
+    return max((total_rows + page_size - 1) // page_size, 1)
+
+
+def page_frame(frame, row_ids, columns, page, page_size):
+    # Only the rows of one page are ever materialized
+    page_ids = row_ids[page * page_size:(page + 1) * page_size]
+    return frame.take(page_ids)[columns]
@@ -0,0 +1,39 @@
+# settings.py
+#
+# Configuration from the environment and the constants the dashboard needs
+# before any data is loaded. It imports nothing heavy: the app draws its
+# filters and page skeleton from this module and snapshot_cache alone, and
+# imports pandas and the data layer after that.
+import os
+import sys
+
+SHEET_URL = r'https://docs.google.com/spreadsheets/d/1z0BC-PkJi4NI2z7sl4eNpIsejmDVYvsrIB5-jgBomY4/edit?usp=sharing'
+
+# How often the background worker checks the source for new rows; 0 disables
+# periodic checks (the Reload button and startup from a snapshot still refresh)
+REFRESH_INTERVAL_SECONDS = int(os.environ.get('SEVA_KUTIR_REFRESH_SECONDS', 600))
+
+# Rows per batch in the chunked mode, which streams the sources batch by batch
+# and keeps only the daily cube in memory, with the cleaned rows on disk.
+# 0 loads every source into one frame.
+CHUNK_ROWS = int(os.environ.get('SEVA_KUTIR_CHUNK_ROWS', 0))
+
+# Offered in the frequency selector after the plain frequencies. They read
+# weekly, so the rest of the dashboard shows TREND_BASE_FREQUENCY meanwhile.
+TREND_MODES = ['4-Week Rolling Avg', '12-Week Rolling Avg', 'Week over Week', 'Kutir Trend Slopes']
+ROLLING_DAYS = {'4-Week Rolling Avg': 28, '12-Week Rolling Avg': 84}
+TREND_BASE_FREQUENCY = 'Weekly'
+
+
+def configured_source():
+    # SEVA_KUTIR_SOURCE may point at a local .xlsx/.csv/.parquet export,
+    # e.g. for offline runs or load tests on synthetic data, or list several
+    # sources separated by commas (one spreadsheet or worksheet per state/year)
+    return os.environ.get('SEVA_KUTIR_SOURCE', SHEET_URL)
+
+
+def data_loaded():
+    # Whether this process already holds the data, answered without importing
+    # data_source: until something has imported it, nothing can be loaded
+    data_source = sys.modules.get('data_source')
+    return data_source is not None and data_source.data.has_instance()
@@ -0,0 +1,271 @@
+# sheet_sources.py
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from instrumentation import instrumented
+from sheets_client import authorized_client, call
+
+# Rows per A1-range request when reading a whole worksheet, and how many of
+# those requests may be in flight at once
+CHUNK_ROWS = 5000
+MAX_CHUNK_WORKERS = 4
+
+
+class SheetSource:
+    # Common loader interface. Every backend hands back the raw header row and
+    # the raw data rows (a list of rows or a 2D object array) exactly as the form
+    # wrote them; data runs them through the same header normalization and type
+    # pipeline whatever the source.
+
+    def read_all(self):
+        raise NotImplementedError
+
+    def read_from(self, start):
+        # Header plus the data rows from 0-based data row `start` onwards. Used by
+        # incremental syncs; backends that can seek should override this.
+        header_row, data_rows = self.read_all()
+        return header_row, data_rows[start:]
+
+    def read_batches(self, batch_rows, start=0):
+        # (header row, block of at most batch_rows data rows) from data row
+        # `start` onwards, for the chunked mode. Backends that can stream
+        # override this so a whole sheet is never held in memory.
+        header_row, data_rows = self.read_from(start)
+        for offset in range(0, len(data_rows), batch_rows):
+            yield header_row, data_rows[offset:offset + batch_rows]
+
+    def fingerprint(self):
+        # Cheap change marker, compared before deciding to sync
+        return None
+
+
+class GoogleSheetSource(SheetSource):
+    # One worksheet of a spreadsheet: by id when the URL carries a '#gid=...'
+    # fragment (as copied from the browser), otherwise by position. Every
+    # request goes through sheets_client.call (request budget, retries); a
+    # client can be passed in, e.g. a stub in tests.
+    def __init__(self, url, credentials_info, worksheet_index=0, client=None):
+        self.url, _, fragment = url.partition('#')
+        self.credentials_info = credentials_info
+        self.worksheet_index = worksheet_index
+        self.worksheet_id = int(fragment[len('gid='):]) if fragment.startswith('gid=') else None
+        self.client = client
+        self.spreadsheet = None
+        self.worksheet = None
+
+    def connect(self):
+        if self.client is None:
+            # The key may be passed as a function, so it is only decoded when a
+            # sheet is actually opened
+            credentials_info = self.credentials_info() if callable(self.credentials_info) else self.credentials_info
+            self.client = authorized_client(credentials_info)
+        self.spreadsheet = call(self.client.open_by_url, self.url)
+        self.load_worksheet()
+
+    def load_worksheet(self):
+        # Also refreshes the worksheet's grid size, which grows with every response
+        if self.worksheet_id is not None:
+            self.worksheet = call(self.spreadsheet.get_worksheet_by_id, self.worksheet_id)
+        else:
+            self.worksheet = call(self.spreadsheet.get_worksheet, self.worksheet_index)
+
+    @instrumented
+    def read_all(self):
+        # The header and fixed-size blocks of rows as separate A1-range requests,
+        # read in parallel, instead of one get_all_values() call that can time out
+        # on large sheets. The result matches get_all_values().
+        if self.spreadsheet is None:
+            self.connect()
+        else:
+            self.load_worksheet()
+        row_count = self.worksheet.row_count
+        ranges = ['1:1'] + [f'A{start}:ZZZ{min(start + CHUNK_ROWS - 1, row_count)}' for start in range(2, row_count + 1, CHUNK_ROWS)]
+        with ThreadPoolExecutor(max_workers=MAX_CHUNK_WORKERS) as pool:
+            blocks = list(pool.map(lambda a1_range: call(self.worksheet.get, a1_range), ranges))
+
+        header_row = list(blocks[0][0]) if blocks[0] else []
+        data_rows = []
+        for position, block in enumerate(blocks[1:], start=1):
+            data_rows.extend(list(row) for row in block)
+            if position < len(blocks) - 1:
+                # The API leaves out trailing empty rows of a range; keep the rows
+                # of the next block at their sheet positions
+                data_rows.extend([] for _ in range(CHUNK_ROWS - len(block)))
+        while data_rows and not any(data_rows[-1]):
+            data_rows.pop()
+
+        # get_all_values() pads every row to the widest one
+        width = max([len(header_row)] + [len(row) for row in data_rows])
+        header_row += [''] * (width - len(header_row))
+        return header_row, [row + [''] * (width - len(row)) for row in data_rows]
+
+    @instrumented
+    def read_from(self, start):
+        if self.worksheet is None:
+            self.connect()
+        # Header row and the tail of the sheet in a single request
+        header_range, rows_range = call(self.worksheet.batch_get, ['1:1', f'A{start + 2}:ZZZ'])
+        header_row = header_range[0] if header_range else []
+        width = len(header_row)
+        # batch_get drops trailing empty cells, pad rows back to the header width
+        return header_row, [row + [''] * (width - len(row)) for row in rows_range]
+
+    def read_batches(self, batch_rows, start=0):
+        # Ranges of batch_rows rows, at most MAX_CHUNK_WORKERS in flight at a
+        # time. Rows are padded (or cut) to the header width; blank rows are
+        # held back until a non-blank row follows, so trailing blank rows are
+        # dropped as with read_all().
+        if self.spreadsheet is None:
+            self.connect()
+        else:
+            self.load_worksheet()
+        header_row = list(call(self.worksheet.get, '1:1')[0] or [])
+        width = len(header_row)
+        row_count = self.worksheet.row_count
+        starts = list(range(start + 2, row_count + 1, batch_rows))
+        blank_rows = []
+        with ThreadPoolExecutor(max_workers=MAX_CHUNK_WORKERS) as pool:
+            for window in range(0, len(starts), MAX_CHUNK_WORKERS):
+                ranges = [f'A{first}:ZZZ{min(first + batch_rows - 1, row_count)}' for first in starts[window:window + MAX_CHUNK_WORKERS]]
+                for first, block in zip(starts[window:], pool.map(lambda a1_range: call(self.worksheet.get, a1_range), ranges)):
+                    rows = [list(row) for row in block]
+                    rows += [[] for _ in range(min(batch_rows, row_count - first + 1) - len(rows))]
+                    batch = []
+                    for row in rows:
+                        if any(row):
+                            batch.extend(blank_rows)
+                            blank_rows = []
+                            batch.append((row + [''] * (width - len(row)))[:width])
+                        else:
+                            blank_rows.append([''] * width)
+                    if batch:
+                        yield header_row, batch
+
+    def fingerprint(self):
+        if self.spreadsheet is None:
+            self.connect()
+        return call(self.spreadsheet.get_lastUpdateTime)
+
+
+class FileSource(SheetSource):
+    def __init__(self, path):
+        self.path = path
+
+    def fingerprint(self):
+        stat = os.stat(self.path)
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class XlsxSource(FileSource):
+    # Streams the first worksheet with openpyxl's read-only mode, so the workbook
+    # is never fully loaded into memory
+
+    def open_workbook(self):
+        # openpyxl is only imported by processes that read an .xlsx source
+        import openpyxl
+        return openpyxl.load_workbook(self.path, read_only=True)
+
+    def read_rows(self, min_row):
+        workbook = self.open_workbook()
+        try:
+            worksheet = workbook.worksheets[0]
+            header_row = [self.cell_text(value) for value in next(worksheet.iter_rows(max_row=1, values_only=True), ())]
+            data_rows = [[self.cell_text(value) for value in row] for row in worksheet.iter_rows(min_row=min_row, values_only=True)]
+        finally:
+            workbook.close()
+        return header_row, data_rows
+
+    def read_batches(self, batch_rows, start=0):
+        workbook = self.open_workbook()
+        try:
+            worksheet = workbook.worksheets[0]
+            header_row = [self.cell_text(value) for value in next(worksheet.iter_rows(max_row=1, values_only=True), ())]
+            batch = []
+            for row in worksheet.iter_rows(min_row=start + 2, values_only=True):
+                batch.append([self.cell_text(value) for value in row])
+                if len(batch) == batch_rows:
+                    yield header_row, batch
+                    batch = []
+            if batch:
+                yield header_row, batch
+        finally:
+            workbook.close()
+
+    def cell_text(self, value):
+        # Match what the Sheets API returns: every cell as text, blanks as ''
+        return '' if value is None else str(value)
+
+    @instrumented
+    def read_all(self):
+        return self.read_rows(min_row=2)
+
+    @instrumented
+    def read_from(self, start):
+        return self.read_rows(min_row=start + 2)
+
+
+class CsvSource(FileSource):
+    def read_frame(self, skiprows=None):
+        # Everything as text, no NaN guessing: the type pipeline does the parsing
+        frame = pd.read_csv(self.path, header=None, dtype=str, keep_default_na=False, skiprows=skiprows)
+        values = frame.to_numpy(dtype=object)
+        return values[0].tolist(), values[1:]
+
+    @instrumented
+    def read_all(self):
+        return self.read_frame()
+
+    @instrumented
+    def read_from(self, start):
+        return self.read_frame(skiprows=range(1, start + 1))
+
+    def read_batches(self, batch_rows, start=0):
+        header_row = pd.read_csv(self.path, header=None, dtype=str, keep_default_na=False, nrows=1).iloc[0].tolist()
+        try:
+            reader = pd.read_csv(self.path, header=None, dtype=str, keep_default_na=False, skiprows=start + 1, chunksize=batch_rows)
+        except pd.errors.EmptyDataError:
+            # `start` is past the last row
+            return
+        with reader:
+            for frame in reader:
+                yield header_row, frame.to_numpy(dtype=object)
+
+
+class ParquetSource(FileSource):
+    @instrumented
+    def read_all(self):
+        frame = pd.read_parquet(self.path)
+        return frame.columns.tolist(), frame.to_numpy(dtype=object)
+
+    def read_batches(self, batch_rows, start=0):
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(self.path)
+        header_row = parquet_file.schema_arrow.names
+        skip = start
+        for batch in parquet_file.iter_batches(batch_size=batch_rows):
+            frame = batch.to_pandas()
+            if skip >= len(frame):
+                skip -= len(frame)
+                continue
+            yield header_row, frame.iloc[skip:].to_numpy(dtype=object)
+            skip = 0
+
+
+def open_source(spec, credentials_info=None):
+    # Pick a backend from a source spec: a Google Sheets URL or a local file path
+    if spec.startswith('http://') or spec.startswith('https://'):
+        return GoogleSheetSource(spec, credentials_info)
+    extension = os.path.splitext(spec)[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        return XlsxSource(spec)
+    if extension == '.csv':
+        return CsvSource(spec)
+    if extension in ('.parquet', '.pq'):
+        return ParquetSource(spec)
+    raise ValueError(f"Unsupported data source: {spec}")
+
+
+def open_sources(spec, credentials_info=None):
+    # A comma-separated list of source specs, e.g. one spreadsheet or worksheet
+    # per state, read as a single data set
+    return [open_source(part.strip(), credentials_info) for part in spec.split(',') if part.strip()]
@@ -0,0 +1,98 @@
+# sheets_client.py
+import os
+import random
+import threading
+import time
+from collections import deque
+
+SHEETS_SCOPE = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive',
+    'https://spreadsheets.google.com/feeds'
+]
+
+# Requests per minute this process may send; the Sheets API allows 60 read
+# requests per minute per user by default
+REQUESTS_PER_MINUTE = int(os.environ.get('SEVA_KUTIR_SHEETS_RPM', 60))
+MAX_ATTEMPTS = 6
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 64.0
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class RequestBudget:
+    # Sliding one-minute window of request start times. One instance is shared
+    # by every session and every source in the process; callers block until
+    # the window has room instead of tripping the API quota.
+
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self.sent = deque()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                while self.sent and now - self.sent[0] >= 60:
+                    self.sent.popleft()
+                if len(self.sent) < self.per_minute:
+                    self.sent.append(now)
+                    return
+                wait = 60 - (now - self.sent[0])
+            time.sleep(wait)
+
+
+budget = RequestBudget(REQUESTS_PER_MINUTE)
+
+
+def is_retryable(error):
+    # Only reached after a Sheets request, so the client libraries are loaded
+    import gspread
+    import requests
+    if isinstance(error, gspread.exceptions.APIError):
+        return error.response.status_code in RETRY_STATUS_CODES
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+def call(function, *args, **kwargs):
+    # function(*args, **kwargs) as one budgeted Sheets request. Quota (429) and
+    # server errors are retried with exponential backoff and full jitter, so
+    # sessions that hit the quota together do not retry in lockstep.
+    for attempt in range(MAX_ATTEMPTS):
+        budget.acquire()
+        try:
+            return function(*args, **kwargs)
+        except Exception as e:
+            if attempt == MAX_ATTEMPTS - 1 or not is_retryable(e):
+                raise
+            delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+            print(f"Warning: Sheets request failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+clients = {}
+clients_lock = threading.Lock()
+
+
+def authorized_client(credentials_info):
+    # One authorized gspread client per service account for the life of the
+    # process. The credentials refresh their own access token, so reloads and
+    # new data instances never re-authorize.
+    account = credentials_info.get('client_email')
+    with clients_lock:
+        if account not in clients:
+            # gspread and google-auth take a noticeable part of a second to
+            # import; processes reading local sources never load them
+            import gspread
+            from google.oauth2 import service_account
+
+            # Create the base credentials from your key data
+            creds = service_account.Credentials.from_service_account_info(credentials_info)
+
+            # Create a new credentials object WITH the specified scopes
+            scoped_creds = creds.with_scopes(SHEETS_SCOPE)
+
+            # Authorize gspread with the SCOPED credentials
+            clients[account] = gspread.authorize(scoped_creds)
+        return clients[account]
@@ -0,0 +1,162 @@
+# snapshot_cache.py
+import json
+import os
+import shutil
+import sys
+import uuid
+from datetime import datetime
+from dimension_index import DimensionIndex
+
+# Bump whenever the cleaned sheet layout changes so stale snapshots are ignored
+SNAPSHOT_SCHEMA_VERSION = 7
+SNAPSHOT_DIR = os.environ.get('SEVA_KUTIR_SNAPSHOT_DIR', '.snapshot')
+
+# Every snapshot is written whole into a directory of its own under
+# GENERATIONS_DIR and published by replacing CURRENT_FILE, which names it.
+# Readers follow CURRENT_FILE, so they never mix the frames of one write with
+# the meta (ingested rows, fingerprint, raw store) of another, even with the
+# dashboard and a headless worker writing at once.
+GENERATIONS_DIR = 'generations'
+CURRENT_FILE = 'current.json'
+SHEET_FILE = 'sheet.arrow'
+# The chunked mode keeps its rows in the raw store and snapshots the cube instead
+DAILY_FILE = 'daily.arrow'
+CALENDAR_FILE = 'calendar.arrow'
+# Rows held back by validation (data_quality), with their reasons
+QUARANTINE_FILE = 'quarantine.arrow'
+# The filter choices, read by read_dimensions without loading the data
+DIMENSIONS_FILE = 'dimensions.json'
+META_FILE = 'meta.json'
+
+
+def process_alive(pid):
+    # Several processes share SNAPSHOT_DIR (the dashboard, headless workers) and
+    # name the files they own after their pid; only a dead owner's are removed
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+def current_generation(snapshot_dir):
+    # Name of the published snapshot directory, or None
+    try:
+        with open(os.path.join(snapshot_dir, CURRENT_FILE)) as f:
+            return json.load(f)['generation']
+    except FileNotFoundError:
+        return None
+
+
+def write_snapshot(data_object, fingerprint, snapshot_dir=SNAPSHOT_DIR):
+    # pyarrow is imported here and in read_snapshot, not with the module, so
+    # read_dimensions stays light
+    import pyarrow.feather as feather
+    generation = f"{os.getpid()}-{uuid.uuid4().hex}"
+    generation_dir = os.path.join(snapshot_dir, GENERATIONS_DIR, generation)
+    os.makedirs(generation_dir)
+    meta = {
+        'schema_version': SNAPSHOT_SCHEMA_VERSION,
+        'generation': generation,
+        'source': data_object.source,
+        'fingerprint': fingerprint,
+        'ingested': data_object.ingested,
+        'bytes_saved': data_object.bytes_saved,
+        'raw_store': data_object.raw_store.state() if data_object.raw_store is not None else None,
+        'written_at': datetime.now().isoformat(timespec='seconds'),
+    }
+
+    if data_object.sheet is not None:
+        frames = {SHEET_FILE: data_object.sheet, CALENDAR_FILE: data_object.calendar}
+    else:
+        frames = {DAILY_FILE: data_object.daily, CALENDAR_FILE: data_object.calendar}
+    frames[QUARANTINE_FILE] = data_object.quarantine
+    for file_name, frame in frames.items():
+        # Uncompressed Arrow IPC so readers can memory-map it
+        feather.write_feather(frame.reset_index(drop=True), os.path.join(generation_dir, file_name), compression='uncompressed')
+    data_object.dimension_index().write(os.path.join(generation_dir, DIMENSIONS_FILE))
+    with open(os.path.join(generation_dir, META_FILE), 'w') as f:
+        json.dump(meta, f)
+
+    # Publish: os.replace swaps the pointer atomically, so a reader sees the
+    # previous snapshot or this one, never a part of each
+    previous = current_generation(snapshot_dir)
+    tmp_current = os.path.join(snapshot_dir, f"{CURRENT_FILE}.{generation}.tmp")
+    with open(tmp_current, 'w') as f:
+        json.dump({'generation': generation}, f)
+    os.replace(tmp_current, os.path.join(snapshot_dir, CURRENT_FILE))
+    remove_old_generations(snapshot_dir, keep={generation, previous})
+
+
+def remove_old_generations(snapshot_dir, keep):
+    # This process's older snapshots and those of processes that are gone.
+    # The one just replaced is kept for readers still on it, and another live
+    # process's may be a write in progress.
+    root = os.path.join(snapshot_dir, GENERATIONS_DIR)
+    for name in os.listdir(root):
+        pid = name.split('-', 1)[0]
+        if name in keep or not pid.isdigit():
+            continue
+        if int(pid) == os.getpid() or not process_alive(int(pid)):
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def usable_meta(source, chunked, snapshot_dir):
+    # (directory, meta) of the published snapshot if it was written for this
+    # source and mode, else None
+    generation = current_generation(snapshot_dir)
+    if generation is None:
+        return None
+    generation_dir = os.path.join(snapshot_dir, GENERATIONS_DIR, generation)
+    with open(os.path.join(generation_dir, META_FILE)) as f:
+        meta = json.load(f)
+    if meta.get('generation') != generation:
+        return None
+    if meta.get('schema_version') != SNAPSHOT_SCHEMA_VERSION or meta.get('source') != source:
+        return None
+    raw_store = meta.get('raw_store')
+    if (raw_store is not None) != chunked or (chunked and not os.path.isdir(raw_store['directory'])):
+        return None
+    return generation_dir, meta
+
+
+def read_snapshot(source, chunked=False, snapshot_dir=SNAPSHOT_DIR):
+    # Returns (sheet, calendar, quarantine, meta), or None if there is no usable
+    # snapshot for this source. In the chunked mode the first frame is the daily cube
+    # and meta['raw_store'] describes the raw store it was built from.
+    import pyarrow.feather as feather
+    try:
+        usable = usable_meta(source, chunked, snapshot_dir)
+        if usable is None:
+            return None
+        generation_dir, meta = usable
+        sheet = feather.read_table(os.path.join(generation_dir, DAILY_FILE if chunked else SHEET_FILE), memory_map=True).to_pandas()
+        calendar = feather.read_table(os.path.join(generation_dir, CALENDAR_FILE), memory_map=True).to_pandas()
+        quarantine = feather.read_table(os.path.join(generation_dir, QUARANTINE_FILE), memory_map=True).to_pandas()
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Warning: Ignoring unreadable snapshot in {snapshot_dir}: {e}")
+        return None
+    return sheet, calendar, quarantine, meta
+
+
+def read_dimensions(source, chunked=False, snapshot_dir=SNAPSHOT_DIR):
+    # The DimensionIndex saved with the snapshot read_snapshot would load, or
+    # None (no usable snapshot, or one written before dimension files existed)
+    try:
+        usable = usable_meta(source, chunked, snapshot_dir)
+        return DimensionIndex.read(os.path.join(usable[0], DIMENSIONS_FILE)) if usable is not None else None
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+if __name__ == '__main__':
+    # Seed a snapshot from a local export, e.g. for offline runs:
+    #   python snapshot_cache.py Parivaar_Kutirs_Mock_Data.xlsx
+    # and start the app with SEVA_KUTIR_SOURCE pointing at the same file.
+    os.environ['SEVA_KUTIR_SOURCE'] = sys.argv[1] if len(sys.argv) > 1 else 'Parivaar_Kutirs_Mock_Data.xlsx'
+    from data_source import data
+    data_object = data()
+    data_object.save_snapshot()
+    print(f"Wrote {data_object.row_count()} rows from {data_object.source} to {SNAPSHOT_DIR}")
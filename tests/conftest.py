@@ -0,0 +1,42 @@
+# tests/conftest.py
+import os
+import shutil
+import sys
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The app modules are top-level files; the synthetic form data lives with the benchmarks
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+# Snapshots, raw stores and engine files go to a throwaway directory and
+# nothing refreshes in the background. Set before any app module reads them
+# on import.
+TEST_DIR = tempfile.mkdtemp(prefix='seva_kutir_tests_')
+os.environ['SEVA_KUTIR_SNAPSHOT_DIR'] = os.path.join(TEST_DIR, 'snapshot')
+os.environ['SEVA_KUTIR_REFRESH_SECONDS'] = '0'
+for name in ['SEVA_KUTIR_SOURCE', 'SEVA_KUTIR_CHUNK_ROWS', 'SEVA_KUTIR_ENGINE', 'SEVA_KUTIR_PROFILE', 'SEVA_KUTIR_PROFILE_LOG']:
+    os.environ.pop(name, None)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def form_rows():
+    # (header row, raw rows) of a few weeks of synthetic form submissions, as a source returns them
+    from synthetic_data import synthetic_rows
+    return synthetic_rows(3000)
+
+
+@pytest.fixture
+def write_source(tmp_path):
+    # write_source(header_row, rows, name='form.csv') -> path of a CSV export holding them
+    from synthetic_data import write_rows
+
+    def write(header_row, rows, name='form.csv'):
+        path = str(tmp_path / name)
+        write_rows(header_row, rows, path)
+        return path
+    return write
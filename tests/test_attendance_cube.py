@@ -0,0 +1,60 @@
+# tests/test_attendance_cube.py
+import pandas as pd
+import pytest
+import data_source
+from data_source import data
+from filter_index import row_mask
+
+FREQUENCIES = ['Daily', 'Weekly', 'Monthly', 'Yearly']
+PERIOD_KEYS = {'Daily': 'Day Key', 'Weekly': 'Week Key', 'Monthly': 'Month Key', 'Yearly': 'Year Key'}
+KUTIR_DAY = ['Date', 'Kutir Name', 'Kutir', 'State', 'District', 'Cluster']
+
+
+@pytest.fixture(scope='module')
+def pipeline(form_rows, tmp_path_factory):
+    from synthetic_data import write_rows
+    source = str(tmp_path_factory.mktemp('cube') / 'form.csv')
+    write_rows(*form_rows, source)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv('SEVA_KUTIR_SOURCE', source)
+        patch.setattr(data_source, 'CHUNK_ROWS', 0)
+        yield data.__wrapped__(refresh=False)
+
+
+def filter_sets(sheet):
+    districts = sorted(sheet.loc[sheet['State'] == 'Jharkhand', 'District'].unique().tolist())
+    return [('Jharkhand', {}), ('Madhya Pradesh', {}),
+            ('Jharkhand', dict(start_date='2025-01-08', end_date='2025-02-02', shift='AM')),
+            ('Jharkhand', dict(districts=districts[:2], start_date='2025-01-15'))]
+
+
+def raw_attendance(rows, frequency):
+    # The attendance per period straight from the raw rows: summed per kutir
+    # and day, then totalled per period, or for Weekly the mean over kutirs of
+    # their weekly sum divided by the days they reported
+    key = PERIOD_KEYS[frequency]
+    per_day = rows.groupby([key] + KUTIR_DAY, observed=True)['Attendance of Students'].sum().reset_index()
+    if frequency != 'Weekly':
+        return per_day.groupby(key)['Attendance of Students'].sum()
+    per_kutir = per_day.groupby([key, 'Kutir Name'], observed=True).agg(total=('Attendance of Students', 'sum'), days=('Date', 'nunique'))
+    return (per_kutir['total'] / per_kutir['days']).groupby(level=key).mean()
+
+
+@pytest.mark.parametrize('frequency', FREQUENCIES)
+def test_cube_rollups_equal_raw_groupby(pipeline, frequency):
+    sheet = pipeline.sheet
+    for state, filters in filter_sets(sheet):
+        rows = sheet[row_mask(sheet, state, **filters)]
+        assert len(rows)
+        agg_df, detailed_df = pipeline.attendance(state, frequency, filters)
+
+        expected = raw_attendance(rows, frequency)
+        assert agg_df['Period'].tolist() == pipeline.label_periods(expected.index.to_frame(name='Period'), frequency)['Period'].tolist()
+        pd.testing.assert_series_equal(agg_df['Attendance of Students'], expected.reset_index(drop=True), check_names=False, check_dtype=False)
+
+        # And the frames the charts draw from are the ones the raw rows give
+        raw_agg_df, raw_detailed_df = pipeline.aggregate_attendance(rows, frequency)
+        pd.testing.assert_frame_equal(agg_df, raw_agg_df)
+        pd.testing.assert_frame_equal(detailed_df, raw_detailed_df)
+        pd.testing.assert_frame_equal(pipeline.kutir_attendance(state, frequency, filters, detailed_df),
+                                      pipeline.aggregate_kutir_attendance(raw_detailed_df, frequency))
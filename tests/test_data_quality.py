@@ -0,0 +1,89 @@
+# tests/test_data_quality.py
+import numpy as np
+import pytest
+import data_source
+from data_source import clean_source_rows, data
+from data_quality import DUPLICATE_REASON, MAX_ATTENDANCE
+
+TIMESTAMP = 0
+ATTENDANCE = 6
+
+
+def kutir_name(header_row, row):
+    # The form has one Kutir Name question per district; one of them is answered
+    return ''.join(value for name, value in zip(header_row, row) if name.startswith('Kutir Name'))
+
+
+@pytest.fixture
+def valid_rows(form_rows):
+    # Six submissions for different kutirs that pass every check
+    header_row, rows = form_rows
+    return header_row, rows[:6].copy()
+
+
+def test_valid_rows_pass(valid_rows):
+    header_row, rows = valid_rows
+    sheet, calendar, quarantine, _ = clean_source_rows(header_row, rows)
+    assert len(sheet) == len(rows)
+    assert quarantine.empty
+    assert sheet['Attendance of Students'].tolist() == [int(value) for value in rows[:, ATTENDANCE]]
+
+
+@pytest.mark.parametrize('attendance, reason', [
+    (str(MAX_ATTENDANCE + 1), f"attendance above {MAX_ATTENDANCE}"),
+    ('-3', 'negative attendance'),
+    ('12.5', 'attendance not a whole number'),
+    ('twelve', 'attendance not a number'),
+    ('', 'missing attendance'),
+])
+def test_bad_attendance_is_quarantined(valid_rows, attendance, reason):
+    header_row, rows = valid_rows
+    rows[2, ATTENDANCE] = attendance
+    sheet, _, quarantine, _ = clean_source_rows(header_row, rows)
+    assert len(sheet) == len(rows) - 1
+    assert quarantine['Reason'].tolist() == [reason]
+    # The row is held back as entered
+    assert quarantine['Attendance of Students'].tolist() == [attendance]
+    assert quarantine['Kutir Name'].tolist() == [kutir_name(header_row, rows[2])]
+
+
+def test_unparseable_date_is_quarantined(valid_rows):
+    header_row, rows = valid_rows
+    rows[1, TIMESTAMP] = '31/31/2025 25:00'
+    rows[4, TIMESTAMP] = ''
+    sheet, calendar, quarantine, _ = clean_source_rows(header_row, rows)
+    assert len(sheet) == len(rows) - 2
+    assert quarantine['Reason'].tolist() == ['unreadable Timestamp', 'missing Timestamp']
+    assert quarantine['Timestamp'].tolist() == ['31/31/2025 25:00', '']
+    assert sheet['Date'].notna().all()
+
+
+def test_duplicate_submission_keeps_the_first(valid_rows, write_source, monkeypatch):
+    # A resubmitted form (same kutir, day and shift, later in the day) is
+    # quarantined and the attendance of the first submission counts
+    header_row, rows = valid_rows
+    resubmitted = rows[3].copy()
+    resubmitted[TIMESTAMP] = resubmitted[TIMESTAMP][:10] + ' 18:45:00'
+    resubmitted[ATTENDANCE] = '140'
+    monkeypatch.setenv('SEVA_KUTIR_SOURCE', write_source(header_row, np.vstack([rows, resubmitted])))
+    monkeypatch.setattr(data_source, 'CHUNK_ROWS', 0)
+    loaded = data.__wrapped__(refresh=False)
+
+    assert loaded.quarantine['Reason'].tolist() == [DUPLICATE_REASON]
+    assert loaded.quarantine['Attendance of Students'].tolist() == ['140']
+    assert len(loaded.sheet) == len(rows)
+    assert loaded.quarantine['Kutir Name'].tolist() == [kutir_name(header_row, rows[3])]
+    kept = loaded.sheet[loaded.sheet['Kutir Name'] == kutir_name(header_row, rows[3])]
+    assert kept['Attendance of Students'].tolist() == [int(rows[3, ATTENDANCE])]
+    assert loaded.quality_report()['rows_quarantined'] == 1
+
+
+def test_missing_column_warns_and_quarantines(valid_rows, capsys):
+    # A form version without the attendance question: every row is held back
+    # with a reason instead of failing the load
+    header_row, rows = valid_rows
+    keep = [i for i in range(len(header_row)) if i != ATTENDANCE]
+    sheet, _, quarantine, _ = clean_source_rows([header_row[i] for i in keep], rows[:, keep])
+    assert "Warning: Source rows have no Attendance of Students column" in capsys.readouterr().out
+    assert sheet.empty
+    assert quarantine['Reason'].eq('missing attendance').all() and len(quarantine) == len(rows)
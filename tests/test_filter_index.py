@@ -0,0 +1,54 @@
+# tests/test_filter_index.py
+import itertools
+import numpy as np
+import pytest
+from data_source import clean_source_rows
+from filter_index import FilterIndex, row_mask
+
+DATE_RANGES = [(None, None), ('2025-01-10', '2025-01-31'), ('2025-02-10', None),
+               # Start after end: nothing matches
+               ('2025-01-20', '2025-01-05')]
+
+
+@pytest.fixture(scope='module')
+def sheet(form_rows):
+    return clean_source_rows(*form_rows)[0]
+
+
+def selections(sheet, state):
+    # Per filter: "All" (None), nothing selected, two known values, and a
+    # known value mixed with one the data does not have; districts also try
+    # only unknown values
+    rows = sheet[sheet['State'] == state]
+    choices = {}
+    for col in ['District', 'Cluster', 'Kutir Name']:
+        known = sorted(rows[col].dropna().unique().tolist())[:2]
+        choices[col] = [None, [], known, known[:1] + ['Unknown']]
+    choices['District'].append(['Unknown'])
+    return choices
+
+
+@pytest.mark.parametrize('categorical', [True, False])
+def test_filter_index_matches_boolean_masks(sheet, categorical):
+    # Every filter combination selects the rows a boolean mask over the whole
+    # frame selects, for categorical columns (data.sheet) and plain ones
+    frame = sheet if categorical else sheet.astype({col: object for col in sheet.select_dtypes('category').columns})
+    index = FilterIndex(frame)
+    for state in ['Jharkhand', 'Madhya Pradesh', 'Unknown']:
+        choices = selections(frame, state)
+        for (start_date, end_date), shift, districts, clusters, kutir_names in itertools.product(
+                DATE_RANGES, [None, 'AM', 'Unknown'], choices['District'], choices['Cluster'], choices['Kutir Name']):
+            filters = dict(start_date=start_date, end_date=end_date, shift=shift,
+                           districts=districts, clusters=clusters, kutir_names=kutir_names)
+            expected = np.flatnonzero(row_mask(frame, state, **filters))
+            np.testing.assert_array_equal(index.row_ids(state, **filters), expected, err_msg=f"{state} {filters}")
+            assert index.count(state, **filters) == len(expected)
+
+
+def test_filter_index_select_keeps_row_order(sheet):
+    index = FilterIndex(sheet)
+    kutirs = sorted(sheet['Kutir'].dropna().unique().tolist())
+    selected = index.select('Jharkhand', kutirs=kutirs, start_date='2025-01-15')
+    expected = sheet[row_mask(sheet, 'Jharkhand', kutirs=kutirs, start_date='2025-01-15')]
+    assert len(selected)
+    assert selected.equals(expected)
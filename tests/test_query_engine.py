@@ -0,0 +1,101 @@
+# tests/test_query_engine.py
+import numpy as np
+import pandas as pd
+import pytest
+import data_source
+from data_source import data
+
+pytest.importorskip('duckdb')
+
+FREQUENCIES = ['Daily', 'Weekly', 'Monthly', 'Yearly']
+ATTENDANCE = 6
+
+
+@pytest.fixture(scope='module', params=[(0, False), (700, False), (0, True)], ids=['in memory', 'chunked', 'bucket edges'])
+def pipeline(request, form_rows, tmp_path_factory):
+    # The fixture frame loaded in memory, and in the chunked mode, where the
+    # engine reads the raw store's Parquet parts. The last variant has small
+    # attendance numbers, so daily sums per kutir land on the district bucket
+    # edges (50, 75, 76, 100).
+    from synthetic_data import write_rows
+    chunk_rows, bucket_edges = request.param
+    header_row, rows = form_rows
+    if bucket_edges:
+        rows = rows.copy()
+        rows[:, ATTENDANCE] = np.random.default_rng(18).integers(25, 56, len(rows)).astype(str)
+    source = str(tmp_path_factory.mktemp('engine') / 'form.csv')
+    write_rows(header_row, rows, source)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv('SEVA_KUTIR_SOURCE', source)
+        patch.setattr(data_source, 'CHUNK_ROWS', chunk_rows)
+        yield data.__wrapped__(refresh=False)
+
+
+def filter_sets(index):
+    districts = index.options('District', state='Jharkhand')
+    clusters = index.options('Cluster', state='Jharkhand', districts=districts[:2])
+    return [('Jharkhand', {}), ('Madhya Pradesh', {'shift': 'AM'}),
+            ('Jharkhand', {'start_date': '2025-01-08', 'end_date': '2025-02-02', 'districts': districts[:2]}),
+            ('Jharkhand', {'districts': districts[:2], 'clusters': clusters[:2] + ['Unknown']}),
+            ('Jharkhand', {'districts': []})]
+
+
+def normalized(frame):
+    # The engine returns the same values in its own dtypes (64-bit integers,
+    # ordered categoricals) and order; the pandas Daily detail also carries a
+    # reset_index column, and unstack names the bucket columns' axis
+    frame = frame.drop(columns=['index'], errors='ignore').copy()
+    frame.columns.name = None
+    for col in frame.columns:
+        if isinstance(frame[col].dtype, pd.CategoricalDtype):
+            frame[col] = frame[col].astype(object)
+        elif pd.api.types.is_integer_dtype(frame[col]):
+            frame[col] = frame[col].astype('int64')
+    keys = [col for col in frame.columns if not pd.api.types.is_float_dtype(frame[col])]
+    return frame.sort_values(keys).reset_index(drop=True) if keys and len(frame) else frame.reset_index(drop=True)
+
+
+def results(pipeline, engine, monkeypatch):
+    # What the dashboard asks of the data layer, for every filter set and frequency
+    monkeypatch.setattr(data_source, 'QUERY_ENGINE', engine)
+    pipeline.invalidate_derived()
+    index = pipeline.get_filter_index()
+    out = {'states': index.options('State'), 'shifts': index.options('Shift')}
+    for state, filters in filter_sets(index):
+        key = (state, repr(filters))
+        districts = index.options('District', state=state)
+        out[key, 'options'] = (districts, index.options('Cluster', state=state, districts=districts[:2]),
+                               index.options('Kutir Name', state=state, districts=districts[:2]), index.date_bounds(state))
+        out[key, 'count'] = index.count(state, **filters)
+        for frequency in FREQUENCIES:
+            agg_df, detailed_df = pipeline.attendance(state, frequency, filters)
+            out[key, frequency, 'attendance'] = agg_df
+            out[key, frequency, 'detailed'] = detailed_df
+            out[key, frequency, 'kutir'] = pipeline.kutir_attendance(state, frequency, filters, detailed_df)
+            if pipeline.get_engine() is not None:
+                fig3a_df = pipeline.get_engine().district_attendance(state, filters, frequency)
+                fig3_df, bucket_counts = pipeline.get_engine().district_buckets(state, filters, frequency) if not fig3a_df.empty else (None, None)
+            else:
+                fig3a_df = pipeline.aggregate_district_attendance(detailed_df, frequency) if not detailed_df.empty else pd.DataFrame()
+                fig3_df, bucket_counts = pipeline.district_buckets(fig3a_df) if not fig3a_df.empty else (None, None)
+            out[key, frequency, 'district'] = fig3a_df
+            out[key, frequency, 'buckets'] = fig3_df
+            out[key, frequency, 'bucket counts'] = bucket_counts
+    return out
+
+
+def test_duckdb_engine_matches_pandas(pipeline, monkeypatch):
+    expected = results(pipeline, 'pandas', monkeypatch)
+    actual = results(pipeline, 'duckdb', monkeypatch)
+    assert pipeline.engine is not None
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        if isinstance(value, pd.DataFrame):
+            if value.empty:
+                assert actual[key].empty, key
+                continue
+            # Averages are summed in another order, so floats may differ in the last bits
+            pd.testing.assert_frame_equal(normalized(actual[key]), normalized(value), check_dtype=False, obj=str(key))
+        else:
+            assert actual[key] == value, key
+    pipeline.invalidate_derived()
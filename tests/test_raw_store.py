@@ -0,0 +1,36 @@
+# tests/test_raw_store.py
+import os
+import subprocess
+import sys
+import pandas as pd
+from raw_store import RawStore
+
+
+def store_of(root, pid):
+    # A store directory with one part, as process `pid` would have written it
+    store = RawStore(os.path.join(str(root), f"{pid}-store"))
+    os.makedirs(store.directory)
+    return store.extended([store.write(pd.DataFrame({'Attendance of Students': [10, 20]}))])
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_create_keeps_live_stores(tmp_path):
+    # The store this process serves and one another live process reads (the
+    # dashboard and a headless worker sharing the root) both survive a full
+    # load; this process's older store and a dead process's store do not
+    serving = store_of(tmp_path / 'raw', os.getpid())
+    other = store_of(tmp_path / 'raw', os.getppid())
+    created = RawStore.create(str(tmp_path / 'raw'), keep=serving)
+    assert [frame['Attendance of Students'].tolist() for frame in serving.iter_frames()] == [[10, 20]]
+    assert [frame['Attendance of Students'].tolist() for frame in other.iter_frames()] == [[10, 20]]
+    assert os.path.basename(created.directory).startswith(f"{os.getpid()}-")
+
+    stale = store_of(tmp_path / 'raw', dead_pid())
+    newer = RawStore.create(str(tmp_path / 'raw'), keep=created)
+    assert sorted(os.listdir(tmp_path / 'raw')) == sorted(os.path.basename(store.directory) for store in [other, created, newer])
+    assert not os.path.exists(stale.directory) and not os.path.exists(serving.directory)
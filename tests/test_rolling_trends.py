@@ -0,0 +1,40 @@
+# tests/test_rolling_trends.py
+import numpy as np
+import pytest
+from attendance_cube import daily_attendance
+from data_source import clean_source_rows
+from rolling_trends import RollingTrends
+
+
+@pytest.fixture(scope='module')
+def trends(form_rows):
+    return RollingTrends(daily_attendance(clean_source_rows(*form_rows)[0]), None)
+
+
+def dense_cells(trends, shift):
+    # (attendance, reported) of every kutir and day, straight from the cube rows
+    rows = np.ones(len(trends.rows), dtype=bool) if shift is None else (trends.rows['Shift'] == shift).to_numpy()
+    attendance = np.zeros((len(trends.units), trends.day_count))
+    reported = np.zeros(attendance.shape, dtype=bool)
+    np.add.at(attendance, (trends.unit_codes[rows], trends.day_positions[rows]), trends.rows['Attendance of Students'].to_numpy()[rows])
+    reported[trends.unit_codes[rows], trends.day_positions[rows]] = True
+    return attendance, reported
+
+
+@pytest.mark.parametrize('shift', [None, 'AM', 'PM'])
+def test_day_sums_match_dense_cells(trends, shift):
+    # Windows over the kutirs' reported days give the sums and day counts of
+    # the dense kutir x day cells, for any selection of kutirs and range
+    attendance, reported = dense_cells(trends, shift)
+    sums = trends.sums(shift)
+    rng = np.random.default_rng(21)
+    for units, first, last in [(np.arange(len(trends.units)), 0, trends.day_count - 1),
+                               (np.sort(rng.choice(len(trends.units), 7, replace=False)), 5, trends.day_count - 9)]:
+        stops = np.arange(first, last + 1)
+        starts = np.maximum(stops - rng.integers(0, 30, len(stops)), first)
+        window_attendance, window_reported = sums.windows(units, starts, stops, first, last)
+        expected_attendance = np.array([[attendance[unit, start:stop + 1].sum() for start, stop in zip(starts, stops)] for unit in units])
+        expected_reported = np.array([[reported[unit, start:stop + 1].sum() for start, stop in zip(starts, stops)] for unit in units])
+        np.testing.assert_array_equal(window_attendance, expected_attendance)
+        np.testing.assert_array_equal(window_reported, expected_reported)
+        np.testing.assert_array_equal(sums.reported_days(units, first, last), reported[units, first:last + 1])
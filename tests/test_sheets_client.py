@@ -0,0 +1,171 @@
+# tests/test_sheets_client.py
+import re
+import gspread
+import pytest
+import requests
+import sheet_sources
+import sheets_client
+from sheet_sources import GoogleSheetSource
+from sheets_client import MAX_ATTEMPTS, RequestBudget, call
+
+URL = 'https://docs.google.com/spreadsheets/d/stub/edit'
+
+
+def api_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = b'{"error": {"code": %d, "message": "stub"}}' % status_code
+    return gspread.exceptions.APIError(response)
+
+
+class FakeClock:
+    # Stands in for the time module in sheets_client: sleeping advances the clock
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class StubWorksheet:
+    # Answers A1-range reads from a list of rows the way the Sheets API does:
+    # trailing empty cells and rows are left out. failures are raised by the
+    # next requests, one each, before any is answered.
+    def __init__(self, header_row, rows, blank_rows=5, failures=()):
+        self.grid = [header_row] + rows
+        self.row_count = len(self.grid) + blank_rows
+        self.failures = list(failures)
+        self.requests = 0
+
+    def fail_next(self):
+        self.requests += 1
+        if self.failures:
+            raise self.failures.pop(0)
+
+    def read(self, a1_range):
+        first, last = re.fullmatch(r'A?(\d+):(?:ZZZ)?(\d*)', a1_range).groups()
+        rows = self.grid[int(first) - 1:int(last) if last else None]
+        rows = [row[:max([i + 1 for i, value in enumerate(row) if value] or [0])] for row in rows]
+        while rows and not rows[-1]:
+            rows.pop()
+        return rows
+
+    def get(self, a1_range):
+        self.fail_next()
+        return self.read(a1_range)
+
+    def batch_get(self, ranges):
+        self.fail_next()
+        return [self.read(a1_range) for a1_range in ranges]
+
+
+class StubClient:
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+        self.opened = []
+
+    def open_by_url(self, url):
+        self.opened.append(url)
+        return self
+
+    def get_worksheet(self, index):
+        return self.worksheet
+
+    def get_worksheet_by_id(self, worksheet_id):
+        return self.worksheet
+
+    def get_lastUpdateTime(self):
+        return '2025-02-01T10:00:00.000Z'
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sheets_client, 'time', clock)
+    # Full jitter at its upper bound, so the backoff delays are known
+    monkeypatch.setattr(sheets_client.random, 'uniform', lambda low, high: high)
+    monkeypatch.setattr(sheets_client, 'budget', RequestBudget(sheets_client.REQUESTS_PER_MINUTE))
+    return clock
+
+
+@pytest.fixture
+def sheet_rows(form_rows):
+    # Forty synthetic submissions as text cells, with a blank row in the middle
+    header_row, rows = form_rows
+    rows = [list(row) for row in rows[:40]]
+    rows[12] = [''] * len(header_row)
+    return list(header_row), rows
+
+
+def failing(errors, result='rows'):
+    # A request that raises each of errors once, then returns result
+    attempts = []
+
+    def request():
+        attempts.append(len(attempts))
+        if len(attempts) <= len(errors):
+            raise errors[len(attempts) - 1]
+        return result
+    return request, attempts
+
+
+def test_exhausted_budget_waits_for_the_window(clock, monkeypatch):
+    monkeypatch.setattr(sheets_client, 'budget', RequestBudget(2))
+    assert call(lambda: 1) == 1
+    clock.now += 10
+    assert call(lambda: 2) == 2
+    assert clock.sleeps == []
+    # The third request in the minute waits until the first leaves the window
+    assert call(lambda: 3) == 3
+    assert clock.sleeps == [50]
+    assert len(sheets_client.budget.sent) == 2
+
+
+@pytest.mark.parametrize('error', [api_error(429), api_error(500), api_error(503), requests.exceptions.ConnectionError('reset')])
+def test_call_retries_quota_and_server_errors(clock, error):
+    request, attempts = failing([error, error])
+    assert call(request) == 'rows'
+    assert len(attempts) == 3
+    # Exponential backoff from BACKOFF_BASE_SECONDS
+    assert clock.sleeps == [1.0, 2.0]
+
+
+def test_call_does_not_retry_client_errors(clock):
+    request, attempts = failing([api_error(400)])
+    with pytest.raises(gspread.exceptions.APIError):
+        call(request)
+    assert len(attempts) == 1 and clock.sleeps == []
+
+
+def test_call_gives_up_after_max_attempts(clock):
+    request, attempts = failing([api_error(429)] * MAX_ATTEMPTS)
+    with pytest.raises(gspread.exceptions.APIError) as raised:
+        call(request)
+    assert raised.value.response.status_code == 429
+    assert len(attempts) == MAX_ATTEMPTS
+    assert clock.sleeps == [min(sheets_client.BACKOFF_MAX_SECONDS, 2.0 ** attempt) for attempt in range(MAX_ATTEMPTS - 1)]
+
+
+def test_fetch_round_trips_rows(clock, sheet_rows, monkeypatch):
+    # Rows read through the stub client, with a quota error on the way, come
+    # back as the sheet holds them: blank cells and rows in place, trailing
+    # blank rows of the grid dropped
+    monkeypatch.setattr(sheet_sources, 'CHUNK_ROWS', 7)
+    header_row, rows = sheet_rows
+    worksheet = StubWorksheet(header_row, rows, failures=[api_error(429)])
+    client = StubClient(worksheet)
+    source = GoogleSheetSource(URL + '#gid=0', credentials_info=None, client=client)
+
+    assert source.read_all() == (header_row, rows)
+    assert client.opened == [URL]
+    assert source.read_from(30) == (header_row, rows[30:])
+    batches = list(source.read_batches(9, start=5))
+    assert all(batch_header == header_row and len(batch) <= 9 for batch_header, batch in batches)
+    assert [row for _, batch in batches for row in batch] == rows[5:]
+    assert source.fingerprint() == '2025-02-01T10:00:00.000Z'
+    assert clock.sleeps == [1.0]
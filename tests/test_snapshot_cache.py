@@ -0,0 +1,89 @@
+# tests/test_snapshot_cache.py
+import json
+import os
+import pandas as pd
+import pytest
+import data_source
+import snapshot_cache
+from data_source import data
+from snapshot_cache import read_dimensions, read_snapshot, write_snapshot
+
+
+@pytest.mark.parametrize('chunk_rows', [0, 700])
+def test_snapshot_round_trip(form_rows, write_source, monkeypatch, tmp_path, chunk_rows):
+    # A snapshot read back gives the frames it was written from: the same
+    # values, dtypes and categories, in memory and in the chunked mode
+    header_row, rows = form_rows
+    monkeypatch.setenv('SEVA_KUTIR_SOURCE', write_source(header_row, rows))
+    monkeypatch.setattr(data_source, 'CHUNK_ROWS', chunk_rows)
+    loaded = data.__wrapped__(refresh=False)
+    # The synthetic form data includes entry errors, so there are quarantined rows to round-trip
+    assert len(loaded.quarantine)
+
+    snapshot_dir = str(tmp_path / 'snapshot')
+    write_snapshot(loaded, loaded.fingerprint, snapshot_dir)
+    frame, calendar, quarantine, meta = read_snapshot(loaded.source, chunked=chunk_rows > 0, snapshot_dir=snapshot_dir)
+
+    written = loaded.daily if chunk_rows else loaded.sheet
+    assert any(isinstance(dtype, pd.CategoricalDtype) for dtype in written.dtypes)
+    pd.testing.assert_frame_equal(frame, written)
+    pd.testing.assert_frame_equal(calendar, loaded.calendar)
+    pd.testing.assert_frame_equal(quarantine, loaded.quarantine)
+    assert meta['fingerprint'] == loaded.fingerprint
+    assert meta['ingested'] == loaded.ingested
+
+
+def test_snapshot_for_other_source_or_mode_is_ignored(form_rows, write_source, monkeypatch, tmp_path):
+    header_row, rows = form_rows
+    monkeypatch.setenv('SEVA_KUTIR_SOURCE', write_source(header_row, rows[:500]))
+    monkeypatch.setattr(data_source, 'CHUNK_ROWS', 0)
+    loaded = data.__wrapped__(refresh=False)
+    snapshot_dir = str(tmp_path / 'snapshot')
+    write_snapshot(loaded, loaded.fingerprint, snapshot_dir)
+
+    assert read_snapshot(loaded.source + '.other', snapshot_dir=snapshot_dir) is None
+    assert read_snapshot(loaded.source, chunked=True, snapshot_dir=snapshot_dir) is None
+
+
+def test_snapshot_generations_are_published_whole(form_rows, write_source, monkeypatch, tmp_path):
+    # A reader gets the frames and the meta of one write: a write that has not
+    # been published yet, or a meta file of another generation, is never read
+    header_row, rows = form_rows
+    monkeypatch.setattr(data_source, 'CHUNK_ROWS', 0)
+    snapshot_dir = str(tmp_path / 'snapshot')
+    source = write_source(header_row, rows[:1000])
+    monkeypatch.setenv('SEVA_KUTIR_SOURCE', source)
+    first = data.__wrapped__(refresh=False)
+    write_snapshot(first, 'first', snapshot_dir)
+
+    write_source(header_row, rows)
+    second = data.__wrapped__(refresh=False)
+    second.full_reload()
+    assert len(second.sheet) > len(first.sheet)
+    with monkeypatch.context() as patch:
+        # Interrupted before the pointer is swapped
+        replace = snapshot_cache.os.replace
+        patch.setattr(snapshot_cache.os, 'replace', lambda src, dst: pytest.fail("published") if dst.endswith(snapshot_cache.CURRENT_FILE) else replace(src, dst))
+        with pytest.raises(pytest.fail.Exception):
+            write_snapshot(second, 'second', snapshot_dir)
+    frame, _, _, meta = read_snapshot(source, snapshot_dir=snapshot_dir)
+    assert meta['fingerprint'] == 'first' and meta['ingested'] == first.ingested
+    pd.testing.assert_frame_equal(frame, first.sheet)
+
+    write_snapshot(second, 'second', snapshot_dir)
+    frame, _, _, meta = read_snapshot(source, snapshot_dir=snapshot_dir)
+    assert meta['fingerprint'] == 'second' and meta['ingested'] == second.ingested
+    pd.testing.assert_frame_equal(frame, second.sheet)
+
+    # This process's older generations go, the one just replaced stays for readers still on it
+    write_snapshot(second, 'third', snapshot_dir)
+    assert len(os.listdir(os.path.join(snapshot_dir, snapshot_cache.GENERATIONS_DIR))) == 2
+
+    generation = snapshot_cache.current_generation(snapshot_dir)
+    meta_path = os.path.join(snapshot_dir, snapshot_cache.GENERATIONS_DIR, generation, snapshot_cache.META_FILE)
+    with open(meta_path) as f:
+        meta = json.load(f)
+    with open(meta_path, 'w') as f:
+        json.dump(dict(meta, generation='another'), f)
+    assert read_snapshot(source, snapshot_dir=snapshot_dir) is None
+    assert read_dimensions(source, snapshot_dir=snapshot_dir) is None
@@ -0,0 +1,48 @@
+# tests/test_sync.py
+import pandas as pd
+import pytest
+import data_source
+from data_source import data
+
+
+def load(source, monkeypatch, chunk_rows):
+    # A data instance of its own (not the process singleton) on a CSV export
+    monkeypatch.setenv('SEVA_KUTIR_SOURCE', source)
+    monkeypatch.setattr(data_source, 'CHUNK_ROWS', chunk_rows)
+    return data.__wrapped__(refresh=False)
+
+
+def cube_rows(pipeline):
+    daily = pipeline.get_attendance_cube().daily
+    keys = ['Date', 'State', 'District', 'Cluster', 'Kutir Name', 'Kutir', 'Shift']
+    return daily.sort_values(keys).reset_index(drop=True)
+
+
+def raw_rows(pipeline):
+    if pipeline.sheet is not None:
+        return pipeline.sheet
+    return pd.concat(list(pipeline.raw_store.iter_frames()), ignore_index=True)
+
+
+@pytest.mark.parametrize('chunk_rows', [0, 700])
+def test_sync_matches_full_reload(form_rows, write_source, monkeypatch, chunk_rows):
+    # Rows appended after a load and picked up by sync() give the same data as
+    # loading everything at once, in memory and in the chunked mode
+    header_row, rows = form_rows
+    source = write_source(header_row, rows[:2000])
+    synced = load(source, monkeypatch, chunk_rows)
+    write_source(header_row, rows)
+    with monkeypatch.context() as patch:
+        # The appended rows must come from the incremental path, not a fallback full reload
+        patch.setattr(data.__wrapped__, 'full_reload', lambda self: pytest.fail("sync fell back to a full reload"))
+        synced = synced.refreshed()
+    assert synced is not None and synced.rows_ingested() == len(rows)
+
+    # Read before the full load: a new raw store removes the older ones
+    synced_rows, synced_cube = raw_rows(synced), cube_rows(synced)
+
+    full = load(write_source(header_row, rows, name='full.csv'), monkeypatch, chunk_rows)
+    pd.testing.assert_frame_equal(synced_rows, raw_rows(full))
+    pd.testing.assert_frame_equal(synced_cube, cube_rows(full))
+    pd.testing.assert_frame_equal(synced.calendar, full.calendar)
+    pd.testing.assert_frame_equal(synced.quarantine, full.quarantine)
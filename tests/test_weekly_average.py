@@ -0,0 +1,90 @@
+# tests/test_weekly_average.py
+import numpy as np
+import pandas as pd
+import pytest
+from data_source import data
+from period_calendar import PERIOD_KEY_COLUMNS, day_keys, period_keys
+
+# The groupings the three weekly averages were computed on, per call site:
+# the attendance trend, the kutir-type chart and the district chart
+CALL_SITES = {
+    'aggregate_attendance': (['Period', 'Date', 'Kutir Name', 'Kutir', 'State', 'District', 'Cluster'], ['Period', 'Kutir Name']),
+    'aggregate_kutir_attendance': (['Period', 'Date', 'Kutir Name', 'Kutir', 'State', 'District', 'Cluster'], ['Period', 'Kutir', 'Kutir Name']),
+    'aggregate_district_attendance': (['Period', 'Date', 'Kutir Name', 'District'], ['Period', 'Kutir Name', 'District']),
+}
+
+
+@pytest.fixture(scope='module')
+def pipeline():
+    # kutir_weekly_average and categorize use no loaded data
+    return object.__new__(data.__wrapped__)
+
+
+@pytest.fixture(scope='module')
+def form_frame():
+    # A fixed frame of daily submissions over two months and a year boundary,
+    # with zero attendance and a kutir that reports some days twice
+    rng = np.random.default_rng(9)
+    dates = pd.to_datetime('2024-12-20') + pd.to_timedelta(rng.integers(0, 60, 400), unit='D')
+    kutirs = rng.integers(0, 6, 400)
+    frame = pd.DataFrame({
+        'Date': dates,
+        'Kutir Name': pd.Categorical([f"Kutir {k}" for k in kutirs]),
+        'Kutir': pd.Categorical(np.where(kutirs % 2, 'Study Center', 'Shiksha Kutir')),
+        'State': pd.Categorical(['Jharkhand'] * 400),
+        'District': pd.Categorical([f"District {k % 3}" for k in kutirs]),
+        'Cluster': pd.Categorical([f"Cluster {k % 4}" for k in kutirs]),
+        'Attendance of Students': rng.integers(0, 140, 400).astype(np.int16),
+    })
+    frame.loc[frame.index % 17 == 0, 'Attendance of Students'] = 0
+    for col, keys in period_keys(day_keys(frame['Date'])).items():
+        frame[col] = keys
+    return frame
+
+
+def legacy_weekly_average(frame):
+    # The per-row computation each call site carried before kutir_weekly_average
+    return frame.apply(lambda row: row['sum_daily_attendance'] / row['count_days'] if row['count_days'] > 0 else 0, axis=1)
+
+
+def weekly_frame(form_frame, frequency, day_columns, kutir_columns):
+    # The sums and day counts as a call site grouped them
+    rows = form_frame.assign(Period=form_frame[PERIOD_KEY_COLUMNS[frequency]])
+    daily = rows.groupby(day_columns, as_index=False, observed=True)['Attendance of Students'].sum()
+    return daily.groupby(kutir_columns, as_index=False, observed=True).agg(
+        sum_daily_attendance=('Attendance of Students', 'sum'),
+        count_days=('Date', 'nunique'),
+    )
+
+
+@pytest.mark.parametrize('frequency', list(PERIOD_KEY_COLUMNS))
+@pytest.mark.parametrize('call_site', list(CALL_SITES))
+def test_kutir_weekly_average_matches_legacy(pipeline, form_frame, frequency, call_site):
+    grouped = weekly_frame(form_frame, frequency, *CALL_SITES[call_site])
+    expected = grouped.assign(**{'Kutir Weekly Avg Attendance': legacy_weekly_average(grouped)})
+    result = grouped.assign(**{'Kutir Weekly Avg Attendance': pipeline.kutir_weekly_average(grouped)})
+    pd.testing.assert_frame_equal(result, expected, check_exact=True)
+
+
+def test_kutir_weekly_average_without_days(pipeline):
+    # A row without counted days averages to 0, as the inline versions returned
+    frame = pd.DataFrame({'sum_daily_attendance': [30, 0, 45], 'count_days': [3, 0, 4]})
+    expected = frame.assign(average=legacy_weekly_average(frame))
+    pd.testing.assert_frame_equal(frame.assign(average=pipeline.kutir_weekly_average(frame)), expected, check_exact=True)
+
+
+def test_categorize_matches_legacy(pipeline):
+    def legacy(attendance):
+        if pd.isna(attendance):
+            return 'Unknown'
+        if attendance < 50:
+            return '<50'
+        elif 50 <= attendance <= 75:
+            return '50-75'
+        elif 76 <= attendance <= 100:
+            return '76-100'
+        else:
+            return '100+'
+
+    values = pd.Series(np.concatenate([np.arange(-1, 130, 0.25), [np.nan]]))
+    pd.testing.assert_series_equal(pipeline.categorize(values), values.apply(legacy))